@@ -1,16 +1,14 @@
 # app.py
 
 import os
-from flask import Flask, render_template
+from flask import Flask, render_template, before_render_template
 from config import SECRET_KEY
 
 # Importa os módulos de banco de dados
 import database.common_db as database_common # <<< PRECISA DESTE
-import database.campanha_db as database_campanha
-import database.tabloide_db as database_tabloide
 import database.parceiro_db as database_parceiros
-import database.campanha_produtos_db as database_campanha_produtos
-import database.tabloide_produtos_db as database_tabloide_produtos
+import database.migrations as database_migrations
+import database.catalogo_snapshot as catalogo_snapshot
 
 # Importa os blueprints (nossos arquivos de rotas)
 from routes.campanha_routes import campanha_bp
@@ -18,6 +16,9 @@ from routes.tabloide_routes import tabloide_bp
 from routes.parceiro_routes import parceiro_bp
 from routes.campanha_produtos_routes import campanha_produtos_bp
 from routes.tabloide_produtos_routes import tabloide_produtos_bp
+from routes.health_routes import health_bp
+from routes.jobs_routes import jobs_bp
+from routes.exportacao_routes import exportacao_bp
 
 
 # Cria a aplicação Flask
@@ -40,6 +41,9 @@ app.register_blueprint(parceiro_bp)
 # --- REGISTRO DOS NOVOS BLUEPRINTS ---
 app.register_blueprint(campanha_produtos_bp)
 app.register_blueprint(tabloide_produtos_bp)
+app.register_blueprint(health_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(exportacao_bp)
 
 
 # --- Rota Principal (Home Page) ---
@@ -55,16 +59,26 @@ def index():
         expiring_partners=expiring_partners # <-- ADICIONADO
     )
 
-# --- Funções de Banco de Dados Globais ---
-# A função before_request permanece a mesma, pois ainda precisa chamar
-# as funções de criação de tabela de cada módulo.
-@app.before_request
-def before_first_request():
-    database_campanha.create_tables() #
-    database_tabloide.create_tables() #
-    database_parceiros.create_tables() #
-    database_campanha_produtos.create_product_table() #
-    database_tabloide_produtos.create_product_table() #
+# --- Migrações de Schema ---
+# As tabelas são criadas/alteradas UMA vez na inicialização (run.py) pelo
+# executor versionado em database/migrations.py, e não mais a cada requisição.
+def aplicar_migracoes():
+    aplicadas, erro = database_migrations.run_migrations()
+    if erro:
+        print(f"Erro ao aplicar migrações: {erro}")
+    return aplicadas, erro
+
+# --- Snapshot local do catálogo de produtos ---
+# Thread em segundo plano que mantém a cópia SQLite de dim_plugpharma_produtos
+# usada na resolução de GTINs (ver database/catalogo_snapshot.py).
+def iniciar_snapshot_catalogo():
+    catalogo_snapshot.iniciar_refresh_periodico(database_common.engine)
+
+# --- Conexões do pool ---
+# A conexão é pega do pool só na primeira consulta (get_db_connection) e é
+# devolvida assim que os dados estão prontos: ao começar a renderizar um
+# template, sem esperar o fim da requisição. O teardown continua como garantia.
+before_render_template.connect(database_common.release_db_connection, app)
 
 # --- MODIFICADO AQUI ---
 @app.teardown_appcontext
@@ -72,4 +86,8 @@ def teardown_db(exception):
     database_common.close_db_connection(exception) 
 
 if __name__ == '__main__':
+    aplicar_migracoes()
+    # Com o reloader do debug, só o processo filho (o que atende) mantém o snapshot
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_snapshot_catalogo()
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,89 @@
+# benchmarks/bench_bulk_loader.py
+#
+# Compara a gravação de produtos na staging do tabloide (stg_tabloide_produto):
+# caminho antigo (text() com parâmetros nomeados + lista de dicts) x
+# bulk_loader 'values' x bulk_loader 'load_data' (se habilitado no config e no
+# servidor). Usa o banco configurado em config.py; cada medição roda numa
+# transação que é desfeita (ROLLBACK) no fim, sem deixar linhas.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_bulk_loader
+#   python -m benchmarks.bench_bulk_loader --linhas 30000 --linhas-por-lote 1000 5000
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+from sqlalchemy.sql import text
+import database.common_db as db_common
+import database.bulk_loader as bulk_loader
+import database.tabloide_produtos_db as db_tabloide_produtos
+
+COLUNAS = ["carga_id", "tabloide_id"] + db_tabloide_produtos.PRODUTO_COLUNAS
+
+
+def _linhas_sinteticas(linhas):
+    rnd = random.Random(42)
+    carga_id = uuid.uuid4().hex
+    out = []
+    for i in range(linhas):
+        gtin = f"789{rnd.randrange(10**10):010d}"
+        out.append((
+            carga_id, 1, gtin, gtin.zfill(14), str(rnd.randrange(10**6)), f"PRODUTO {i}\tcom tab",
+            rnd.choice(["EMS", "ACHE", None]), "FIXO", round(rnd.uniform(1, 200), 2),
+            rnd.choice([round(rnd.uniform(1, 200), 2), None]), round(rnd.uniform(1, 200), 2), None, "A",
+        ))
+    return out
+
+
+def _caminho_antigo(conn, linhas):
+    """INSERT com parâmetros nomeados, como o add_products_bulk fazia."""
+    nomes = [f"p{i}" for i in range(len(COLUNAS))]
+    sql = text(f"""
+        INSERT INTO {db_tabloide_produtos.STG_TABLOIDE_PRODUTO_TABLE} ({", ".join(COLUNAS)})
+        VALUES ({", ".join(":" + n for n in nomes)})
+    """)
+    conn.execute(sql, [dict(zip(nomes, linha)) for linha in linhas])
+
+
+def _medir(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        with db_common.engine.connect() as conn:
+            inicio = time.perf_counter()
+            func(conn)
+            tempos.append(time.perf_counter() - inicio)
+            conn.rollback()
+    return statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da gravação em massa de produtos")
+    parser.add_argument("--linhas", type=int, default=30000)
+    parser.add_argument("--linhas-por-lote", type=int, nargs="+", default=[1000, 2000, 5000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    linhas = _linhas_sinteticas(args.linhas)
+    tabela = db_tabloide_produtos.STG_TABLOIDE_PRODUTO_TABLE
+    print(f"linhas={args.linhas} repeticoes={args.repeticoes}")
+
+    t = _medir(lambda conn: _caminho_antigo(conn, linhas), args.repeticoes)
+    print(f"text() + dicts (antigo):           {t * 1000:9.1f} ms")
+
+    for por_lote in args.linhas_por_lote:
+        t = _medir(lambda conn: bulk_loader.carregar(conn, tabela, COLUNAS, linhas, 'values', por_lote),
+                   args.repeticoes)
+        print(f"values, {por_lote:>6} linhas/lote:      {t * 1000:9.1f} ms")
+
+    if bulk_loader.get_estatisticas()["load_data_disponivel"]:
+        t = _medir(lambda conn: bulk_loader.carregar(conn, tabela, COLUNAS, linhas, 'load_data'),
+                   args.repeticoes)
+        print(f"load_data:                         {t * 1000:9.1f} ms")
+    else:
+        print("load_data: desabilitado (BULK_LOADER['load_data_local'] = False ou servidor recusou)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_gtin_lookup.py
+#
+# Compara as estratégias de consulta de GTINs no catálogo (dim_plugpharma_produtos)
+# conforme o tamanho da lista cresce. Usa o banco configurado em config.py e
+# ignora o cache em memória (mede só o round-trip ao banco).
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_gtin_lookup
+#   python -m benchmarks.bench_gtin_lookup --tamanhos 1000 15000 30000 --repeticoes 5
+
+import argparse
+import random
+import statistics
+import time
+from sqlalchemy.sql import text
+import database.common_db as db_common
+
+
+def _amostra_gtins(conn, tamanho):
+    """Metade GTINs reais do catálogo, metade inexistentes (como numa planilha real)."""
+    cursor = conn.execute(
+        text("SELECT codigo_barras FROM dim_plugpharma_produtos WHERE codigo_principal = 1 LIMIT :n"),
+        {"n": tamanho // 2}
+    )
+    reais = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    falsos = [f"99{random.randrange(10**11):011d}" for _ in range(tamanho - len(reais))]
+    gtins = reais + falsos
+    random.shuffle(gtins)
+    return gtins
+
+
+def _medir(func, conn, gtins, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func(conn, gtins)
+        tempos.append(time.perf_counter() - inicio)
+        conn.rollback()
+    return statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da consulta de GTINs no catálogo")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[100, 1000, 5000, 15000, 30000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--sem-in-unico", action="store_true",
+                        help="Não mede o IN (...) único (lento/instável em listas muito grandes)")
+    args = parser.parse_args()
+
+    estrategias = {
+        "in_unico": lambda conn, g: db_common._consultar_catalogo_em_lotes(conn, g, chunk_size=len(g)),
+        "in_em_lotes": db_common._consultar_catalogo_em_lotes,
+        "tabela_temp": db_common._consultar_catalogo_tabela_temporaria,
+    }
+    if args.sem_in_unico:
+        estrategias.pop("in_unico")
+
+    print(f"chunk_size={db_common.LOOKUP_CHUNK_SIZE} "
+          f"limite_tabela_temporaria={db_common.LOOKUP_LIMITE_TABELA_TEMP}")
+    print(f"{'gtins':>8} | " + " | ".join(f"{nome:>22}" for nome in estrategias))
+
+    with db_common.engine.connect() as conn:
+        for tamanho in args.tamanhos:
+            gtins = _amostra_gtins(conn, tamanho)
+            colunas = []
+            for nome, func in estrategias.items():
+                try:
+                    segundos = _medir(func, conn, gtins, args.repeticoes)
+                    # ms totais e µs por GTIN: com lotes/tabela temporária o custo por GTIN deve ficar estável
+                    colunas.append(f"{segundos * 1000:9.1f}ms {segundos * 1e6 / tamanho:7.1f}µs/g")
+                except Exception as e:
+                    conn.rollback()
+                    colunas.append(f"{'ERRO: ' + type(e).__name__:>22}")
+            print(f"{tamanho:>8} | " + " | ".join(colunas))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_ingestao.py
+#
+# Compara o preparo das linhas de uma planilha de tabloide para o INSERT:
+# caminho antigo (df.iterrows + pad_barcode/clean_barcode por linha) x
+# services.ingestao_produtos.preparar_registros (operações por coluna).
+# Não usa banco: o mapa GTIN -> codigo_interno é gerado em memória.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_ingestao
+#   python -m benchmarks.bench_ingestao --linhas 50000 --repeticoes 3
+
+import argparse
+import random
+import statistics
+import time
+import numpy as np
+import pandas as pd
+import services.ingestao_produtos as ingestao
+from utils import pad_barcode, clean_barcode
+
+
+def _planilha_sintetica(linhas):
+    rnd = random.Random(42)
+    gtins = [f" 789{rnd.randrange(10**10):010d} " if rnd.random() < 0.1 else f"789{rnd.randrange(10**10):010d}"
+             for _ in range(linhas)]
+    for i in rnd.sample(range(linhas), linhas // 50):
+        gtins[i] = None  # linhas sem GTIN
+    df = pd.DataFrame({
+        'codigo_barras': gtins,
+        'descricao': [f"PRODUTO {i}" for i in range(linhas)],
+        'laboratorio': [rnd.choice(["EMS", "ACHE", "EUROFARMA", None]) for _ in range(linhas)],
+        'tipo_preco': [rnd.choice(["FIXO", "PROMO"]) for _ in range(linhas)],
+        'preco_normal': [round(rnd.uniform(1, 200), 2) for _ in range(linhas)],
+        'preco_desconto': [rnd.choice([round(rnd.uniform(1, 200), 2), "-", None]) for _ in range(linhas)],
+        'preco_desconto_cliente': [round(rnd.uniform(1, 200), 2) for _ in range(linhas)],
+        'preco_app': [np.nan if rnd.random() < 0.3 else round(rnd.uniform(1, 200), 2) for _ in range(linhas)],
+        'tipo_regra': [rnd.choice(["A", "B", None]) for _ in range(linhas)],
+    })
+    limpos = {g.strip() for g in gtins if g}
+    ci_map = {g: str(rnd.randrange(10**6)) for g in limpos if rnd.random() < 0.8}
+    return df, ci_map
+
+
+def _caminho_antigo(df, entidade_id, ci_map):
+    """Reprodução do loop que existia em tabloide_produtos_routes.upload_page."""
+    df = df.replace({np.nan: None})
+    for col in ['preco_normal', 'preco_desconto', 'preco_desconto_cliente', 'preco_app']:
+        df[col] = pd.to_numeric(df[col], errors='coerce').replace({np.nan: None})
+
+    produtos = []
+    for _, row in df.iterrows():
+        cb_raw = row.get('codigo_barras')
+        cb_raw_str = str(cb_raw) if cb_raw is not None else None
+        cb_cleaned = clean_barcode(cb_raw_str)
+        produtos.append((
+            entidade_id, cb_raw_str, pad_barcode(cb_raw_str),
+            ci_map.get(cb_cleaned) if cb_cleaned else None,
+            row.get('descricao'), row.get('laboratorio'), row.get('tipo_preco'),
+            row.get('preco_normal'), row.get('preco_desconto'), row.get('preco_desconto_cliente'),
+            row.get('preco_app'), row.get('tipo_regra')
+        ))
+    return produtos
+
+
+def _medir(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do preparo de linhas do upload")
+    parser.add_argument("--linhas", type=int, default=50000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    df, ci_map = _planilha_sintetica(args.linhas)
+
+    t_antigo, antigo = _medir(lambda: _caminho_antigo(df, 1, ci_map), args.repeticoes)
+    t_novo, novo = _medir(lambda: ingestao.preparar_registros(df, 1, ingestao.TABLOIDE, ci_map), args.repeticoes)
+
+    # Os dois caminhos precisam gerar exatamente os mesmos valores
+    ordem = list(ingestao.TABLOIDE["parametros"].values())
+    divergencias = sum(1 for a, n in zip(antigo, novo) if list(a) != [n[p] for p in ordem])
+
+    print(f"linhas={args.linhas} repeticoes={args.repeticoes}")
+    print(f"iterrows (antigo):          {t_antigo * 1000:9.1f} ms")
+    print(f"preparar_registros (novo):  {t_novo * 1000:9.1f} ms   ({t_antigo / t_novo:.1f}x mais rápido)")
+    print(f"linhas divergentes: {divergencias}")
+
+
+if __name__ == "__main__":
+    main()
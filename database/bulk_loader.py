@@ -0,0 +1,170 @@
+# database/bulk_loader.py
+
+import collections
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy.exc import SQLAlchemyError
+import config
+
+######################################
+#   CARGA EM MASSA (INSERT / LOAD DATA)
+######################################
+# Dois caminhos para gravar muitas linhas numa tabela:
+#  - 'values': INSERT ... VALUES (%s, ...) com tuplas, direto no driver
+#    (exec_driver_sql). O PyMySQL reescreve o executemany em INSERTs de várias
+#    linhas (até ~1 MB por statement), sem o processamento de parâmetros
+#    nomeados do SQLAlchemy por linha.
+#  - 'load_data': LOAD DATA LOCAL INFILE. O PyMySQL só envia arquivos do disco
+#    (não aceita buffer em memória), então as linhas são gravadas num TSV
+#    temporário, no formato padrão do MySQL (\N = NULL), apagado em seguida.
+#    Exige local_infile=1 no servidor e BULK_LOADER['load_data_local'] = True.
+# No modo 'auto', cargas a partir de limite_load_data linhas usam LOAD DATA
+# (se habilitado); se o servidor recusar o LOCAL INFILE, o processo volta a
+# usar só VALUES. Outros erros não trocam de caminho: voltam como erro.
+# Com LOCAL, o MySQL transforma erros de dados e chaves duplicadas em warnings
+# (truncando ou pulando linhas); para valer a mesma regra do VALUES, qualquer
+# warning ou linha a menos depois do LOAD também volta como erro.
+
+_cfg = getattr(config, 'BULK_LOADER', {})
+METODO = _cfg.get('metodo', 'auto')                       # 'auto', 'values' ou 'load_data'
+LINHAS_POR_LOTE = _cfg.get('linhas_por_lote', 2000)       # Linhas por executemany no modo VALUES
+LOAD_DATA_LOCAL = _cfg.get('load_data_local', False)
+LIMITE_LOAD_DATA = _cfg.get('limite_load_data', 2000)     # Mínimo de linhas para compensar o arquivo
+
+# Erros do MySQL/PyMySQL de LOAD DATA LOCAL desligado ou não permitido
+_ERROS_LOCAL_INFILE = {1148, 2068, 3948}
+_MAX_AVISOS_NO_ERRO = 3
+
+_estado = {"load_data_disponivel": LOAD_DATA_LOCAL}
+_historico = collections.deque(maxlen=20)  # Últimas cargas, para o /health
+_historico_lock = threading.Lock()
+
+
+def _escolher_metodo(total, metodo):
+    metodo = metodo or METODO
+    if metodo == 'auto':
+        usar_load_data = _estado["load_data_disponivel"] and total >= LIMITE_LOAD_DATA
+        return 'load_data' if usar_load_data else 'values'
+    if metodo == 'load_data' and not _estado["load_data_disponivel"]:
+        return 'values'
+    return metodo
+
+
+def _carregar_values(conn, tabela, colunas, linhas, linhas_por_lote):
+    sql = (
+        f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+        f"VALUES ({', '.join(['%s'] * len(colunas))})"
+    )
+    lotes = []
+    total = 0
+    for inicio in range(0, len(linhas), linhas_por_lote):
+        lote = linhas[inicio:inicio + linhas_por_lote]
+        t0 = time.perf_counter()
+        result = conn.exec_driver_sql(sql, lote)
+        lotes.append(round((time.perf_counter() - t0) * 1000, 1))
+        total += result.rowcount if result.rowcount >= 0 else len(lote)
+    return total, lotes
+
+
+def _valor_tsv(valor):
+    if valor is None:
+        return '\\N'
+    texto = str(valor)
+    return (texto.replace('\\', '\\\\').replace('\t', '\\t')
+                 .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _carregar_load_data(conn, tabela, colunas, linhas):
+    fd, caminho = tempfile.mkstemp(prefix="bulk_", suffix=".tsv")
+    try:
+        t0 = time.perf_counter()
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as arquivo:
+            for linha in linhas:
+                arquivo.write('\t'.join(_valor_tsv(v) for v in linha))
+                arquivo.write('\n')
+        ms_arquivo = round((time.perf_counter() - t0) * 1000, 1)
+
+        t0 = time.perf_counter()
+        result = conn.exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {tabela} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            f"({', '.join(colunas)})",
+            (caminho,)
+        )
+        ms_load = round((time.perf_counter() - t0) * 1000, 1)
+        avisos = conn.exec_driver_sql(f"SHOW WARNINGS LIMIT {_MAX_AVISOS_NO_ERRO}").fetchall()
+        return result.rowcount, [ms_arquivo, ms_load], avisos
+    finally:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+def _local_infile_recusado(erro):
+    """True se o erro é do LOCAL INFILE desligado/não permitido (e não dos dados)."""
+    args = getattr(getattr(erro, 'orig', None), 'args', None) or ()
+    return bool(args) and args[0] in _ERROS_LOCAL_INFILE
+
+
+def _erro_avisos_load_data(total, esperado, avisos):
+    detalhes = "; ".join(f"{nivel} {codigo}: {mensagem}" for nivel, codigo, mensagem in avisos)
+    erro = f"LOAD DATA gravou {total} de {esperado} linha(s)"
+    return f"{erro} com avisos ({detalhes})" if detalhes else erro
+
+
+def carregar(conn, tabela, colunas, linhas, metodo=None, linhas_por_lote=None):
+    """
+    Insere as linhas (tuplas na ordem de colunas) na tabela, pela conexão
+    informada e dentro da transação dela (quem chama faz commit/rollback).
+    Retorna (linhas_inseridas, erro).
+    """
+    if not linhas:
+        return 0, None
+    linhas_por_lote = linhas_por_lote or LINHAS_POR_LOTE
+    escolhido = _escolher_metodo(len(linhas), metodo)
+
+    inicio = time.perf_counter()
+    try:
+        if escolhido == 'load_data':
+            try:
+                total, lotes, avisos = _carregar_load_data(conn, tabela, colunas, linhas)
+                if avisos or total != len(linhas):
+                    # Quem chama faz rollback: nada do LOAD fica gravado
+                    return 0, _erro_avisos_load_data(total, len(linhas), avisos)
+            except SQLAlchemyError as e:
+                if not _local_infile_recusado(e):
+                    raise
+                # local_infile desligado no servidor/cliente: não tenta mais neste processo
+                print(f"LOAD DATA LOCAL indisponível, usando INSERT ... VALUES: {e}")
+                _estado["load_data_disponivel"] = False
+                escolhido = 'values'
+        if escolhido == 'values':
+            total, lotes = _carregar_values(conn, tabela, colunas, linhas, linhas_por_lote)
+    except SQLAlchemyError as e:
+        return 0, str(e)
+
+    with _historico_lock:
+        _historico.append({
+            "tabela": tabela,
+            "metodo": escolhido,
+            "linhas": total,
+            "ms_total": round((time.perf_counter() - inicio) * 1000, 1),
+            "ms_por_lote": lotes,
+        })
+    return total, None
+
+
+def get_estatisticas():
+    """Configuração efetiva e tempos das últimas cargas."""
+    with _historico_lock:
+        ultimas = list(_historico)
+    return {
+        "metodo": METODO,
+        "linhas_por_lote": LINHAS_POR_LOTE,
+        "load_data_disponivel": _estado["load_data_disponivel"],
+        "limite_load_data": LIMITE_LOAD_DATA,
+        "ultimas_cargas": ultimas,
+    }
@@ -11,80 +11,6 @@ DIM_CAMPANHA_TABLE = "dim_campanha"
 # Adicionado para fazer o JOIN
 DIM_PARCEIRO_TABLE = "dim_parceiros" 
 
-def create_tables():
-    conn = get_db_connection()
-    if conn is None: return
-    
-    # --- PASSO 1: Criar a tabela se não existir (com a nova coluna) ---
-    try:
-        sql_create = text(f"""
-            CREATE TABLE IF NOT EXISTS {DIM_CAMPANHA_TABLE} (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                nome VARCHAR(255) NOT NULL,
-                data_inicio DATE NOT NULL,
-                data_fim DATE NOT NULL,
-                status INT DEFAULT 1,
-                parceiro_id INT DEFAULT NULL, 
-                data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                UNIQUE(nome),
-                FOREIGN KEY (parceiro_id) REFERENCES {DIM_PARCEIRO_TABLE}(id) ON DELETE SET NULL
-            )
-        """)
-        conn.execute(sql_create)
-        conn.commit()
-    except SQLAlchemyError as e_create:
-        # Se a criação falhar (ex: tabela existe mas sem FK), tentamos alterar
-        print(f"Aviso ao criar tabela {DIM_CAMPANHA_TABLE}: {e_create}")
-        conn.rollback()
-
-    # --- PASSO 2: Garantir que a coluna `parceiro_id` exista (para tabelas antigas) ---
-    # (Esta é a correção principal: é executada fora do 'except' anterior)
-    try:
-        sql_alter_col = text(f"""
-            ALTER TABLE {DIM_CAMPANHA_TABLE}
-            ADD COLUMN IF NOT EXISTS parceiro_id INT DEFAULT NULL
-        """)
-        conn.execute(sql_alter_col)
-        conn.commit()
-    except SQLAlchemyError as e_alter_col:
-        # Ignora erros comuns de alteração (ex: coluna duplicada)
-        if "Duplicate column name" in str(e_alter_col):
-            pass # Coluna já existe, tudo bem
-        else:
-            print(f"Erro ao adicionar coluna parceiro_id: {e_alter_col}")
-        conn.rollback()
-
-    # --- PASSO 3: Garantir que a Foreign Key exista (para tabelas antigas) ---
-    try:
-        # Verifica se a FK já existe
-        res = conn.execute(text(f"""
-            SELECT COUNT(*)
-            FROM information_schema.TABLE_CONSTRAINTS
-            WHERE CONSTRAINT_SCHEMA = DATABASE()
-              AND TABLE_NAME = '{DIM_CAMPANHA_TABLE}'
-              AND CONSTRAINT_NAME = 'fk_campanha_parceiro'
-        """))
-        fk_exists = res.scalar() > 0
-
-        if not fk_exists:
-            sql_alter_fk = text(f"""
-                ALTER TABLE {DIM_CAMPANHA_TABLE}
-                ADD CONSTRAINT fk_campanha_parceiro
-                FOREIGN KEY (parceiro_id) REFERENCES {DIM_PARCEIRO_TABLE}(id)
-                ON DELETE SET NULL
-            """)
-            conn.execute(sql_alter_fk)
-            conn.commit()
-            
-    except SQLAlchemyError as e_alter_fk:
-        # Ignora erros de "FK já existe"
-        if "Duplicate" in str(e_alter_fk) or "already exists" in str(e_alter_fk):
-            pass
-        else:
-            print(f"Erro ao adicionar FK parceiro_id: {e_alter_fk}")
-        conn.rollback()
-
-
 def add_campaign(nome, data_inicio, data_fim, parceiro_id):
     conn = get_db_connection()
     sql = text(f"""
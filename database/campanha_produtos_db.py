@@ -2,73 +2,43 @@
 
 from sqlalchemy.sql import text
 from sqlalchemy.exc import SQLAlchemyError
-from database.common_db import get_db_connection
+from database.common_db import get_db_connection, lotes_in, iter_consulta, consultar_pagina
+import database.bulk_loader as bulk_loader
 
 DIM_CAMPANHA_TABLE = "dim_campanha"
 DIM_CAMPANHA_PRODUTO_TABLE = "dim_campanha_produto"
+# Carga das planilhas antes da troca atômica (ver replace_products_from_staging)
+STG_CAMPANHA_PRODUTO_TABLE = "stg_campanha_produto"
 
-def create_product_table():
-    conn = get_db_connection()
-    if conn is None: return
-    try:
-        sql_create_fact = text(f"""
-            CREATE TABLE IF NOT EXISTS {DIM_CAMPANHA_PRODUTO_TABLE} (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                campanha_id INT NOT NULL,
-                codigo_barras VARCHAR(14),
-                -- Alterado para NOT NULL para garantir integridade
-                codigo_barras_normalizado VARCHAR(14) NOT NULL, 
-                codigo_interno VARCHAR(14) DEFAULT NULL,
-                descricao TEXT,
-                pontuacao INT,
-                preco_normal DECIMAL(10, 2),
-                preco_desconto DECIMAL(10, 2),
-                rebaixe DECIMAL(10, 2),
-                qtd_limite INT,
-                data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                FOREIGN KEY (campanha_id) REFERENCES {DIM_CAMPANHA_TABLE}(id) ON DELETE CASCADE
-            )
-        """)
-        conn.execute(sql_create_fact)
-        
-        # Garantir que a coluna existente também seja NOT NULL caso já tenha sido criada antes
-        sql_alter = text(f"""
-            ALTER TABLE {DIM_CAMPANHA_PRODUTO_TABLE}
-            MODIFY COLUMN codigo_barras_normalizado VARCHAR(14) NOT NULL;
-        """)
-        conn.execute(sql_alter)
-        conn.commit()
-    except SQLAlchemyError as e:
-        print(f"Erro ao criar/alterar tabela {DIM_CAMPANHA_PRODUTO_TABLE}: {e}")
-        conn.rollback()
+# Coluna da tabela -> nome do parâmetro usado nos INSERTs abaixo
+PRODUTO_PARAMS = {
+    "entidade_id": "cid", "codigo_barras": "cb", "codigo_barras_normalizado": "cbn",
+    "codigo_interno": "ci", "descricao": "desc", "pontuacao": "pts",
+    "preco_normal": "pr_norm", "preco_desconto": "pr_desc", "rebaixe": "reb", "qtd_limite": "qtd"
+}
+# Colunas de produto (sem a chave da entidade), na ordem de PRODUTO_PARAMS
+PRODUTO_COLUNAS = [c for c in PRODUTO_PARAMS if c != "entidade_id"]
 
+def _linhas_para_carga(produtos, *prefixo):
+    """Dicts de PRODUTO_PARAMS -> tuplas na ordem (campanha_id, *PRODUTO_COLUNAS), para o bulk_loader."""
+    params = list(PRODUTO_PARAMS.values())
+    return [prefixo + tuple(p[k] for k in params) for p in produtos]
 
 def add_products_bulk(produtos):
+    """
+    Insere vários produtos de uma vez (via bulk_loader).
+    Espera uma lista de dicts com as chaves de PRODUTO_PARAMS (cid, cb, cbn, ...),
+    como os gerados por services.ingestao_produtos.preparar_registros.
+    """
     conn = get_db_connection()
-    sql = text(f"""
-        INSERT INTO {DIM_CAMPANHA_PRODUTO_TABLE} (
-            campanha_id, codigo_barras, codigo_barras_normalizado, codigo_interno, descricao, pontuacao,
-            preco_normal, preco_desconto, rebaixe, qtd_limite
-        )
-        VALUES (:cid, :cb, :cbn, :ci, :desc, :pts, :pr_norm, :pr_desc, :reb, :qtd)
-    """)
-    
-    try:
-        # Mapeia a lista de tuplas para uma lista de dicionários
-        produtos_dict = [
-            {
-                "cid": p[0], "cb": p[1], "cbn": p[2], "ci": p[3], "desc": p[4],
-                "pts": p[5], "pr_norm": p[6], "pr_desc": p[7], "reb": p[8], "qtd": p[9]
-            }
-            for p in produtos
-        ]
-        
-        result = conn.execute(sql, produtos_dict)
-        conn.commit()
-        return result.rowcount, None
-    except SQLAlchemyError as e:
+    total, erro = bulk_loader.carregar(
+        conn, DIM_CAMPANHA_PRODUTO_TABLE, ["campanha_id"] + PRODUTO_COLUNAS, _linhas_para_carga(produtos)
+    )
+    if erro:
         conn.rollback()
-        return 0, str(e)
+        return 0, erro
+    conn.commit()
+    return total, None
 
 def get_products_by_campaign_id(campanha_id):
     conn = get_db_connection()
@@ -82,6 +52,42 @@ def get_products_by_campaign_id(campanha_id):
         print(f"Erro em get_products_by_campaign_id: {e}")
         return []
 
+def iter_products_for_export(campanha_id, colunas, conn=None):
+    """
+    Gera os produtos da campanha como tuplas (na ordem de colunas), com cursor
+    no servidor, para exportações grandes sem carregar tudo na memória.
+    colunas: nomes fixos definidos pelo código (entram direto no SELECT).
+    """
+    sql = text(f"SELECT {', '.join(colunas)} FROM {DIM_CAMPANHA_PRODUTO_TABLE} WHERE campanha_id = :id")
+    return iter_consulta(sql, {"id": campanha_id}, conn)
+
+# Colunas que entram no hash de conteúdo de get_export_version
+_COLUNAS_HASH_VERSAO = ', '.join(f"QUOTE({c})" for c in (
+    'codigo_barras', 'codigo_barras_normalizado', 'codigo_interno', 'descricao', 'pontuacao',
+    'preco_normal', 'preco_desconto', 'rebaixe', 'qtd_limite'
+))
+
+def get_export_version(campanha_id):
+    """
+    Versão dos produtos da campanha para o cache de exportações: muda quando
+    alguma linha entra (MAX(id)), sai (COUNT) ou é alterada. data_atualizacao
+    tem resolução de 1 s, então entra também um hash do conteúdo das linhas
+    (BIT_XOR dos CRC32; QUOTE distingue NULL de '' e de 'NULL').
+    Retorna ({"total", "max_id", "max_data", "hash_linhas"}, erro).
+    """
+    conn = get_db_connection()
+    sql = text(f"""
+        SELECT COUNT(*) AS total, MAX(id) AS max_id, MAX(data_atualizacao) AS max_data,
+               BIT_XOR(CRC32(CONCAT_WS(',', id, {_COLUNAS_HASH_VERSAO}))) AS hash_linhas
+        FROM {DIM_CAMPANHA_PRODUTO_TABLE} WHERE campanha_id = :id
+    """)
+    try:
+        row = conn.execute(sql, {"id": campanha_id}).mappings().fetchone()
+        return dict(row), None
+    except SQLAlchemyError as e:
+        print(f"Erro em get_export_version (campanha): {e}")
+        return None, str(e)
+
 def add_single_product(dados_produto):
     conn = get_db_connection()
     sql = text(f"""
@@ -138,7 +144,8 @@ def update_products_in_bulk(produtos_para_atualizar):
         conn.rollback()
         return 0, str(e)
 
-def delete_products_in_bulk(ids_para_deletar):
+def delete_products_in_bulk(ids_para_deletar, campanha_id=None):
+    """campanha_id: só apaga ids deste campanha (a seleção pode vir de várias páginas)."""
     conn = get_db_connection()
     if not ids_para_deletar:
         return 0, None
@@ -149,10 +156,13 @@ def delete_products_in_bulk(ids_para_deletar):
         sql_text = text(f"""
             DELETE FROM {DIM_CAMPANHA_PRODUTO_TABLE} 
             WHERE id IN ({",".join(placeholders)})
+            {"AND campanha_id = :campanha_id" if campanha_id is not None else ""}
         """)
         
         # Cria o dicionário de parâmetros: {'id_0': '1', 'id_1': '2'}
         params = {f"id_{i}": id_val for i, id_val in enumerate(ids_para_deletar)}
+        if campanha_id is not None:
+            params["campanha_id"] = campanha_id
         
         result = conn.execute(sql_text, params)
         conn.commit()
@@ -172,6 +182,204 @@ def delete_products_by_campaign_id(campanha_id):
         conn.rollback()
         return 0, str(e)
     
+
+######################################
+#   LISTAGEM PAGINADA
+######################################
+# Ordenações da listagem (?ordem=) -> expressão SQL. NULL vira '' / 0 para o
+# cursor da paginação (common_db.consultar_pagina) conseguir comparar.
+ORDENACOES = {
+    "id": "id",
+    "gtin": "COALESCE(codigo_barras, '')",
+    "descricao": "COALESCE(descricao, '')",
+    "preco_normal": "COALESCE(preco_normal, 0)",
+}
+
+def _filtros_produtos(campanha_id, filtros):
+    """Condições (e params) dos filtros da listagem: gtin, descricao e sem_ci (campanha não tem laboratório)."""
+    where = ["campanha_id = :id"]
+    params = {"id": campanha_id}
+    if filtros.get("gtin"):
+        where.append("codigo_barras LIKE :gtin")
+        params["gtin"] = f"%{filtros['gtin']}%"
+    if filtros.get("descricao"):
+        where.append("LOWER(descricao) LIKE :descricao")
+        params["descricao"] = f"%{filtros['descricao'].lower()}%"
+    if filtros.get("sem_ci"):
+        where.append("(codigo_interno IS NULL OR codigo_interno = '')")
+    return where, params
+
+def get_products_page(campanha_id, filtros, ordem="id", decrescente=False, cursor=None, anterior=False, limite=100):
+    """Uma página dos produtos filtrados (ver common_db.consultar_pagina). Retorna (linhas, tem_mais, erro)."""
+    where, params = _filtros_produtos(campanha_id, filtros)
+    return consultar_pagina(
+        DIM_CAMPANHA_PRODUTO_TABLE, where, params, ORDENACOES.get(ordem, "id"), decrescente, cursor, anterior, limite
+    )
+
+def iter_products_filtered(campanha_id, colunas, filtros, ordem="id", decrescente=False, conn=None):
+    """
+    Todos os produtos que passam nos filtros, na ordem da listagem, como tuplas
+    (na ordem de colunas), com cursor no servidor (ver iter_products_for_export).
+    """
+    where, params = _filtros_produtos(campanha_id, filtros)
+    direcao = "DESC" if decrescente else "ASC"
+    sql = text(f"""
+        SELECT {', '.join(colunas)} FROM {DIM_CAMPANHA_PRODUTO_TABLE} WHERE {' AND '.join(where)}
+        ORDER BY {ORDENACOES.get(ordem, "id")} {direcao}, id {direcao}
+    """)
+    return iter_consulta(sql, params, conn)
+
+def count_products(campanha_id, filtros):
+    """Total de produtos que passam nos filtros. Retorna (total, erro)."""
+    conn = get_db_connection()
+    where, params = _filtros_produtos(campanha_id, filtros)
+    sql = text(f"SELECT COUNT(*) FROM {DIM_CAMPANHA_PRODUTO_TABLE} WHERE {' AND '.join(where)}")
+    try:
+        return conn.execute(sql, params).scalar(), None
+    except SQLAlchemyError as e:
+        print(f"Erro em count_products (campanha): {e}")
+        return 0, str(e)
+
+def delete_products_by_filter(campanha_id, filtros):
+    """Remove todos os produtos que passam nos filtros (todas as páginas)."""
+    conn = get_db_connection()
+    where, params = _filtros_produtos(campanha_id, filtros)
+    sql = text(f"DELETE FROM {DIM_CAMPANHA_PRODUTO_TABLE} WHERE {' AND '.join(where)}")
+    try:
+        result = conn.execute(sql, params)
+        conn.commit()
+        return result.rowcount, None
+    except SQLAlchemyError as e:
+        conn.rollback()
+        return 0, str(e)
+
+######################################
+#   CARGA VIA STAGING
+######################################
+# O upload grava os lotes em stg_campanha_produto (identificados por carga_id) sem
+# tocar na tabela real; no fim, replace_products_from_staging troca os produtos
+# da campanha numa única transação curta (DELETE + INSERT ... SELECT).
+
+def add_products_staging(carga_id, produtos):
+    """Grava um lote de produtos (dicts de PRODUTO_PARAMS) na staging, sob o carga_id."""
+    conn = get_db_connection()
+    total, erro = bulk_loader.carregar(
+        conn, STG_CAMPANHA_PRODUTO_TABLE, ["carga_id", "campanha_id"] + PRODUTO_COLUNAS, _linhas_para_carga(produtos, carga_id)
+    )
+    if erro:
+        conn.rollback()
+        return 0, erro
+    conn.commit()
+    return total, None
+
+def replace_products_from_staging(carga_id, campanha_id):
+    """
+    Substitui os produtos da campanha pelos da carga, numa única transação.
+    Se algo falhar, nada muda na tabela real.
+    Retorna ((removidos, inseridos), erro).
+    """
+    conn = get_db_connection()
+    try:
+        removidos = conn.execute(
+            text(f"DELETE FROM {DIM_CAMPANHA_PRODUTO_TABLE} WHERE campanha_id = :cid"), {"cid": campanha_id}
+        ).rowcount
+        inseridos = conn.execute(text(f"""
+            INSERT INTO {DIM_CAMPANHA_PRODUTO_TABLE} (
+                campanha_id, codigo_barras, codigo_barras_normalizado, codigo_interno, descricao, pontuacao,
+                preco_normal, preco_desconto, rebaixe, qtd_limite
+            )
+            SELECT campanha_id, codigo_barras, codigo_barras_normalizado, codigo_interno, descricao, pontuacao,
+                   preco_normal, preco_desconto, rebaixe, qtd_limite
+            FROM {STG_CAMPANHA_PRODUTO_TABLE}
+            WHERE carga_id = :carga_id AND campanha_id = :cid
+            ORDER BY id
+        """), {"carga_id": carga_id, "cid": campanha_id}).rowcount
+        conn.execute(text(f"DELETE FROM {STG_CAMPANHA_PRODUTO_TABLE} WHERE carga_id = :carga_id"), {"carga_id": carga_id})
+        conn.commit()
+        return (removidos, inseridos), None
+    except SQLAlchemyError as e:
+        conn.rollback()
+        return (0, 0), str(e)
+
+def get_products_for_diff(campanha_id):
+    """
+    Produtos atuais da campanha (id + PRODUTO_COLUNAS), para o upload por diferença.
+    Retorna (linhas, erro).
+    """
+    conn = get_db_connection()
+    sql = text(f"""
+        SELECT id, {", ".join(PRODUTO_COLUNAS)}
+        FROM {DIM_CAMPANHA_PRODUTO_TABLE}
+        WHERE campanha_id = :cid
+    """)
+    try:
+        cursor = conn.execute(sql, {"cid": campanha_id})
+        results = cursor.mappings().fetchall()
+        cursor.close()
+        return results, None
+    except SQLAlchemyError as e:
+        return [], str(e)
+
+def apply_staging_diff(carga_id, campanha_id, inserir_cbn, atualizar_ids, remover_ids):
+    """
+    Aplica só as diferenças da carga sobre os produtos da campanha, numa transação:
+    INSERT dos codigo_barras_normalizado novos, UPDATE (via JOIN com a staging
+    pelo codigo_barras_normalizado) dos ids alterados e DELETE dos ids removidos.
+    Os ids das linhas inalteradas são preservados.
+    Retorna ((inseridos, atualizados, removidos), erro).
+    """
+    conn = get_db_connection()
+    base = {"carga_id": carga_id, "cid": campanha_id}
+    colunas = ", ".join(PRODUTO_COLUNAS)
+    atribuicoes = ", ".join(f"t.{c} = s.{c}" for c in PRODUTO_COLUNAS if c != "codigo_barras_normalizado")
+    inseridos = atualizados = removidos = 0
+    try:
+        for placeholders, params in lotes_in(remover_ids, "id"):
+            removidos += conn.execute(text(f"""
+                DELETE FROM {DIM_CAMPANHA_PRODUTO_TABLE}
+                WHERE campanha_id = :cid AND id IN ({placeholders})
+            """), {**base, **params}).rowcount
+
+        for placeholders, params in lotes_in(atualizar_ids, "id"):
+            atualizados += conn.execute(text(f"""
+                UPDATE {DIM_CAMPANHA_PRODUTO_TABLE} t
+                JOIN {STG_CAMPANHA_PRODUTO_TABLE} s
+                  ON s.carga_id = :carga_id AND s.codigo_barras_normalizado = t.codigo_barras_normalizado
+                SET {atribuicoes}
+                WHERE t.campanha_id = :cid AND t.id IN ({placeholders})
+            """), {**base, **params}).rowcount
+
+        for placeholders, params in lotes_in(inserir_cbn, "cbn"):
+            inseridos += conn.execute(text(f"""
+                INSERT INTO {DIM_CAMPANHA_PRODUTO_TABLE} (campanha_id, {colunas})
+                SELECT campanha_id, {colunas}
+                FROM {STG_CAMPANHA_PRODUTO_TABLE}
+                WHERE carga_id = :carga_id AND campanha_id = :cid AND codigo_barras_normalizado IN ({placeholders})
+                ORDER BY id
+            """), {**base, **params}).rowcount
+
+        conn.execute(text(f"DELETE FROM {STG_CAMPANHA_PRODUTO_TABLE} WHERE carga_id = :carga_id"), {"carga_id": carga_id})
+        conn.commit()
+        return (inseridos, atualizados, removidos), None
+    except SQLAlchemyError as e:
+        conn.rollback()
+        return (0, 0, 0), str(e)
+
+def discard_staging(carga_id):
+    """Remove as linhas da carga e as sobras de cargas interrompidas há mais de um dia."""
+    conn = get_db_connection()
+    sql = text(f"""
+        DELETE FROM {STG_CAMPANHA_PRODUTO_TABLE}
+        WHERE carga_id = :carga_id OR criado_em < NOW() - INTERVAL 1 DAY
+    """)
+    try:
+        result = conn.execute(sql, {"carga_id": carga_id})
+        conn.commit()
+        return result.rowcount, None
+    except SQLAlchemyError as e:
+        conn.rollback()
+        return 0, str(e)
+
 def update_product_ci_bulk(produtos_para_atualizar):
     """
     Atualiza GBC, GBC_Normalizado e Codigo_Interno em massa.
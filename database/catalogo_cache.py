@@ -0,0 +1,71 @@
+# database/catalogo_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+# Marca um GTIN que foi consultado e NÃO existe no catálogo (cache negativo).
+# Diferente de None, que é um codigo_interno nulo de um GTIN válido.
+NAO_ENCONTRADO = object()
+
+
+class LRUTTLCache:
+    """
+    Cache em memória, compartilhado pelas threads do processo, com limite de
+    itens (descarta o menos usado recentemente) e tempo de vida por item.
+    """
+
+    def __init__(self, max_itens=50000, ttl_segundos=3600):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._dados = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, chaves):
+        """Retorna ({chave: valor} dos itens válidos no cache, [chaves ausentes])."""
+        agora = time.monotonic()
+        encontrados = {}
+        faltantes = []
+        with self._lock:
+            for chave in chaves:
+                item = self._dados.get(chave)
+                if item is not None and item[0] > agora:
+                    self._dados.move_to_end(chave)
+                    encontrados[chave] = item[1]
+                    self.hits += 1
+                else:
+                    if item is not None:
+                        del self._dados[chave]  # expirado
+                    faltantes.append(chave)
+                    self.misses += 1
+        return encontrados, faltantes
+
+    def set_many(self, itens):
+        expira_em = time.monotonic() + self.ttl_segundos
+        with self._lock:
+            for chave, valor in itens.items():
+                self._dados[chave] = (expira_em, valor)
+                self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "itens": len(self._dados),
+                "max_itens": self.max_itens,
+                "ttl_segundos": self.ttl_segundos,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,231 @@
+# database/catalogo_snapshot.py
+
+import glob
+import os
+import sqlite3
+import threading
+import time
+from sqlalchemy.sql import text
+from sqlalchemy.exc import SQLAlchemyError
+import config
+
+######################################
+#   SNAPSHOT LOCAL DO CATÁLOGO
+######################################
+# Cópia somente-leitura das linhas codigo_principal = 1 de dim_plugpharma_produtos
+# num arquivo SQLite local. As consultas de GTIN resolvem aqui primeiro e só vão
+# ao MySQL pelos GTINs que não estão no snapshot (ex.: produto cadastrado depois
+# do último refresh).
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_cfg = getattr(config, 'CATALOGO_SNAPSHOT', {})
+SNAPSHOT_ATIVO = _cfg.get('ativo', True)
+SNAPSHOT_DIR = _cfg.get('diretorio') or os.path.join(_BASE_DIR, 'instance')
+INTERVALO_REFRESH_SEGUNDOS = _cfg.get('intervalo_refresh_segundos', 3600)
+# Snapshot mais velho que isso é ignorado (tudo volta a ir ao MySQL)
+MAX_IDADE_SEGUNDOS = _cfg.get('max_idade_segundos', 6 * 3600)
+
+_SQLITE_CHUNK = 500  # limite de parâmetros por consulta no SQLite
+_PREFIXO = "catalogo_snapshot-"
+# Cada refresh grava um arquivo novo (o nome carrega o timestamp) em vez de
+# sobrescrever o atual: no Windows não dá para substituir um arquivo que outras
+# threads mantêm aberto. As threads passam para o mais novo na próxima consulta.
+_INTERVALO_VERIFICA_ARQUIVO = 30
+# Versão do layout do arquivo (meta "formato"): arquivos de outra versão são
+# ignorados até o próximo refresh. 2 = codigo_interno no tipo nativo do MySQL.
+_FORMATO = "2"
+_arquivo_cache = {"verificado_em": 0.0, "caminho": None}
+
+_local = threading.local()  # uma conexão SQLite (somente leitura) por thread
+_refresh_lock = threading.Lock()
+_refresh_thread = None
+
+
+def refresh_snapshot(engine):
+    """
+    Recria o snapshot a partir do MySQL (cursor do lado do servidor, em lotes)
+    num arquivo temporário, que só é publicado (renomeado) quando completo.
+    Retorna (total_de_linhas, erro).
+    """
+    if engine is None:
+        return 0, "Engine do SQLAlchemy não está disponível."
+
+    with _refresh_lock:
+        gerado_em = time.time()
+        destino = os.path.join(SNAPSHOT_DIR, f"{_PREFIXO}{int(gerado_em * 1000)}.sqlite3")
+        tmp_path = f"{destino}.{os.getpid()}.tmp"
+
+        total = 0
+        lite = None
+        try:
+            # Diretório inválido, sem permissão ou disco cheio também viram erro (e o tmp sai)
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            lite = sqlite3.connect(tmp_path)
+            lite.execute("""
+                CREATE TABLE catalogo (
+                    codigo_barras TEXT PRIMARY KEY,
+                    codigo_interno  -- sem tipo declarado: guarda o valor como veio do MySQL
+                ) WITHOUT ROWID
+            """)
+            lite.execute("CREATE TABLE meta (chave TEXT PRIMARY KEY, valor TEXT)")
+
+            with engine.connect() as conn:
+                result = conn.execution_options(stream_results=True).execute(text("""
+                    SELECT codigo_barras, codigo_interno
+                    FROM dim_plugpharma_produtos
+                    WHERE codigo_principal = 1 AND codigo_barras IS NOT NULL
+                """))
+                for lote in result.partitions(10000):
+                    lite.executemany(
+                        "INSERT OR REPLACE INTO catalogo (codigo_barras, codigo_interno) VALUES (?, ?)",
+                        # Mesmo tipo que o MySQL/cache devolvem (o GTIN resolve igual em qualquer camada)
+                        [(row[0], row[1]) for row in lote]
+                    )
+                    total += len(lote)
+                result.close()
+
+            lite.executemany("INSERT INTO meta (chave, valor) VALUES (?, ?)", [
+                ("atualizado_em", str(gerado_em)),
+                ("total", str(total)),
+                ("formato", _FORMATO),
+            ])
+            lite.commit()
+            lite.close()
+            lite = None
+            os.replace(tmp_path, destino)
+        except (SQLAlchemyError, sqlite3.Error, OSError) as e:
+            if lite is not None:
+                lite.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass  # Nem chegou a ser criado
+            return 0, str(e)
+
+        _arquivo_cache["verificado_em"] = 0.0
+        _remover_snapshots_antigos(manter=destino)
+        return total, None
+
+
+def _remover_snapshots_antigos(manter):
+    for caminho in glob.glob(os.path.join(SNAPSHOT_DIR, f"{_PREFIXO}*.sqlite3")):
+        if caminho != manter:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass  # ainda aberto por alguma thread; sai no próximo refresh
+
+
+def _arquivo_atual():
+    """Caminho do snapshot mais recente (a listagem do diretório é revista a cada 30s)."""
+    agora = time.monotonic()
+    if agora - _arquivo_cache["verificado_em"] > _INTERVALO_VERIFICA_ARQUIVO:
+        arquivos = glob.glob(os.path.join(SNAPSHOT_DIR, f"{_PREFIXO}*.sqlite3"))
+        _arquivo_cache["caminho"] = max(arquivos) if arquivos else None
+        _arquivo_cache["verificado_em"] = agora
+    return _arquivo_cache["caminho"]
+
+
+def _get_conexao():
+    """Conexão SQLite da thread atual; reabre se um refresh gerou um arquivo novo."""
+    caminho = _arquivo_atual()
+    if caminho is None:
+        return None
+
+    lite = getattr(_local, 'conn', None)
+    if lite is not None and getattr(_local, 'caminho', None) == caminho:
+        return lite
+    if lite is not None:
+        lite.close()
+
+    lite = None
+    try:
+        lite = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+        meta = dict(lite.execute("SELECT chave, valor FROM meta").fetchall())
+        if meta.get("formato") != _FORMATO:
+            raise ValueError(f"formato {meta.get('formato')} do snapshot")
+        atualizado_em = float(meta["atualizado_em"])
+    except (sqlite3.Error, KeyError, TypeError, ValueError):
+        if lite is not None:
+            lite.close()
+        _local.conn = None
+        return None
+
+    _local.conn = lite
+    _local.caminho = caminho
+    _local.atualizado_em = atualizado_em
+    return lite
+
+
+def lookup(gtin_list):
+    """
+    Resolve os GTINs no snapshot.
+    Retorna ({gtin: codigo_interno} dos encontrados, [gtins não encontrados]),
+    ou None se o snapshot estiver desativado, ausente ou velho demais.
+    """
+    if not SNAPSHOT_ATIVO:
+        return None
+    lite = _get_conexao()
+    if lite is None or time.time() - _local.atualizado_em > MAX_IDADE_SEGUNDOS:
+        return None
+
+    gtin_list = list(gtin_list)
+    encontrados = {}
+    try:
+        for inicio in range(0, len(gtin_list), _SQLITE_CHUNK):
+            lote = gtin_list[inicio:inicio + _SQLITE_CHUNK]
+            placeholders = ",".join("?" * len(lote))
+            rows = lite.execute(
+                f"SELECT codigo_barras, codigo_interno FROM catalogo WHERE codigo_barras IN ({placeholders})",
+                lote
+            ).fetchall()
+            encontrados.update(dict(rows))
+    except sqlite3.Error as e:
+        print(f"Erro ao consultar snapshot do catálogo: {e}")
+        return None
+
+    return encontrados, [g for g in gtin_list if g not in encontrados]
+
+
+def status():
+    """Marca d'água do snapshot: quando foi gerado, idade e se ainda está em uso."""
+    lite = _get_conexao() if SNAPSHOT_ATIVO else None
+    if lite is None:
+        return {"ativo": SNAPSHOT_ATIVO, "disponivel": False, "diretorio": SNAPSHOT_DIR}
+
+    total = lite.execute("SELECT valor FROM meta WHERE chave = 'total'").fetchone()
+    idade = time.time() - _local.atualizado_em
+    return {
+        "ativo": SNAPSHOT_ATIVO,
+        "disponivel": True,
+        "caminho": _local.caminho,
+        "atualizado_em": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_local.atualizado_em)),
+        "idade_segundos": int(idade),
+        "total": int(total[0]) if total else None,
+        "vencido": idade > MAX_IDADE_SEGUNDOS,
+    }
+
+
+def iniciar_refresh_periodico(engine):
+    """Sobe (uma vez por processo) uma thread daemon que recria o snapshot a cada intervalo."""
+    global _refresh_thread
+    if not SNAPSHOT_ATIVO or (_refresh_thread is not None and _refresh_thread.is_alive()):
+        return
+
+    def _loop():
+        while True:
+            inicio = time.monotonic()
+            try:
+                total, erro = refresh_snapshot(engine)
+                if erro:
+                    print(f"Erro ao atualizar snapshot do catálogo: {erro}")
+                else:
+                    print(f"Snapshot do catálogo atualizado: {total} GTINs em {time.monotonic() - inicio:.1f}s")
+            except Exception as e:
+                # Qualquer falha inesperada não pode matar a thread: tenta de novo no próximo intervalo
+                print(f"Erro inesperado no refresh do snapshot do catálogo: {e}")
+            time.sleep(INTERVALO_REFRESH_SEGUNDOS)
+
+    _refresh_thread = threading.Thread(target=_loop, name="catalogo-snapshot-refresh", daemon=True)
+    _refresh_thread.start()
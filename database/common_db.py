@@ -1,11 +1,18 @@
 # database/common_db.py
 
+import threading
+import time
 import sqlalchemy
+import sqlalchemy.event
 from sqlalchemy.sql import text
 from sqlalchemy.exc import SQLAlchemyError
 from flask import g
+import config
 from config import DB_CONFIG # Você ainda usa o config
 from urllib.parse import quote_plus
+from database.catalogo_cache import LRUTTLCache, NAO_ENCONTRADO
+import database.catalogo_snapshot as catalogo_snapshot
+from utils import clean_barcode, pad_barcode
 
 ######################################
 #   CONFIGURAÇÕES CONEXÃO BANCO
@@ -23,20 +30,138 @@ try:
 except KeyError:
     raise RuntimeError("DB_CONFIG em config.py está incompleto (faltando user, password, host ou database)")
 
+# 1. Pool e threads do Waitress num único bloco (SERVER_CONFIG em config.py).
+# Cada thread do Waitress segura no máximo uma conexão por vez, então o padrão
+# é pool_size = threads. O overflow cobre quem segura conexão fora delas:
+# workers de upload (UPLOAD_CONFIG['jobs_workers']), workers das planilhas do
+# ZIP (EXPORT_CONFIG['lote_workers']), a thread do snapshot do catálogo (+1)
+# e uma folga para as exportações CSV/TSV em streaming (abrir_conexao).
+_server_cfg = getattr(config, 'SERVER_CONFIG', {})
+WAITRESS_THREADS = _server_cfg.get('threads', 4)
+POOL_SIZE = _server_cfg.get('pool_size', WAITRESS_THREADS)
+_CONEXOES_SEGUNDO_PLANO = (
+    getattr(config, 'UPLOAD_CONFIG', {}).get('jobs_workers', 2)
+    + getattr(config, 'EXPORT_CONFIG', {}).get('lote_workers', 2)
+    + 1
+    + _server_cfg.get('folga_exportacoes', 2)
+)
+POOL_MAX_OVERFLOW = _server_cfg.get('max_overflow')
+if POOL_MAX_OVERFLOW is None:
+    POOL_MAX_OVERFLOW = _CONEXOES_SEGUNDO_PLANO
+POOL_TIMEOUT = _server_cfg.get('pool_timeout', 10)      # Segundos esperando uma conexão livre
+POOL_RECYCLE = _server_cfg.get('pool_recycle', 3600)    # Recicla conexões após 1 hora
+
 # 2. Criar o Engine (o objeto que gerencia o pool)
 try:
     engine = sqlalchemy.create_engine(
         DB_URL,
-        pool_size=2,          # Perfeito para Waitress que tem 4 threads! pool_size <= 4
-        max_overflow=2,       # Conexões temporárias se o pool estiver cheio
-        pool_recycle=3600,    # Recicla conexões após 1 hora (opcional, mas bom)
-        pool_pre_ping=True    # Testa a conexão antes de usar
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,   # Conexões temporárias se o pool estiver cheio
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=True,               # Testa a conexão antes de usar
+        # LOAD DATA LOCAL INFILE do bulk_loader (o cliente precisa permitir explicitamente)
+        connect_args={"local_infile": True} if getattr(config, 'BULK_LOADER', {}).get('load_data_local') else {}
     )
 except Exception as e:
     print(f"Erro ao criar o engine do SQLAlchemy: {e}")
     print(DB_URL)
     engine = None
 
+######################################
+#   MÉTRICAS DO POOL
+######################################
+
+class _PoolStats:
+    """Contadores de uso do pool, alimentados pelos eventos do SQLAlchemy."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.conexoes_abertas = 0
+        self.timeouts = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.espera_ultima = 0.0
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.esperas += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            self.espera_ultima = segundos
+
+    def incrementar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "conexoes_abertas": self.conexoes_abertas,
+                "timeouts": self.timeouts,
+                "espera_media_ms": round(self.espera_total / self.esperas * 1000, 2) if self.esperas else 0.0,
+                "espera_max_ms": round(self.espera_max * 1000, 2),
+                "espera_ultima_ms": round(self.espera_ultima * 1000, 2),
+            }
+
+pool_stats = _PoolStats()
+
+if engine is not None:
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, conn_record):
+        pool_stats.incrementar("conexoes_abertas")
+
+    @sqlalchemy.event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        pool_stats.incrementar("checkouts")
+
+    @sqlalchemy.event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, conn_record):
+        pool_stats.incrementar("checkins")
+
+def _checkout_conexao():
+    """engine.connect() medindo quanto tempo a thread esperou por uma conexão livre."""
+    inicio = time.perf_counter()
+    try:
+        conn = engine.connect()
+    except sqlalchemy.exc.TimeoutError:
+        pool_stats.incrementar("timeouts")
+        raise
+    pool_stats.registrar_espera(time.perf_counter() - inicio)
+    return conn
+
+def abrir_conexao():
+    """
+    Conexão própria do pool para usos fora da conexão da requisição (ex.:
+    exportação em streaming), com as métricas e o timeout do checkout.
+    Quem chama devolve com conn.close().
+    """
+    if engine is None:
+        raise SQLAlchemyError("Engine do SQLAlchemy não está disponível.")
+    return _checkout_conexao()
+
+def get_pool_status():
+    """Estado atual do pool + métricas acumuladas (usado em /health/db)."""
+    if engine is None:
+        return {"disponivel": False}
+    pool = engine.pool
+    return {
+        "disponivel": True,
+        "pool_size": pool.size(),
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "waitress_threads": WAITRESS_THREADS,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        **pool_stats.snapshot(),
+    }
+
 # --- FUNÇÃO PARA OBTER CONEXÃO ---
 def get_db_connection():
     """Obtém uma conexão do pool do SQLAlchemy."""
@@ -44,7 +169,7 @@ def get_db_connection():
         if 'db_conn' not in g:
             if engine is None:
                  raise Exception("Engine do SQLAlchemy não está disponível.")
-            g.db_conn = engine.connect()
+            g.db_conn = _checkout_conexao()
         return g.db_conn
     except Exception as e:
         print(f"Erro ao obter conexão do pool SQLAlchemy: {e}")
@@ -57,73 +182,263 @@ def close_db_connection(e=None):
     if db is not None:
         db.close() # No SQLAlchemy, .close() DEVOLVE a conexão ao pool
 
-# --- FUNÇÕES DE BANCO (Refatoradas para SQLAlchemy) ---
+def release_db_connection(*args, **kwargs):
+    """
+    Devolve a conexão ao pool ANTES do fim da requisição, assim que a camada
+    de dados terminou (antes de renderizar templates ou chamar APIs externas).
+    Se alguma consulta vier depois, get_db_connection() pega outra do pool.
+    Todas as escritas já fazem commit, então nada pendente é perdido.
+    Aceita *args/**kwargs para poder ser ligada direto a sinais do Flask.
+    """
+    close_db_connection()
 
-def validate_gtins_in_external_db(gtin_list):
+# --- CONSULTAS GRANDES (EXPORTAÇÃO) ---
+_export_cfg = getattr(config, 'EXPORT_CONFIG', {})
+EXPORT_LINHAS_POR_LOTE = _export_cfg.get('linhas_por_lote', 2000)
+
+def iter_consulta(sql, params=None, conn=None, linhas_por_lote=None):
     """
-    Valida se os GTINs (códigos de barras RAW/limpos) existem na tabela externa
-    E SÃO O CÓDIGO PRINCIPAL (codigo_principal = 1).
-    Retorna o set de GTINs válidos encontrados.
+    Executa o SELECT com cursor no servidor (stream_results: SSCursor no
+    PyMySQL) e gera as linhas como tuplas, buscando linhas_por_lote por vez:
+    a memória não cresce com o tamanho do resultado.
+    Enquanto o gerador não terminar, a conexão fica ocupada com o resultado
+    (não faça outras consultas nela). conn padrão: a da requisição.
     """
-    if not gtin_list:
-        return set(), None
+    conn = conn if conn is not None else get_db_connection()
+    if conn is None:
+        raise SQLAlchemyError("Sem conexão com o banco.")
+    result = conn.execution_options(stream_results=True).execute(sql, params or {})
+    try:
+        for lote in result.partitions(linhas_por_lote or EXPORT_LINHAS_POR_LOTE):
+            yield from (tuple(row) for row in lote)
+    finally:
+        result.close()
 
+# --- PAGINAÇÃO POR CHAVE (KEYSET) ---
+
+def consultar_pagina(tabela, where, params, ordem, decrescente=False, cursor=None, anterior=False, limite=100):
+    """
+    Uma página de `tabela` ordenada por (ordem, id), sem OFFSET: continua
+    depois do cursor = (valor da ordem, id) da última linha vista, ou volta
+    para antes dele com anterior=True (cursor da primeira linha).
+    where: lista de condições SQL (com params); ordem: expressão fixa do
+    código (entra direto no SQL). Cada linha traz também `_ordem`, para montar
+    o próximo cursor.
+    Retorna (linhas na ordem de exibição, tem_mais, erro).
+    """
     conn = get_db_connection()
-    if conn is None:
-        return None, "Não foi possível conectar ao banco de dados."
+    # Página anterior: percorre no sentido contrário e inverte o resultado
+    para_tras = decrescente != anterior
+    operador, direcao = ('<', 'DESC') if para_tras else ('>', 'ASC')
 
+    condicoes = list(where)
+    params = dict(params, _limite=limite + 1)
+    if cursor is not None:
+        condicoes.append(f"({ordem} {operador} :_valor OR ({ordem} = :_valor AND id {operador} :_id))")
+        params["_valor"], params["_id"] = cursor
+    sql = text(f"""
+        SELECT *, {ordem} AS _ordem FROM {tabela}
+        WHERE {' AND '.join(condicoes) or '1 = 1'}
+        ORDER BY {ordem} {direcao}, id {direcao}
+        LIMIT :_limite
+    """)
     try:
-        # Cria placeholders seguros: :gtin_0, :gtin_1 ...
-        placeholders = [f":gtin_{i}" for i in range(len(gtin_list))]
+        linhas = conn.execute(sql, params).mappings().fetchall()
+    except SQLAlchemyError as e:
+        print(f"Erro em consultar_pagina ({tabela}): {e}")
+        return [], False, str(e)
+
+    tem_mais = len(linhas) > limite
+    linhas = list(linhas[:limite])
+    if anterior:
+        linhas.reverse()
+    return linhas, tem_mais, None
+
+# --- FUNÇÕES DE BANCO (Refatoradas para SQLAlchemy) ---
+
+######################################
+#   CATÁLOGO DE PRODUTOS (dim_plugpharma_produtos)
+######################################
+
+# Cache GTIN -> codigo_interno compartilhado por todas as requisições.
+# Também guarda os GTINs NÃO encontrados, para não consultá-los de novo.
+_gtin_cache_cfg = getattr(config, 'GTIN_CACHE', {})
+gtin_cache = LRUTTLCache(
+    max_itens=_gtin_cache_cfg.get('max_itens', 50000),
+    ttl_segundos=_gtin_cache_cfg.get('ttl_segundos', 3600)
+)
+
+# Estratégia de consulta para listas grandes (planilhas de 15k+ linhas):
+# até `limite_tabela_temporaria` GTINs usa IN (...) em lotes de `chunk_size`;
+# acima disso carrega os GTINs numa tabela temporária da sessão e faz JOIN.
+_lookup_cfg = getattr(config, 'CATALOGO_LOOKUP', {})
+LOOKUP_CHUNK_SIZE = _lookup_cfg.get('chunk_size', 1000)
+LOOKUP_LIMITE_TABELA_TEMP = _lookup_cfg.get('limite_tabela_temporaria', 5000)
+
+TMP_LOOKUP_GTINS_TABLE = "tmp_lookup_gtins"
+
+def lotes_in(valores, prefixo="v", chunk_size=None):
+    """
+    Divide os valores em lotes para cláusulas IN (...).
+    Gera (placeholders, params) por lote: (":v_0,:v_1", {"v_0": ..., "v_1": ...}).
+    """
+    chunk_size = chunk_size or LOOKUP_CHUNK_SIZE
+    valores = list(valores)
+    for inicio in range(0, len(valores), chunk_size):
+        lote = valores[inicio:inicio + chunk_size]
+        params = {f"{prefixo}_{i}": v for i, v in enumerate(lote)}
+        yield ",".join(f":{p}" for p in params), params
+
+def _consultar_catalogo_em_lotes(conn, gtin_list, chunk_size=None):
+    """SELECT ... IN (...) em lotes (lotes_in), para não gerar um statement gigante."""
+    encontrados = {}
+    for placeholders, params in lotes_in(gtin_list, "gtin", chunk_size):
         sql_text = text(f"""
-            SELECT codigo_barras AS gtin
+            SELECT codigo_barras, codigo_interno
             FROM dim_plugpharma_produtos
-            -- NOTA: Filtro ADICIONADO para alinhar com a regra de negócio
-            WHERE `codigo_principal` = 1 
-              AND `codigo_barras` IN ({",".join(placeholders)})
+            -- Somente o código principal vale para a regra de negócio
+            WHERE codigo_principal = 1 AND `codigo_barras` IN ({placeholders})
         """)
-        
-        # Cria o dicionário de parâmetros: {'gtin_0': '123', 'gtin_1': '456'}
-        params = {f"gtin_{i}": gtin for i, gtin in enumerate(gtin_list)}
-        
         cursor = conn.execute(sql_text, params)
-        validos = {row[0] for row in cursor.fetchall()}
+        encontrados.update({row['codigo_barras']: row['codigo_interno'] for row in cursor.mappings().fetchall()})
         cursor.close()
-        return validos, None
-        
-    except SQLAlchemyError as e:
-        return None, str(e)
+    return encontrados
 
+def _consultar_catalogo_tabela_temporaria(conn, gtin_list, chunk_size=None):
+    """Carrega os GTINs numa tabela TEMPORARY (só desta sessão) e faz JOIN."""
+    chunk_size = chunk_size or LOOKUP_CHUNK_SIZE
+    conn.execute(text(f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS {TMP_LOOKUP_GTINS_TABLE} (
+            codigo_barras VARCHAR(64) NOT NULL PRIMARY KEY
+        )
+    """))
+    try:
+        conn.execute(text(f"DELETE FROM {TMP_LOOKUP_GTINS_TABLE}"))
+        sql_insert = text(f"INSERT IGNORE INTO {TMP_LOOKUP_GTINS_TABLE} (codigo_barras) VALUES (:gtin)")
+        for inicio in range(0, len(gtin_list), chunk_size):
+            # executemany: o PyMySQL agrupa num INSERT de várias linhas
+            conn.execute(sql_insert, [{"gtin": g} for g in gtin_list[inicio:inicio + chunk_size]])
 
-def get_codigo_interno_map_from_gtins(gtin_list):
+        cursor = conn.execute(text(f"""
+            SELECT p.codigo_barras, p.codigo_interno
+            FROM {TMP_LOOKUP_GTINS_TABLE} t
+            JOIN dim_plugpharma_produtos p ON p.codigo_barras = t.codigo_barras
+            WHERE p.codigo_principal = 1
+        """))
+        encontrados = {row['codigo_barras']: row['codigo_interno'] for row in cursor.mappings().fetchall()}
+        cursor.close()
+        return encontrados
+    finally:
+        # A conexão volta ao pool: não deixa a tabela temporária pendurada nela.
+        # Falha aqui (ex.: conexão já inválida) só é registrada, para não
+        # esconder o erro original do SELECT/INSERT.
+        try:
+            conn.execute(text(f"DROP TEMPORARY TABLE IF EXISTS {TMP_LOOKUP_GTINS_TABLE}"))
+        except SQLAlchemyError as e:
+            print(f"Erro ao remover a tabela temporária {TMP_LOOKUP_GTINS_TABLE}: {e}")
+
+def _consultar_catalogo(gtin_list):
     """
-    Busca o codigo_interno a partir da lista de GTINs (códigos de barras RAW/limpos).
-    Requer que o GTIN seja o código principal (codigo_principal = 1).
+    Consulta no banco os GTINs (limpos) que são código principal.
+    Retorna ({codigo_barras: codigo_interno}, erro).
     """
-    if not gtin_list:
-        return {}, None
-
     conn = get_db_connection()
     if conn is None:
         return None, "Não foi possível conectar ao banco de dados."
 
+    gtin_list = list(gtin_list)
     try:
-        placeholders = [f":gtin_{i}" for i in range(len(gtin_list))]
-        sql_text = text(f"""
-            SELECT codigo_barras, codigo_interno
-            FROM dim_plugpharma_produtos
-            -- FIX: O filtro é mantido para garantir que o CI retornado seja o principal
-            WHERE codigo_principal = 1 AND `codigo_barras` IN ({",".join(placeholders)})
-        """)
-        
-        params = {f"gtin_{i}": gtin for i, gtin in enumerate(gtin_list)}
-        
-        cursor = conn.execute(sql_text, params)
-        # Retorna um mapa {codigo_barras_raw: codigo_interno}
-        validos_map = {row['codigo_barras']: row['codigo_interno'] for row in cursor.mappings().fetchall()}
-        cursor.close()
-        return validos_map, None
-        
+        if len(gtin_list) > LOOKUP_LIMITE_TABELA_TEMP:
+            return _consultar_catalogo_tabela_temporaria(conn, gtin_list), None
+        return _consultar_catalogo_em_lotes(conn, gtin_list), None
+
     except SQLAlchemyError as e:
         return None, str(e)
 
+def _buscar_catalogo(gtin_list):
+    """
+    Resolve os GTINs passando pelo cache e pelo snapshot local;
+    só vai ao banco pelos que faltam.
+    Retorna ({gtin_limpo: codigo_interno} apenas dos encontrados, erro).
+    """
+    chaves = {clean_barcode(str(g)) for g in gtin_list if g is not None}
+    chaves.discard(None)
+    if not chaves:
+        return {}, None
+
+    em_cache, faltantes = gtin_cache.get_many(chaves)
+
+    if faltantes:
+        novos = {}
+
+        # Snapshot local primeiro; só os ausentes nele vão ao MySQL
+        resultado_snapshot = catalogo_snapshot.lookup(faltantes)
+        if resultado_snapshot is not None:
+            do_snapshot, faltantes = resultado_snapshot
+            novos.update(do_snapshot)
+
+        if faltantes:
+            do_banco, err = _consultar_catalogo(faltantes)
+            if err:
+                return None, err
+            novos.update({g: do_banco.get(g, NAO_ENCONTRADO) for g in faltantes})
+
+        gtin_cache.set_many(novos)
+        em_cache.update(novos)
+
+    return {g: ci for g, ci in em_cache.items() if ci is not NAO_ENCONTRADO}, None
+
+def resolver_gtins_catalogo(gtin_list):
+    """
+    Resolve de uma vez (uma única consulta, via cache) validade, codigo_interno
+    e código normalizado de cada GTIN.
+    Retorna ({gtin_limpo: {"valido", "codigo_interno", "codigo_barras_normalizado"}}, erro).
+    """
+    if not gtin_list:
+        return {}, None
+
+    encontrados, err = _buscar_catalogo(gtin_list)
+    if err:
+        return None, err
+
+    resultado = {}
+    for g in gtin_list:
+        gtin_limpo = clean_barcode(str(g)) if g is not None else None
+        if not gtin_limpo or gtin_limpo in resultado:
+            continue
+        resultado[gtin_limpo] = {
+            "valido": gtin_limpo in encontrados,
+            "codigo_interno": encontrados.get(gtin_limpo),
+            "codigo_barras_normalizado": pad_barcode(gtin_limpo)
+        }
+    return resultado, None
+
+def get_gtin_cache_stats():
+    """Contadores do cache de GTINs (hits, misses, tamanho...)."""
+    return gtin_cache.stats()
+
+def validate_gtins_in_external_db(gtin_list):
+    """
+    Valida se os GTINs (códigos de barras RAW/limpos) existem na tabela externa
+    E SÃO O CÓDIGO PRINCIPAL (codigo_principal = 1).
+    Retorna o set de GTINs válidos encontrados.
+    """
+    if not gtin_list:
+        return set(), None
+
+    encontrados, err = _buscar_catalogo(gtin_list)
+    if err:
+        return None, err
+    return set(encontrados.keys()), None
+
+
+def get_codigo_interno_map_from_gtins(gtin_list):
+    """
+    Busca o codigo_interno a partir da lista de GTINs (códigos de barras RAW/limpos).
+    Requer que o GTIN seja o código principal (codigo_principal = 1).
+    """
+    if not gtin_list:
+        return {}, None
+
+    # Retorna um mapa {codigo_barras_raw: codigo_interno}
+    return _buscar_catalogo(gtin_list)
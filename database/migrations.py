@@ -0,0 +1,295 @@
+# database/migrations.py
+
+from sqlalchemy.sql import text
+from sqlalchemy.exc import SQLAlchemyError
+from database.common_db import engine
+from database.parceiro_db import DIM_PARCEIRO_TABLE
+from database.campanha_db import DIM_CAMPANHA_TABLE
+from database.tabloide_db import DIM_TABLOIDE_TABLE
+from database.campanha_produtos_db import DIM_CAMPANHA_PRODUTO_TABLE, STG_CAMPANHA_PRODUTO_TABLE
+from database.tabloide_produtos_db import DIM_TABLOIDE_PRODUTO_TABLE, STG_TABLOIDE_PRODUTO_TABLE
+
+SCHEMA_MIGRATIONS_TABLE = "schema_migrations"
+
+######################################
+#   MIGRAÇÕES (em ordem de versão)
+######################################
+# Cada migração recebe a conexão e deve ser idempotente: se for reexecutada
+# sobre um banco que já tem a alteração, não pode falhar.
+# NUNCA altere uma migração já publicada; crie uma nova versão no fim da lista.
+
+def _criar_tabela_parceiros(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {DIM_PARCEIRO_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            api_user_id VARCHAR(50) DEFAULT NULL,
+            nome_ajustado VARCHAR(255) NOT NULL,
+            tipo VARCHAR(100) DEFAULT NULL,
+            cnpj VARCHAR(20) DEFAULT NULL,
+            nome_fantasia VARCHAR(255) DEFAULT NULL,
+            razao_social VARCHAR(255) DEFAULT NULL,
+            gestor VARCHAR(255) DEFAULT NULL,
+            telefone_gestor VARCHAR(20) DEFAULT NULL,
+            email_gestor VARCHAR(255) DEFAULT NULL,
+            data_entrada DATE DEFAULT NULL,
+            data_saida DATE DEFAULT NULL,
+            status TINYINT DEFAULT 1,
+            `senha_definida` TINYINT(1) NOT NULL DEFAULT '0',
+            contrato_arquivo VARCHAR(255) DEFAULT NULL,
+            data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP
+                ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_api_user_id (api_user_id)
+        )
+    """))
+
+def _criar_tabela_tabloide(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {DIM_TABLOIDE_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nome VARCHAR(255) NOT NULL,
+            data_inicio DATE NOT NULL,
+            data_fim DATE NOT NULL,
+            status INT DEFAULT 1,
+            data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE(nome, data_inicio, data_fim)
+        )
+    """))
+
+def _criar_tabela_campanha(conn):
+    # Depende de dim_parceiros (FK parceiro_id)
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {DIM_CAMPANHA_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nome VARCHAR(255) NOT NULL,
+            data_inicio DATE NOT NULL,
+            data_fim DATE NOT NULL,
+            status INT DEFAULT 1,
+            parceiro_id INT DEFAULT NULL,
+            data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE(nome),
+            FOREIGN KEY (parceiro_id) REFERENCES {DIM_PARCEIRO_TABLE}(id) ON DELETE SET NULL
+        )
+    """))
+
+def _coluna_existe(conn, tabela, coluna):
+    """ADD COLUMN IF NOT EXISTS só existe no MariaDB: a checagem vale também no MySQL."""
+    res = conn.execute(text("""
+        SELECT COUNT(*)
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = :tabela
+          AND COLUMN_NAME = :coluna
+    """), {"tabela": tabela, "coluna": coluna})
+    return res.scalar() > 0
+
+def _garantir_parceiro_campanha(conn):
+    """Tabelas antigas de campanha não tinham parceiro_id nem a FK."""
+    if not _coluna_existe(conn, DIM_CAMPANHA_TABLE, 'parceiro_id'):
+        conn.execute(text(f"""
+            ALTER TABLE {DIM_CAMPANHA_TABLE}
+            ADD COLUMN parceiro_id INT DEFAULT NULL
+        """))
+
+    # Qualquer FK sobre parceiro_id serve (a do CREATE TABLE tem nome gerado)
+    res = conn.execute(text(f"""
+        SELECT COUNT(*)
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE CONSTRAINT_SCHEMA = DATABASE()
+          AND TABLE_NAME = '{DIM_CAMPANHA_TABLE}'
+          AND COLUMN_NAME = 'parceiro_id'
+          AND REFERENCED_TABLE_NAME = '{DIM_PARCEIRO_TABLE}'
+    """))
+    if res.scalar() == 0:
+        conn.execute(text(f"""
+            ALTER TABLE {DIM_CAMPANHA_TABLE}
+            ADD CONSTRAINT fk_campanha_parceiro
+            FOREIGN KEY (parceiro_id) REFERENCES {DIM_PARCEIRO_TABLE}(id)
+            ON DELETE SET NULL
+        """))
+
+def _criar_tabela_campanha_produto(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {DIM_CAMPANHA_PRODUTO_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            campanha_id INT NOT NULL,
+            codigo_barras VARCHAR(14),
+            codigo_barras_normalizado VARCHAR(14) NOT NULL,
+            codigo_interno VARCHAR(14) DEFAULT NULL,
+            descricao TEXT,
+            pontuacao INT,
+            preco_normal DECIMAL(10, 2),
+            preco_desconto DECIMAL(10, 2),
+            rebaixe DECIMAL(10, 2),
+            qtd_limite INT,
+            data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (campanha_id) REFERENCES {DIM_CAMPANHA_TABLE}(id) ON DELETE CASCADE
+        )
+    """))
+
+def _normalizado_not_null_campanha_produto(conn):
+    """Tabelas antigas criadas com codigo_barras_normalizado anulável."""
+    res = conn.execute(text(f"""
+        SELECT IS_NULLABLE
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = '{DIM_CAMPANHA_PRODUTO_TABLE}'
+          AND COLUMN_NAME = 'codigo_barras_normalizado'
+    """))
+    if res.scalar() == 'YES':
+        conn.execute(text(f"""
+            ALTER TABLE {DIM_CAMPANHA_PRODUTO_TABLE}
+            MODIFY COLUMN codigo_barras_normalizado VARCHAR(14) NOT NULL
+        """))
+
+def _criar_tabela_tabloide_produto(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {DIM_TABLOIDE_PRODUTO_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            tabloide_id INT NOT NULL,
+            codigo_barras VARCHAR(14),
+            codigo_barras_normalizado VARCHAR(14) DEFAULT NULL,
+            codigo_interno VARCHAR(14) DEFAULT NULL,
+            descricao TEXT,
+            laboratorio VARCHAR(255),
+            tipo_preco VARCHAR(100) DEFAULT NULL,
+            preco_normal DECIMAL(10, 2),
+            preco_desconto DECIMAL(10, 2),
+            preco_desconto_cliente DECIMAL(10, 2),
+            preco_app DECIMAL(10, 2),
+            tipo_regra VARCHAR(100),
+            data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (tabloide_id) REFERENCES {DIM_TABLOIDE_TABLE}(id) ON DELETE CASCADE
+        )
+    """))
+
+def _normalizado_tabloide_produto(conn):
+    """Tabelas antigas de tabloide não tinham codigo_barras_normalizado."""
+    if not _coluna_existe(conn, DIM_TABLOIDE_PRODUTO_TABLE, 'codigo_barras_normalizado'):
+        conn.execute(text(f"""
+            ALTER TABLE {DIM_TABLOIDE_PRODUTO_TABLE}
+            ADD COLUMN codigo_barras_normalizado VARCHAR(14) DEFAULT NULL
+            AFTER codigo_barras
+        """))
+
+def _criar_staging_campanha_produto(conn):
+    # Sem FK: a staging só guarda a carga até a troca (replace_products_from_staging)
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {STG_CAMPANHA_PRODUTO_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            carga_id CHAR(32) NOT NULL,
+            campanha_id INT NOT NULL,
+            codigo_barras VARCHAR(14),
+            codigo_barras_normalizado VARCHAR(14) NOT NULL,
+            codigo_interno VARCHAR(14) DEFAULT NULL,
+            descricao TEXT,
+            pontuacao INT,
+            preco_normal DECIMAL(10, 2),
+            preco_desconto DECIMAL(10, 2),
+            rebaixe DECIMAL(10, 2),
+            qtd_limite INT,
+            criado_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_carga (carga_id),
+            INDEX idx_criado_em (criado_em)
+        )
+    """))
+
+def _criar_staging_tabloide_produto(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {STG_TABLOIDE_PRODUTO_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            carga_id CHAR(32) NOT NULL,
+            tabloide_id INT NOT NULL,
+            codigo_barras VARCHAR(14),
+            codigo_barras_normalizado VARCHAR(14) DEFAULT NULL,
+            codigo_interno VARCHAR(14) DEFAULT NULL,
+            descricao TEXT,
+            laboratorio VARCHAR(255),
+            tipo_preco VARCHAR(100) DEFAULT NULL,
+            preco_normal DECIMAL(10, 2),
+            preco_desconto DECIMAL(10, 2),
+            preco_desconto_cliente DECIMAL(10, 2),
+            preco_app DECIMAL(10, 2),
+            tipo_regra VARCHAR(100),
+            criado_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_carga (carga_id),
+            INDEX idx_criado_em (criado_em)
+        )
+    """))
+
+
+# (versão, descrição, função)
+MIGRATIONS = [
+    (1, "cria dim_parceiros", _criar_tabela_parceiros),
+    (2, "cria dim_tabloide", _criar_tabela_tabloide),
+    (3, "cria dim_campanha", _criar_tabela_campanha),
+    (4, "garante parceiro_id e FK em dim_campanha", _garantir_parceiro_campanha),
+    (5, "cria dim_campanha_produto", _criar_tabela_campanha_produto),
+    (6, "codigo_barras_normalizado NOT NULL em dim_campanha_produto", _normalizado_not_null_campanha_produto),
+    (7, "cria dim_tabloide_produto", _criar_tabela_tabloide_produto),
+    (8, "adiciona codigo_barras_normalizado em dim_tabloide_produto", _normalizado_tabloide_produto),
+    (9, "cria stg_campanha_produto", _criar_staging_campanha_produto),
+    (10, "cria stg_tabloide_produto", _criar_staging_tabloide_produto),
+]
+
+
+######################################
+#   EXECUTOR
+######################################
+
+def _criar_tabela_versoes(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_MIGRATIONS_TABLE} (
+            version INT PRIMARY KEY,
+            descricao VARCHAR(255) NOT NULL,
+            aplicada_em DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    conn.commit()
+
+def get_versoes_aplicadas(conn):
+    cursor = conn.execute(text(f"SELECT version FROM {SCHEMA_MIGRATIONS_TABLE}"))
+    versoes = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return versoes
+
+def run_migrations(verbose=True):
+    """
+    Aplica, em ordem, as migrações ainda não registradas em schema_migrations.
+    Usa uma conexão própria do engine (não depende de contexto Flask).
+    Retorna (lista_de_versoes_aplicadas, erro).
+    """
+    if engine is None:
+        return [], "Engine do SQLAlchemy não está disponível."
+
+    aplicadas = []
+    try:
+        with engine.connect() as conn:
+            _criar_tabela_versoes(conn)
+            ja_aplicadas = get_versoes_aplicadas(conn)
+
+            for version, descricao, func in MIGRATIONS:
+                if version in ja_aplicadas:
+                    continue
+                if verbose:
+                    print(f"[migrate] Aplicando {version:03d}: {descricao}")
+                try:
+                    func(conn)
+                    conn.execute(
+                        text(f"INSERT INTO {SCHEMA_MIGRATIONS_TABLE} (version, descricao) VALUES (:v, :d)"),
+                        {"v": version, "d": descricao}
+                    )
+                    conn.commit()
+                    aplicadas.append(version)
+                except SQLAlchemyError as e:
+                    conn.rollback()
+                    # Para na primeira falha: as próximas podem depender desta
+                    return aplicadas, f"Migração {version:03d} ({descricao}) falhou: {e}"
+    except SQLAlchemyError as e:
+        return aplicadas, str(e)
+
+    if verbose:
+        if aplicadas:
+            print(f"[migrate] {len(aplicadas)} migração(ões) aplicada(s).")
+        else:
+            print("[migrate] Banco já está atualizado.")
+    return aplicadas, None
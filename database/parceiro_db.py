@@ -2,47 +2,17 @@
 
 from sqlalchemy.sql import text
 from sqlalchemy.exc import SQLAlchemyError
-from database.common_db import get_db_connection
+from database.common_db import get_db_connection, iter_consulta
 import datetime # <-- ADICIONADO
+import bisect
+import threading
+import time
+import unicodedata
+import config
 
 DIM_PARCEIRO_TABLE = "dim_parceiros"
 
 
-def create_tables():
-    conn = get_db_connection()
-    if conn is None:
-        return
-    try:
-        sql_create = text(f"""
-            CREATE TABLE IF NOT EXISTS {DIM_PARCEIRO_TABLE} (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                api_user_id VARCHAR(50) DEFAULT NULL, 
-                nome_ajustado VARCHAR(255) NOT NULL,
-                tipo VARCHAR(100) DEFAULT NULL,
-                cnpj VARCHAR(20) DEFAULT NULL,
-                nome_fantasia VARCHAR(255) DEFAULT NULL,
-                razao_social VARCHAR(255) DEFAULT NULL,
-                gestor VARCHAR(255) DEFAULT NULL,
-                telefone_gestor VARCHAR(20) DEFAULT NULL,
-                email_gestor VARCHAR(255) DEFAULT NULL,
-                data_entrada DATE DEFAULT NULL,
-                data_saida DATE DEFAULT NULL,
-                status TINYINT DEFAULT 1,
-                `senha_definida` TINYINT(1) NOT NULL DEFAULT '0',
-                contrato_arquivo VARCHAR(255) DEFAULT NULL,
-                data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP
-                    ON UPDATE CURRENT_TIMESTAMP,
-                INDEX idx_api_user_id (api_user_id) 
-            )
-        """)
-        conn.execute(sql_create)
-
-        conn.commit()
-    except SQLAlchemyError as e:
-        print(f"Erro ao criar tabela base {DIM_PARCEIRO_TABLE}: {e}")
-        conn.rollback()
-
-
 def add_parceiro(**data):
     """
     Insere um novo parceiro.
@@ -69,9 +39,8 @@ def add_parceiro(**data):
         return str(e)
 
 
-def get_all_parceiros(tipo=None, status=None, data_entrada_min=None, data_saida_max=None, nome_fantasia=None, sort_by_expiration=False):
-    conn = get_db_connection()
-    sql_base = f"SELECT * FROM {DIM_PARCEIRO_TABLE}"
+def _filtros_parceiros(tipo=None, status=None, data_entrada_min=None, data_saida_max=None, nome_fantasia=None, sort_by_expiration=False):
+    """Monta o WHERE/ORDER BY (e params) dos filtros da listagem de parceiros."""
     where_clauses = []
     params = {}
     
@@ -110,8 +79,15 @@ def get_all_parceiros(tipo=None, status=None, data_entrada_min=None, data_saida_
     
     # 6. Lógica de Ordenação (MODIFICADO)
     order_by_clause = "ORDER BY data_saida ASC" if sort_by_expiration else "ORDER BY nome_ajustado ASC"
-    
-    sql = text(f"{sql_base} {where_str} {order_by_clause}")
+    return f"{where_str} {order_by_clause}", params
+
+
+def get_all_parceiros(tipo=None, status=None, data_entrada_min=None, data_saida_max=None, nome_fantasia=None, sort_by_expiration=False):
+    conn = get_db_connection()
+    filtros_sql, params = _filtros_parceiros(
+        tipo, status, data_entrada_min, data_saida_max, nome_fantasia, sort_by_expiration
+    )
+    sql = text(f"SELECT * FROM {DIM_PARCEIRO_TABLE} {filtros_sql}")
     
     try:
         cursor = conn.execute(sql, params)
@@ -122,6 +98,17 @@ def get_all_parceiros(tipo=None, status=None, data_entrada_min=None, data_saida_
         print(f"Erro ao buscar parceiros: {e}")
         return []
 
+
+def iter_parceiros_for_export(colunas, conn=None, **filtros):
+    """
+    Gera os parceiros (mesmos filtros do get_all_parceiros) como tuplas na
+    ordem de colunas, com cursor no servidor.
+    colunas: nomes fixos definidos pelo código (entram direto no SELECT).
+    """
+    filtros_sql, params = _filtros_parceiros(**filtros)
+    sql = text(f"SELECT {', '.join(colunas)} FROM {DIM_PARCEIRO_TABLE} {filtros_sql}")
+    return iter_consulta(sql, params, conn)
+
 # --- NOVA FUNÇÃO ---
 def get_expiring_parceiros(days_ahead=30):
     """Busca parceiros ATIVOS que expiram nos próximos 'days_ahead' dias."""
@@ -165,10 +152,10 @@ def get_parceiro_by_id(parceiro_id):
         print(f"Erro ao buscar parceiro por id: {e}")
         return None
 
-def get_lista_nomes_ajustados():
-    """Busca a lista unificada de Fornecedores e Fabricantes para o autocomplete."""
+def _buscar_nomes_ajustados_no_banco():
+    """Busca a lista unificada de Fornecedores e Fabricantes nas tabelas gold."""
     conn = get_db_connection()
-    if conn is None: return []
+    if conn is None: return None
 
     # Busca a lista curada nas tabelas gold, removendo nulos, vazios e duplicados.
     sql = text("""
@@ -195,7 +182,93 @@ def get_lista_nomes_ajustados():
         return results
     except SQLAlchemyError as e:
         print(f"Erro ao buscar nomes ajustados: {e}")
+        return None
+
+
+def _normalizar_busca(texto):
+    """Chave de busca sem acentos e sem diferenciar maiúsculas ('Aché' -> 'ache')."""
+    sem_acento = unicodedata.normalize('NFKD', texto)
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    return ' '.join(sem_acento.casefold().split())
+
+
+class _CatalogoNomesAjustados:
+    """
+    Cache dos nomes ajustados válidos: um set (validação O(1)), uma tupla
+    ordenada (listagem) e um índice de prefixos (chaves normalizadas
+    ordenadas, busca com bisect). Recarrega do banco depois de `ttl_segundos`
+    ou quando invalidado manualmente.
+    """
+
+    def __init__(self, ttl_segundos):
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._nomes_set = frozenset()
+        self._nomes_ordenados = ()
+        self._indice = ([], [])  # (chaves, nomes): publicados juntos numa só atribuição
+        self._carregado_em = None
+
+    def _garantir_carregado(self):
+        with self._lock:
+            if self._carregado_em is not None and time.monotonic() - self._carregado_em < self.ttl_segundos:
+                return
+            nomes = _buscar_nomes_ajustados_no_banco()
+            if nomes is None:
+                return  # Falhou: mantém o que já tinha e tenta de novo na próxima chamada
+            indice = sorted((_normalizar_busca(n), n) for n in nomes)
+            self._nomes_ordenados = tuple(nomes)
+            self._nomes_set = frozenset(nomes)
+            # Uma atribuição só: buscar_prefixo lê sem lock e nunca mistura chaves novas com nomes antigos
+            self._indice = ([chave for chave, _ in indice], [nome for _, nome in indice])
+            self._carregado_em = time.monotonic()
+
+    def lista(self):
+        self._garantir_carregado()
+        return self._nomes_ordenados
+
+    def contem(self, nome):
+        self._garantir_carregado()
+        return nome in self._nomes_set
+
+    def buscar_prefixo(self, prefixo, limite):
+        self._garantir_carregado()
+        chave = _normalizar_busca(prefixo)
+        chaves, nomes = self._indice
+        inicio = bisect.bisect_left(chaves, chave)
+        resultado = []
+        for i in range(inicio, min(inicio + limite, len(chaves))):
+            if not chaves[i].startswith(chave):
+                break
+            resultado.append(nomes[i])
+        return resultado
+
+    def invalidar(self):
+        with self._lock:
+            self._carregado_em = None
+
+
+_nomes_cache_cfg = getattr(config, 'NOMES_AJUSTADOS_CACHE', {})
+catalogo_nomes_ajustados = _CatalogoNomesAjustados(
+    ttl_segundos=_nomes_cache_cfg.get('ttl_segundos', 600)
+)
+
+def get_lista_nomes_ajustados():
+    """Lista (ordenada, em cache) de Fornecedores e Fabricantes para o autocomplete."""
+    return list(catalogo_nomes_ajustados.lista())
+
+def nome_ajustado_valido(nome):
+    """Verifica se o nome está exatamente na lista de nomes ajustados (em cache)."""
+    return catalogo_nomes_ajustados.contem(nome)
+
+def buscar_nomes_ajustados(prefixo, limite=20):
+    """Até `limite` nomes que começam com `prefixo` (sem diferenciar acentos/maiúsculas)."""
+    if not prefixo or not prefixo.strip():
         return []
+    return catalogo_nomes_ajustados.buscar_prefixo(prefixo, limite)
+
+def invalidar_cache_nomes_ajustados():
+    """Força a releitura das tabelas gold na próxima consulta."""
+    catalogo_nomes_ajustados.invalidar()
 
 def update_parceiro(parceiro_id, **data):
     """
@@ -7,27 +7,6 @@ import datetime
 
 DIM_TABLOIDE_TABLE = "dim_tabloide"
 
-def create_tables():
-    conn = get_db_connection()
-    if conn is None: return
-    try:
-        sql = text(f"""
-            CREATE TABLE IF NOT EXISTS {DIM_TABLOIDE_TABLE} (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                nome VARCHAR(255) NOT NULL,
-                data_inicio DATE NOT NULL,
-                data_fim DATE NOT NULL,
-                status INT DEFAULT 1,
-                data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                UNIQUE(nome, data_inicio, data_fim)
-            )
-        """)
-        conn.execute(sql)
-        conn.commit()
-    except SQLAlchemyError as e:
-        print(f"Erro ao criar tabela {DIM_TABLOIDE_TABLE} (Tabloide): {e}")
-        conn.rollback()
-
 def add_tabloide(nome, data_inicio, data_fim):
     conn = get_db_connection()
     sql = text(f"""
@@ -1,15 +1,17 @@
 # routes/campanha_produtos_routes.py
 
-import pandas as pd
-import numpy as np
 from flask import (
-    Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+    Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, jsonify
 )
 import database.campanha_db as db_campanha
 import database.campanha_produtos_db as db_campanha_produtos
 import database.common_db as db_common
+import services.exportacao as exportacao
+import services.ingestao_produtos as ingestao
+import services.listagem_produtos as listagem
+import services.preview_uploads as preview_uploads
+import services.upload_jobs as upload_jobs
 from utils import allowed_file, pad_barcode, clean_barcode, DELETE_PASSWORD
-import io # <-- ADICIONAR IMPORT
 
 campanha_produtos_bp = Blueprint(
     'campanha_produtos',
@@ -29,108 +31,61 @@ def upload_page():
             flash('Por favor, selecione uma campanha.', 'danger')
             return redirect(url_for('campanha_produtos.upload_page'))
 
+        # Com o token da pré-visualização o arquivo não é reenviado: o job usa a leitura já feita
+        token = request.form.get('preview_token', '')
         file = request.files.get('file')
-        if not file or file.filename == '':
+        if preview_uploads.token_valido(token):
+            file = None
+        elif not file or file.filename == '':
             flash('Nenhum arquivo selecionado.', 'danger')
             return redirect(url_for('campanha_produtos.upload_page'))
-
-        if file and allowed_file(file.filename):
-            try:
-                # -----------------------------------------------------------
-                # PASSO 1: DELETAR PRODUTOS EXISTENTES PARA ESTA CAMPANHA
-                # -----------------------------------------------------------
-                deleted_count, delete_error = db_campanha_produtos.delete_products_by_campaign_id(campanha_id)
-                if delete_error:
-                    flash(f'Erro ao limpar produtos antigos da campanha: {delete_error}', 'danger')
-                    return redirect(url_for('campanha_produtos.upload_page'))
-                if deleted_count > 0:
-                    flash(f'{deleted_count} produto(s) antigo(s) removido(s) da campanha.', 'info')
-                # -----------------------------------------------------------
-
-                # PASSO 2: Ler e processar a nova planilha
-                column_map = {
-                    'CÓDIGO DE BARRAS': 'codigo_barras', 'DESCRIÇÃO': 'descricao', 'PONTUAÇÃO': 'pontuacao',
-                    'PREÇO NORMAL': 'preco_normal', 'PREÇO COM DESCONTO': 'preco_desconto',
-                    'REBAIXE': 'rebaixe', 'QTD LIMITE': 'qtd_limite'
-                }
-                df = pd.read_excel(file, dtype={'CÓDIGO DE BARRAS': str}).rename(columns=column_map)
-                df = df.replace({np.nan: None})
-
-                required_cols = list(column_map.values())
-                if not all(col in df.columns for col in required_cols):
-                    flash('A planilha não contém todas as colunas esperadas.', 'danger')
-                    return redirect(url_for('campanha_produtos.upload_page'))
-
-                # --- LÓGICA DE BUSCA DO CODIGO_INTERNO E NORMALIZAÇÃO ---
-                gtins_raw_list = []
-                gtins_para_buscar_map = {} # Mapeia para garantir apenas códigos RAW únicos
-                
-                for g in df['codigo_barras'].tolist():
-                    g_str = str(g) if g is not None else None
-                    if g_str and g_str.strip():
-                        gtins_raw_list.append(g_str)
-                        cleaned = clean_barcode(g_str) # <-- AGORA USA CLEAN_BARCODE
-                        if cleaned:
-                            gtins_para_buscar_map[cleaned] = cleaned 
-
-                gtins_para_buscar_raw = list(gtins_para_buscar_map.keys()) # Lista de GTINs RAW únicos para buscar
-
-                if gtins_para_buscar_raw:
-                    # FIX: Passa a lista RAW para o common_db
-                    ci_map_raw, err = db_common.get_codigo_interno_map_from_gtins(gtins_para_buscar_raw)
-                    if err:
-                        flash(f'Erro ao buscar códigos internos: {err}', 'warning')
-                        ci_map_raw = {}
-                else:
-                    ci_map_raw = {}
-                # --- FIM DA LÓGICA ---
-
-                produtos_para_inserir = []
-                for _, row in df.iterrows():
-                    cb_raw = row.get('codigo_barras')
-                    cb_raw_str = str(cb_raw) if cb_raw is not None else None
-                    cb_normalizado = pad_barcode(cb_raw_str)
-                    
-                    # FIX: Usa o GTIN LIMPO como chave para buscar o CI
-                    cb_cleaned = clean_barcode(cb_raw_str) 
-                    ci = ci_map_raw.get(cb_cleaned) if cb_cleaned else None
-
-                    produtos_para_inserir.append((
-                        campanha_id,
-                        cb_raw_str,
-                        cb_normalizado,
-                        ci,
-                        row.get('descricao'),
-                        row.get('pontuacao'),
-                        row.get('preco_normal'),
-                        row.get('preco_desconto'),
-                        row.get('rebaixe'),
-                        row.get('qtd_limite')
-                    ))
-
-                # PASSO 3: Inserir os novos produtos
-                if produtos_para_inserir:
-                    rowcount, error = db_campanha_produtos.add_products_bulk(produtos_para_inserir)
-                    if error:
-                        flash(f'Erro ao salvar novos produtos: {error}', 'danger')
-                    else:
-                        flash(f'{rowcount} novo(s) produto(s) processado(s) e salvo(s) com sucesso!', 'success')
-                else:
-                    flash('Nenhum produto encontrado na nova planilha para inserir.', 'warning')
-
-            except Exception as e:
-                flash(f'Ocorreu um erro ao processar o arquivo: {e}', 'danger')
-
-            return redirect(url_for('campanha_produtos.upload_page'))
+        else:
+            token = None
+
+        if file is None or allowed_file(file.filename):
+            # O processamento (ler, carregar na staging, trocar os produtos) roda em segundo plano;
+            # a página acompanha o progresso pelo /jobs/<id>
+            modo = request.form.get('modo', ingestao.MODO_SUBSTITUIR)
+            if modo not in (ingestao.MODO_SUBSTITUIR, ingestao.MODO_DIFERENCAS):
+                modo = ingestao.MODO_SUBSTITUIR
+            job_id, erro = upload_jobs.enviar_upload(
+                current_app._get_current_object(), ingestao.CAMPANHA, campanha_id, file, modo, token
+            )
+            if erro:
+                flash(erro, 'danger')
+                return redirect(url_for('campanha_produtos.upload_page'))
+
+            flash('Planilha recebida! O processamento continua em segundo plano.', 'info')
+            return redirect(url_for('campanha_produtos.upload_page', job=job_id))
 
     # GET
     campanhas = db_campanha.get_all_campaigns()
     return render_template(
         'campanha/upload_campanha.html',
         active_page='campanha_upload',
-        campanhas=campanhas
+        campanhas=campanhas,
+        job_id=request.args.get('job')
     )
 
+
+@campanha_produtos_bp.route('/upload/preview', methods=['POST'])
+def preview_upload():
+    """
+    Pré-visualização do upload, sem gravar nada: linhas, colunas faltando,
+    GTINs inválidos/repetidos/sem código interno e preços suspeitos.
+    O token devolvido pode ser enviado no upload no lugar do arquivo.
+    """
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({"erro": "Nenhum arquivo selecionado."}), 400
+    if not allowed_file(file.filename):
+        return jsonify({"erro": "Formato de arquivo não suportado."}), 400
+
+    resumo, erro = preview_uploads.analisar_planilha(file, ingestao.CAMPANHA)
+    if erro:
+        return jsonify({"erro": erro}), 400
+    return jsonify(resumo)
+
 @campanha_produtos_bp.route('/<int:campanha_id>/produtos')
 def produtos_por_campanha(campanha_id):
     campanha = db_campanha.get_campaign_by_id(campanha_id)
@@ -138,14 +93,77 @@ def produtos_por_campanha(campanha_id):
         flash('Campanha não encontrada.', 'danger')
         return redirect(url_for('campanha.gestao_campanhas'))
 
-    produtos = db_campanha_produtos.get_products_by_campaign_id(campanha_id)
+    # Uma página por vez, com filtros/ordem da query string (ver services/listagem_produtos.py)
+    parametros = listagem.ler_parametros(request.args, db_campanha_produtos.ORDENACOES)
+    if parametros["virtual"]:
+        # Tabela completa: as linhas chegam pelo JSON (produtos_dados), não no HTML
+        produtos, tem_mais, erro = [], False, None
+    else:
+        produtos, tem_mais, erro = db_campanha_produtos.get_products_page(
+            campanha_id, parametros["filtros"], parametros["ordem"], parametros["decrescente"],
+            parametros["cursor"], parametros["anterior"], parametros["por_pagina"]
+        )
+    if erro:
+        flash(f'Erro ao buscar produtos: {erro}', 'danger')
+    elif not produtos and parametros["cursor"] is not None:
+        # Página esvaziada (ex.: produtos removidos): volta para o início da listagem
+        args = listagem.args_listagem(parametros)
+        return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id, **args))
+    total, _ = db_campanha_produtos.count_products(campanha_id, parametros["filtros"])
+
+    pagina = listagem.montar_pagina(
+        produtos, tem_mais, parametros, total,
+        lambda **args: url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id, **args),
+        db_campanha_produtos.ORDENACOES,
+        lambda **args: url_for('campanha_produtos.produtos_dados', campanha_id=campanha_id, **args)
+    )
     return render_template(
         'campanha/produtos_campanha.html', 
         active_page='campanhas_gestao', 
         campanha=campanha, 
-        produtos=produtos
+        produtos=produtos,
+        pagina=pagina
     )
 
+# Colunas do JSON da tabela completa: id + campos editáveis da listagem
+COLUNAS_DADOS = ['id', 'codigo_barras', 'descricao', 'pontuacao', 'preco_normal', 'preco_desconto', 'rebaixe', 'qtd_limite']
+
+@campanha_produtos_bp.route('/<int:campanha_id>/produtos/dados')
+def produtos_dados(campanha_id):
+    """
+    Produtos da campanha para a tabela completa (modo virtual da listagem):
+    mesmos filtros e ordem da query string, sem paginação, em colunas
+    (ver listagem.colunar). ETag pela versão dos produtos: sem mudanças, 304.
+    """
+    parametros = listagem.ler_parametros(request.args, db_campanha_produtos.ORDENACOES)
+    versao, erro = db_campanha_produtos.get_export_version(campanha_id)
+    if erro:
+        return jsonify({"erro": erro}), 500
+    etag = listagem.etag_dados(
+        'campanha', campanha_id, versao, COLUNAS_DADOS, parametros["filtros"], parametros["ordem"], parametros["decrescente"]
+    )
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        try:
+            resposta = jsonify(listagem.colunar(
+                db_campanha_produtos.iter_products_filtered(
+                    campanha_id, COLUNAS_DADOS, parametros["filtros"], parametros["ordem"], parametros["decrescente"]
+                ),
+                COLUNAS_DADOS
+            ))
+        except Exception as e:
+            print(f"Erro ao buscar os produtos da campanha {campanha_id} em JSON: {e}")
+            return jsonify({"erro": str(e)}), 500
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+def _voltar_para_lista(campanha_id):
+    """Redireciona para a página da listagem de onde a ação veio (filtros, ordem e posição)."""
+    args = listagem.args_retorno(request.form.get('retorno'), db_campanha_produtos.ORDENACOES)
+    return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id, **args))
+
 @campanha_produtos_bp.route('/<int:campanha_id>/produtos/adicionar', methods=['POST'])
 def adicionar_produto(campanha_id):
     try:
@@ -178,14 +196,21 @@ def adicionar_produto(campanha_id):
         else: flash('Novo produto adicionado com sucesso!', 'success')
     except Exception as e:
         flash(f'Ocorreu um erro inesperado: {e}', 'danger')
-    return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id))
+    return _voltar_para_lista(campanha_id)
 
 @campanha_produtos_bp.route('/<int:campanha_id>/produtos/atualizar', methods=['POST'])
 def atualizar_produtos(campanha_id):
-    selecionados = request.form.getlist('selecionado')
+    # Só as linhas da página atual trazem os campos (a seleção pode incluir outras páginas)
+    marcados = request.form.getlist('selecionado')
+    selecionados = [pid for pid in marcados if f'codigo_barras_{pid}' in request.form]
+    fora_da_pagina = len(marcados) - len(selecionados)
+    if fora_da_pagina:
+        flash(f'{fora_da_pagina} produto(s) selecionado(s) em outras páginas não foram atualizados: '
+              'as alterações valem só para a página atual. Eles continuam marcados nas suas páginas.', 'warning')
     if not selecionados:
-        flash('Nenhum produto selecionado para atualizar.', 'warning')
-        return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id))
+        if not fora_da_pagina:
+            flash('Nenhum produto selecionado para atualizar.', 'warning')
+        return _voltar_para_lista(campanha_id)
 
     gtins_raw_dict = {pid: request.form.get(f'codigo_barras_{pid}') for pid in selecionados}
     # FIX: Calcula GTINs RAW para pesquisa
@@ -229,7 +254,7 @@ def atualizar_produtos(campanha_id):
     rowcount, error = db_campanha_produtos.update_products_in_bulk(produtos_para_atualizar)
     if error: flash(f'Erro ao atualizar produtos: {error}', 'danger')
     else: flash(f'{rowcount} produto(s) atualizado(s) com sucesso!', 'success')
-    return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id))
+    return _voltar_para_lista(campanha_id)
 
 @campanha_produtos_bp.route('/<int:campanha_id>/produtos/deletar', methods=['POST'])
 def deletar_produtos(campanha_id):
@@ -237,18 +262,26 @@ def deletar_produtos(campanha_id):
     confirmation_password = request.form.get('confirmation_password_bulk')
     if confirmation_password != DELETE_PASSWORD:
         flash('Senha de confirmação incorreta para deleção em massa.', 'danger')
-        return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id))
+        return _voltar_para_lista(campanha_id)
     # --- FIM NOVO ---
     
+    # Todos os produtos do filtro atual, em todas as páginas
+    if request.form.get('todos_filtrados') == '1':
+        filtros = listagem.filtros_retorno(request.form.get('retorno'), db_campanha_produtos.ORDENACOES)
+        rowcount, error = db_campanha_produtos.delete_products_by_filter(campanha_id, filtros)
+        if error: flash(f'Erro ao deletar produtos: {error}', 'danger')
+        else: flash(f'{rowcount} produto(s) deletado(s) com sucesso!', 'success')
+        return _voltar_para_lista(campanha_id)
+
     selecionados = request.form.getlist('selecionado')
     if not selecionados:
         flash('Nenhum produto selecionado para deletar.', 'warning')
-        return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id))
+        return _voltar_para_lista(campanha_id)
 
-    rowcount, error = db_campanha_produtos.delete_products_in_bulk(selecionados)
+    rowcount, error = db_campanha_produtos.delete_products_in_bulk(selecionados, campanha_id)
     if error: flash(f'Erro ao deletar produtos: {error}', 'danger')
     else: flash(f'{rowcount} produto(s) deletado(s) com sucesso!', 'success')
-    return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id))
+    return _voltar_para_lista(campanha_id)
 
 @campanha_produtos_bp.route('/<int:campanha_id>/produtos/validar_gtins', methods=['POST'])
 def validar_gtins(campanha_id):
@@ -266,33 +299,28 @@ def validar_gtins(campanha_id):
     if not gtins_para_buscar:
         return jsonify({"valid_gtins": [], "updated_count": 0})
 
-    # 2. Valida quais GTINs existem (para colorir a UI)
-    validos_raw_set, error_val = db_common.validate_gtins_in_external_db(gtins_para_buscar)
-    if error_val:
-        return jsonify({"error": f"Erro ao validar GTINs: {error_val}"}), 500
+    # 2. Resolve validade, Código Interno (CI) e normalizado numa única consulta
+    resolvidos, error_cat = db_common.resolver_gtins_catalogo(gtins_para_buscar)
+    if error_cat:
+        return jsonify({"error": f"Erro ao validar GTINs: {error_cat}"}), 500
 
-    # 3. Busca os Códigos Internos (CI) para os GTINs (apenas os principais)
-    ci_map_raw, error_ci = db_common.get_codigo_interno_map_from_gtins(gtins_para_buscar)
-    if error_ci:
-        return jsonify({"error": f"Erro ao buscar CIs: {error_ci}"}), 500
+    validos_raw_set = {gtin for gtin, info in resolvidos.items() if info["valido"]}
 
-    # 4. Prepara a lista para o update no banco
+    # 3. Prepara a lista para o update no banco
     produtos_para_atualizar = []
     for product_id, gtin_limpo in gtins_map.items():
-        # Só atualiza se o GTIN limpo foi encontrado no mapa de CIs principais
-        if gtin_limpo in ci_map_raw:
-            cb_normalizado = pad_barcode(gtin_limpo) # Calcula o GTIN de 14 dígitos
-            ci = ci_map_raw.get(gtin_limpo)
-            
+        info = resolvidos.get(gtin_limpo)
+        # Só atualiza se o GTIN limpo foi encontrado como código principal
+        if info and info["valido"]:
             # Tupla: (cb, cbn, ci, id)
             produtos_para_atualizar.append((
-                gtin_limpo,       # codigo_barras (usamos o limpo/raw)
-                cb_normalizado, # codigo_barras_normalizado
-                ci,             # codigo_interno
-                product_id      # id
+                gtin_limpo,                         # codigo_barras (usamos o limpo/raw)
+                info["codigo_barras_normalizado"],  # codigo_barras_normalizado
+                info["codigo_interno"],             # codigo_interno
+                product_id                          # id
             ))
 
-    # 5. Executa o Update no banco
+    # 4. Executa o Update no banco
     updated_count = 0
     if produtos_para_atualizar:
         # Chama a nova função do DB
@@ -303,58 +331,49 @@ def validar_gtins(campanha_id):
         else:
             updated_count = rowcount
 
-    # 6. Retorna a lista de GTINs válidos (para UI) e a contagem de updates
+    # 5. Retorna a lista de GTINs válidos (para UI) e a contagem de updates
     return jsonify({
         "valid_gtins": list(validos_raw_set),
         "updated_count": updated_count
     })
 
 # --- NOVA ROTA DE EXPORTAÇÃO ---
+# Coluna da tabela -> cabeçalho na planilha exportada (INCLUINDO CODIGO_INTERNO)
+COLUNAS_EXPORTACAO = {
+    "codigo_interno": "Codigo Interno",
+    "codigo_barras": "CÓDIGO DE BARRAS",
+    "descricao": "DESCRIÇÃO",
+    "pontuacao": "PONTUAÇÃO",
+    "preco_normal": "PREÇO NORMAL",
+    "preco_desconto": "PREÇO COM DESCONTO",
+    "rebaixe": "REBAIXE",
+    "qtd_limite": "QTD LIMITE"
+}
+
 @campanha_produtos_bp.route('/<int:campanha_id>/exportar')
 def exportar_produtos(campanha_id):
+    # 1. Buscar nome da campanha (para nome do arq)
+    campanha = db_campanha.get_campaign_by_id(campanha_id)
+    campanha_nome = campanha.nome if campanha else f"campanha_{campanha_id}"
+
+    formato = request.args.get('formato', 'xlsx')
+    if formato not in exportacao.FORMATOS_TEXTO:
+        formato = 'xlsx'
+
+    # 2. Versão dos produtos: enquanto nada muda, o arquivo sai do cache (com ETag/304)
+    versao, _ = db_campanha_produtos.get_export_version(campanha_id)
+    if formato == 'xlsx' and versao is not None and versao["total"] == 0:
+        flash('Nenhum produto encontrado para exportar.', 'warning')
+        return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id))
+
+    # 3. Produtos direto do cursor para o arquivo/resposta (ver services/exportacao.py);
+    #    CSV/TSV (?formato=csv|tsv) é gerado enquanto é enviado, com conexão própria
     try:
-        # 1. Buscar nome da campanha (para nome do arq)
-        campanha = db_campanha.get_campaign_by_id(campanha_id)
-        campanha_nome = campanha.nome if campanha else f"campanha_{campanha_id}"
-        
-        # 2. Buscar dados dos produtos
-        produtos_data = db_campanha_produtos.get_products_by_campaign_id(campanha_id)
-        if not produtos_data:
-            flash('Nenhum produto encontrado para exportar.', 'warning')
-            return redirect(url_for('campanha_produtos.produtos_por_campanha', campanha_id=campanha_id))
-        
-        # 3. Converter para DataFrame
-        produtos_list = [dict(row) for row in produtos_data]
-        df = pd.DataFrame(produtos_list)
-
-        # 4. Definir e Renomear colunas (INCLUINDO CODIGO_INTERNO)
-        colunas_exportar = {
-            "codigo_interno": "Codigo Interno",
-            "codigo_barras": "CÓDIGO DE BARRAS",
-            "descricao": "DESCRIÇÃO",
-            "pontuacao": "PONTUAÇÃO",
-            "preco_normal": "PREÇO NORMAL",
-            "preco_desconto": "PREÇO COM DESCONTO",
-            "rebaixe": "REBAIXE",
-            "qtd_limite": "QTD LIMITE"
-        }
-        
-        # Filtra o DF para ter apenas as colunas que existem no DF e queremos
-        colunas_presentes = [col for col in colunas_exportar.keys() if col in df.columns]
-        df_final = df[colunas_presentes].rename(columns=colunas_exportar)
-
-        # 5. Criar arquivo em memória
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_final.to_excel(writer, index=False, sheet_name='Produtos Campanha')
-        output.seek(0)
-        
-        # 6. Enviar arquivo
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=f"export_produtos_campanha_{campanha_nome}.xlsx",
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        return exportacao.exportar(
+            formato,
+            lambda conn: db_campanha_produtos.iter_products_for_export(campanha_id, list(COLUNAS_EXPORTACAO), conn),
+            list(COLUNAS_EXPORTACAO.values()), f"export_produtos_campanha_{campanha_nome}", 'Produtos Campanha',
+            chave_cache=('campanha', campanha_id, versao) if versao is not None else None
         )
     except Exception as e:
         flash(f'Ocorreu um erro ao gerar o arquivo Excel: {e}', 'danger')
@@ -8,6 +8,7 @@ from flask import (
 import os
 import database.campanha_db as db_campanha # Para gerenciar campanhas
 import database.parceiro_db as db_parceiro # Para buscar parceiros
+import database.common_db as db_common
 import services.parceiros_embedded_service as api_service # Importar serviço de API
 from utils import DELETE_PASSWORD
 
@@ -55,6 +56,8 @@ def gestao_campanhas():
                     parceiro = db_parceiro.get_parceiro_by_id(parceiro_id)
                     email = parceiro.get('email_gestor') if parceiro else None
                     if email:
+                        # Não segura conexão do pool durante a chamada HTTP
+                        db_common.release_db_connection()
                         _, erro_adicao = api_service.adicionar_usuario_ao_grupo(
                             email, 
                             api_service.PARCEIROS_CAMPANHA_GROUP_ID
@@ -105,34 +108,38 @@ def editar_campanha(campaign_id):
         return redirect(url_for('campanha.gestao_campanhas'))
     
     # 4. Lógica de atualização de grupo na API Embedded
-    
-    # a) VERIFICAR REMOÇÃO DO PARCEIRO ANTIGO (se o ID mudou ou foi removido)
+    # Busca os emails antes, para devolver a conexão ao pool durante as chamadas HTTP
+    email_antigo = None
     if parceiro_id_antigo and parceiro_id_antigo != parceiro_id_novo:
         parceiro_antigo = db_parceiro.get_parceiro_by_id(parceiro_id_antigo)
         email_antigo = parceiro_antigo.get('email_gestor') if parceiro_antigo else None
-        
-        if email_antigo:
-            # Tenta remover o parceiro antigo do grupo de Campanha
-            _, erro_remocao = api_service.remover_usuario_do_grupo(
-                email_antigo, 
-                api_service.PARCEIROS_CAMPANHA_GROUP_ID
-            )
-            if erro_remocao:
-                flash(f'Aviso: Falha ao remover parceiro antigo do grupo Embedded: {erro_remocao}', 'warning')
-    
-    # b) VERIFICAR ADIÇÃO DO NOVO PARCEIRO (se o ID mudou ou um foi adicionado)
+
+    email_novo = None
     if parceiro_id_novo and parceiro_id_novo != parceiro_id_antigo:
         parceiro_novo = db_parceiro.get_parceiro_by_id(parceiro_id_novo)
         email_novo = parceiro_novo.get('email_gestor') if parceiro_novo else None
-        
-        if email_novo:
-            # Tenta adicionar o novo parceiro ao grupo de Campanha
-            _, erro_adicao = api_service.adicionar_usuario_ao_grupo(
-                email_novo, 
-                api_service.PARCEIROS_CAMPANHA_GROUP_ID
-            )
-            if erro_adicao:
-                flash(f'Aviso: Falha ao adicionar novo parceiro ao grupo Embedded: {erro_adicao}', 'warning')
+
+    db_common.release_db_connection()
+    
+    # a) REMOÇÃO DO PARCEIRO ANTIGO (se o ID mudou ou foi removido)
+    if email_antigo:
+        # Tenta remover o parceiro antigo do grupo de Campanha
+        _, erro_remocao = api_service.remover_usuario_do_grupo(
+            email_antigo, 
+            api_service.PARCEIROS_CAMPANHA_GROUP_ID
+        )
+        if erro_remocao:
+            flash(f'Aviso: Falha ao remover parceiro antigo do grupo Embedded: {erro_remocao}', 'warning')
+    
+    # b) ADIÇÃO DO NOVO PARCEIRO (se o ID mudou ou um foi adicionado)
+    if email_novo:
+        # Tenta adicionar o novo parceiro ao grupo de Campanha
+        _, erro_adicao = api_service.adicionar_usuario_ao_grupo(
+            email_novo, 
+            api_service.PARCEIROS_CAMPANHA_GROUP_ID
+        )
+        if erro_adicao:
+            flash(f'Aviso: Falha ao adicionar novo parceiro ao grupo Embedded: {erro_adicao}', 'warning')
                 
     flash('Campanha atualizada com sucesso!', 'success')
     return redirect(url_for('campanha.gestao_campanhas'))
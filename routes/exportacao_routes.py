@@ -0,0 +1,127 @@
+# routes/exportacao_routes.py
+
+import datetime
+from flask import (
+    Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, send_file
+)
+import database.campanha_db as db_campanha
+import database.campanha_produtos_db as db_campanha_produtos
+import database.tabloide_db as db_tabloide
+import database.tabloide_produtos_db as db_tabloide_produtos
+import services.exportacao_jobs as exportacao_jobs
+from routes.campanha_produtos_routes import COLUNAS_EXPORTACAO as COLUNAS_CAMPANHA
+from routes.tabloide_produtos_routes import COLUNAS_EXPORTACAO as COLUNAS_TABLOIDE
+
+exportacao_bp = Blueprint(
+    'exportacao',
+    __name__,
+    url_prefix='/exportacao'
+)
+
+# tipo -> (módulo do banco, colunas da exportação, nome da aba)
+TIPOS = {
+    'campanha': (db_campanha_produtos, COLUNAS_CAMPANHA, 'Produtos Campanha'),
+    'tabloide': (db_tabloide_produtos, COLUNAS_TABLOIDE, 'Produtos Tabloide'),
+}
+
+
+def _tarefa(tipo, entidade_id, nome):
+    db_produtos, colunas, aba = TIPOS[tipo]
+    return {
+        "tipo": tipo,
+        "id": entidade_id,
+        "nome": nome,
+        "aba": aba,
+        "cabecalhos": list(colunas.values()),
+        "consulta": lambda conn: db_produtos.iter_products_for_export(entidade_id, list(colunas), conn),
+        "versao": lambda: db_produtos.get_export_version(entidade_id),
+    }
+
+
+def _ids(valores):
+    ids = set()
+    for valor in valores:
+        try:
+            ids.add(int(valor))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+def _tarefas_da_requisicao():
+    """
+    Campanhas e tabloides pedidos (formulário ou JSON): listas de ids em
+    campanha_ids / tabloide_ids, ou todos_ativos para todos os vigentes.
+    """
+    dados = request.get_json(silent=True) or {}
+    if dados:
+        todos_ativos = bool(dados.get('todos_ativos'))
+        campanha_ids = _ids(dados.get('campanha_ids') or [])
+        tabloide_ids = _ids(dados.get('tabloide_ids') or [])
+    else:
+        todos_ativos = request.form.get('todos_ativos') == '1'
+        campanha_ids = _ids(request.form.getlist('campanha_ids'))
+        tabloide_ids = _ids(request.form.getlist('tabloide_ids'))
+
+    if todos_ativos:
+        campanhas = db_campanha.get_active_campaigns_for_upload()
+        tabloides = db_tabloide.get_active_tabloide_for_upload()
+    else:
+        campanhas = [c for c in db_campanha.get_all_campaigns() if c['id'] in campanha_ids]
+        tabloides = [t for t in db_tabloide.get_all_tabloide() if t['id'] in tabloide_ids]
+
+    return (
+        [_tarefa('campanha', c['id'], c['nome']) for c in campanhas]
+        + [_tarefa('tabloide', t['id'], t['nome']) for t in tabloides]
+    )
+
+# --------------------------------------------------------
+
+@exportacao_bp.route('/lote', methods=['GET', 'POST'])
+def exportacao_lote_page():
+    """
+    Produtos de várias campanhas/tabloides num ZIP (uma planilha por entidade),
+    gerado em segundo plano (ver services/exportacao_jobs.py).
+    """
+    if request.method == 'POST':
+        job_id, erro = exportacao_jobs.enviar_exportacao(
+            current_app._get_current_object(), _tarefas_da_requisicao()
+        )
+        if request.is_json:
+            if erro:
+                return jsonify({"erro": erro}), 400
+            return jsonify({"job_id": job_id, "status": url_for('exportacao.status_job', job_id=job_id)}), 202
+        if erro:
+            flash(erro, 'danger')
+            return redirect(url_for('exportacao.exportacao_lote_page'))
+
+        flash('Exportação iniciada! As planilhas são geradas em segundo plano.', 'info')
+        return redirect(url_for('exportacao.exportacao_lote_page', job=job_id))
+
+    # GET
+    return render_template(
+        'exportacao/exportacao_lote.html',
+        active_page='exportacao_lote',
+        campanhas=db_campanha.get_all_campaigns(),
+        tabloides=db_tabloide.get_all_tabloide(),
+        job_id=request.args.get('job')
+    )
+
+@exportacao_bp.route('/jobs/<job_id>')
+def status_job(job_id):
+    """Estado da exportação em lote (planilhas prontas, erros e link do ZIP) para o polling da página."""
+    job = exportacao_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"erro": "Exportação não encontrada ou expirada."}), 404
+    if job["arquivo_pronto"]:
+        job["url_arquivo"] = url_for('exportacao.baixar_arquivo', job_id=job_id)
+    return jsonify(job)
+
+@exportacao_bp.route('/jobs/<job_id>/arquivo')
+def baixar_arquivo(job_id):
+    caminho = exportacao_jobs.caminho_arquivo(job_id)
+    if caminho is None:
+        flash('Exportação não encontrada, ainda em andamento ou expirada.', 'warning')
+        return redirect(url_for('exportacao.exportacao_lote_page'))
+    nome = f"export_produtos_{datetime.date.today():%Y-%m-%d}.zip"
+    return send_file(caminho, mimetype='application/zip', as_attachment=True, download_name=nome)
@@ -0,0 +1,42 @@
+# routes/health_routes.py
+
+import time
+from flask import Blueprint, jsonify
+from sqlalchemy.sql import text
+from sqlalchemy.exc import SQLAlchemyError
+import database.common_db as db_common
+import database.catalogo_snapshot as catalogo_snapshot
+import database.bulk_loader as bulk_loader
+import services.exportacao_jobs as exportacao_jobs
+import services.upload_jobs as upload_jobs
+
+health_bp = Blueprint(
+    'health',
+    __name__,
+    url_prefix='/health'
+)
+
+@health_bp.route('/db')
+def health_db():
+    """Estado do pool de conexões, do cache de GTINs, do snapshot do catálogo e dos jobs de upload e de exportação."""
+    status = {"pool": db_common.get_pool_status()}
+
+    # Ping rápido: mede o round-trip real até o MySQL
+    conn = db_common.get_db_connection()
+    if conn is None:
+        status["ping"] = {"ok": False, "erro": "Sem conexão disponível no pool."}
+    else:
+        try:
+            inicio = time.perf_counter()
+            conn.execute(text("SELECT 1"))
+            status["ping"] = {"ok": True, "ms": round((time.perf_counter() - inicio) * 1000, 2)}
+        except SQLAlchemyError as e:
+            status["ping"] = {"ok": False, "erro": str(e)}
+
+    status["gtin_cache"] = db_common.get_gtin_cache_stats()
+    status["catalogo_snapshot"] = catalogo_snapshot.status()
+    status["upload_jobs"] = upload_jobs.get_jobs_status()
+    status["exportacao_jobs"] = exportacao_jobs.get_jobs_status()
+    status["bulk_loader"] = bulk_loader.get_estatisticas()
+
+    return jsonify(status), (200 if status["ping"]["ok"] else 503)
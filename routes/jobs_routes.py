@@ -0,0 +1,18 @@
+# routes/jobs_routes.py
+
+from flask import Blueprint, jsonify
+import services.upload_jobs as upload_jobs
+
+jobs_bp = Blueprint(
+    'jobs',
+    __name__,
+    url_prefix='/jobs'
+)
+
+@jobs_bp.route('/<job_id>')
+def status_job(job_id):
+    """Estado de um job de upload (fase, linhas processadas, avisos e erro) para o polling da página."""
+    job = upload_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"erro": "Job não encontrado ou expirado."}), 404
+    return jsonify(job)
@@ -3,11 +3,11 @@
 import os
 from datetime import datetime
 from werkzeug.utils import secure_filename
-import io
-import pandas as pd
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, send_from_directory, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, current_app, jsonify
 import database.parceiro_db as db
+import database.common_db as db_common
 from utils import DELETE_PASSWORD
+import services.exportacao as exportacao
 import services.parceiros_embedded_service as api_service
 # -----------
 
@@ -48,105 +48,84 @@ parceiro_bp = Blueprint(
 )
 
 # --- NOVO: ROTA PARA EXPORTAR PARCEIROS ---
+# Coluna da tabela -> cabeçalho no arquivo exportado (ordem das colunas)
+COLUNAS_EXPORTACAO = {
+    "id": "ID Local",
+    "api_user_id": "ID API (Embedded)",
+    "nome_fantasia": "Nome Fantasia",
+    "tipo": "Tipo",
+    "cnpj": "CNPJ",
+    "nome_ajustado": "Nome Ajustado",
+    "razao_social": "Razão Social",
+    "gestor": "Gestor",
+    "telefone_gestor": "Telefone Gestor",
+    "email_gestor": "Email Gestor",
+    "data_entrada": "Data Entrada",
+    "data_saida": "Data Saída",
+    "senha_definida": "Senha Definida",
+    "data_atualizacao": "Última Atualização"
+}
+
+def _linhas_exportacao(filtros, conn=None):
+    """Parceiros filtrados, do cursor do servidor, com 1/0 traduzidos para o relatório."""
+    i_senha = list(COLUNAS_EXPORTACAO).index("senha_definida")
+    for linha in db.iter_parceiros_for_export(list(COLUNAS_EXPORTACAO), conn, **filtros):
+        linha = list(linha)
+        linha[i_senha] = 'Sim' if linha[i_senha] == 1 else 'Não'
+        yield linha
+
 @parceiro_bp.route('/exportar')
 def exportar_parceiros():
-    try:
-        # 1. Busca os mesmos filtros que a página principal usa
-        tipo_filtro = request.args.get('tipo') or None
-        nome_fantasia_filtro = request.args.get('nome_fantasia') or None 
-        data_entrada_min_filtro = request.args.get('data_entrada_min') or None
-        data_saida_max_filtro = request.args.get('data_saida_max') or None
-        sort_expiring_filtro = request.args.get('sort_expiring') == '1' # ADICIONADO
-
-        # 2. Busca os dados do banco (respeitando os filtros)
-        parceiros_data = db.get_all_parceiros(
-            tipo=tipo_filtro,
-            nome_fantasia=nome_fantasia_filtro, 
-            data_entrada_min=data_entrada_min_filtro,
-            data_saida_max=data_saida_max_filtro,
-            sort_by_expiration=sort_expiring_filtro # ADICIONADO
+    # 1. Mesmos filtros que a página principal usa
+    filtros = _filtros_da_requisicao(request)
+
+    # CSV/TSV (?formato=csv|tsv): gerado enquanto é enviado, com conexão própria
+    formato = request.args.get('formato', 'xlsx')
+    if formato in exportacao.FORMATOS_TEXTO:
+        return exportacao.resposta_texto(
+            lambda conn: _linhas_exportacao(filtros, conn),
+            list(COLUNAS_EXPORTACAO.values()), "export_parceiros", formato
         )
 
-        if not parceiros_data:
-            flash('Nenhum parceiro encontrado para exportar (com base nos filtros atuais).', 'warning')
-            return redirect(url_for('parceiro.gestao_parceiros'))
-
-        # 3. Converte os dados para um DataFrame do Pandas
-        #    (Convertemos de RowMapping para dict para o Pandas)
-        parceiros_list = [dict(row) for row in parceiros_data]
-        df = pd.DataFrame(parceiros_list)
-
-        # 4. Limpa e Renomeia as colunas para um relatório amigável
-        #    (Mapeia 1/0 para Sim/Não)
-        if 'status' in df.columns:
-            df['status'] = df['status'].apply(lambda x: 'Ativo' if x == 1 else 'Inativo')
-        
-        if 'senha_definida' in df.columns:
-             df['senha_definida'] = df['senha_definida'].apply(lambda x: 'Sim' if x == 1 else 'Não')
-
-        # Define a ordem e os nomes das colunas no Excel
-        colunas_exportar = {
-            "id": "ID Local",
-            "api_user_id": "ID API (Embedded)",
-            "nome_fantasia": "Nome Fantasia",
-            "tipo": "Tipo",
-            "cnpj": "CNPJ",
-            "nome_ajustado": "Nome Ajustado",
-            "razao_social": "Razão Social",
-            "gestor": "Gestor",
-            "telefone_gestor": "Telefone Gestor",
-            "email_gestor": "Email Gestor",
-            "data_entrada": "Data Entrada",
-            "data_saida": "Data Saída",
-            "senha_definida": "Senha Definida",
-            "data_atualizacao": "Última Atualização"
-        }
-        
-        # Filtra o DataFrame para ter apenas as colunas que queremos e na ordem certa
-        df_final = df[list(colunas_exportar.keys())].rename(columns=colunas_exportar)
-
-        # 5. Cria o arquivo Excel em memória
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_final.to_excel(writer, index=False, sheet_name='Parceiros')
-        
-        output.seek(0) # Volta ao início do arquivo em memória
-
-        # 6. Envia o arquivo para o usuário
-
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="export_parceiros.xlsx",
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    # 2. Parceiros direto do cursor para o XLSX temporário (ver services/exportacao.py)
+    try:
+        caminho, total = exportacao.gerar_xlsx(
+            _linhas_exportacao(filtros), list(COLUNAS_EXPORTACAO.values()), 'Parceiros'
         )
-
     except Exception as e:
         flash(f'Ocorreu um erro ao gerar o arquivo Excel: {e}', 'danger')
         return redirect(url_for('parceiro.gestao_parceiros'))
 
+    if total == 0:
+        exportacao.remover(caminho)
+        flash('Nenhum parceiro encontrado para exportar (com base nos filtros atuais).', 'warning')
+        return redirect(url_for('parceiro.gestao_parceiros'))
+
+    # 3. Envia o arquivo em blocos (apagado no fim do envio)
+    return exportacao.resposta_arquivo(caminho, "export_parceiros.xlsx", exportacao.XLSX_MIMETYPE)
+
+def _filtros_da_requisicao(request_obj):
+    """Filtros da listagem (query string) no formato de db.get_all_parceiros."""
+    return {
+        "tipo": request_obj.args.get('tipo') or None,
+        "nome_fantasia": request_obj.args.get('nome_fantasia') or None,
+        "data_entrada_min": request_obj.args.get('data_entrada_min') or None,
+        "data_saida_max": request_obj.args.get('data_saida_max') or None,
+        "sort_by_expiration": request_obj.args.get('sort_expiring') == '1',
+    }
+
 def _get_parceiros_filtrados(request_obj):
     """Função auxiliar para buscar parceiros filtrados (usado no GET)."""
-    tipo_filtro = request_obj.args.get('tipo') or None
-    nome_fantasia_filtro = request_obj.args.get('nome_fantasia') or None 
-    data_entrada_min_filtro = request_obj.args.get('data_entrada_min') or None
-    data_saida_max_filtro = request_obj.args.get('data_saida_max') or None
-    sort_expiring_filtro = request_obj.args.get('sort_expiring') == '1'
+    filtros = _filtros_da_requisicao(request_obj)
     
     expiring_partners = db.get_expiring_parceiros(days_ahead=30)
     expiring_ids_set = {p['id'] for p in expiring_partners}
 
-    parceiros = db.get_all_parceiros(
-        tipo=tipo_filtro,
-        nome_fantasia=nome_fantasia_filtro, 
-        data_entrada_min=data_entrada_min_filtro,
-        data_saida_max=data_saida_max_filtro,
-        sort_by_expiration=sort_expiring_filtro
-    )
+    parceiros = db.get_all_parceiros(**filtros)
     
-    return (parceiros, tipo_filtro, nome_fantasia_filtro, 
-            data_entrada_min_filtro, data_saida_max_filtro,
-            sort_expiring_filtro, expiring_ids_set) 
+    return (parceiros, filtros["tipo"], filtros["nome_fantasia"],
+            filtros["data_entrada_min"], filtros["data_saida_max"],
+            filtros["sort_by_expiration"], expiring_ids_set)
 
 # --- ROTA DE GESTÃO (GET e POST/CREATE) ---
 @parceiro_bp.route('/gerenciar', methods=['GET', 'POST'])
@@ -159,10 +138,8 @@ def gestao_parceiros():
             flash('O campo "Nome Ajustado" é obrigatório.', 'danger')
             return redirect(url_for('parceiro.gestao_parceiros'))
 
-        lista_validos = db.get_lista_nomes_ajustados()
-
-        # Verifica se o que foi digitado está na lista
-        if data["nome_ajustado"] not in lista_validos:
+        # Verifica se o que foi digitado está na lista (cache em memória)
+        if not db.nome_ajustado_valido(data["nome_ajustado"]):
             flash(f'O Nome Ajustado "{data["nome_ajustado"]}" é inválido. Selecione uma opção exata da lista.', 'danger')
             return redirect(url_for('parceiro.gestao_parceiros'))
         
@@ -184,6 +161,8 @@ def gestao_parceiros():
 
         try:
             # 3. CRIAÇÃO NA API E BANCO
+            # Não segura conexão do pool durante a chamada HTTP
+            db_common.release_db_connection()
             api_id, erro_api = api_service.criar_parceiro_completo(data)
             
             if erro_api:
@@ -211,9 +190,8 @@ def gestao_parceiros():
      data_entrada_min_filtro, data_saida_max_filtro,
      sort_expiring_filtro, expiring_ids_set) = _get_parceiros_filtrados(request)
     
-    # [NOVO] Busca a lista para o dropdown
-    lista_nomes_ajustados = db.get_lista_nomes_ajustados()
-    
+    # A lista de Nomes Ajustados NÃO vai mais no HTML: o campo busca sugestões
+    # em /parceiro/nomes_ajustados/sugestoes conforme o usuário digita.
     return render_template(
         'parceiro/parceiros.html',
         active_page='parceiros_gestao',
@@ -223,8 +201,7 @@ def gestao_parceiros():
         data_entrada_min_filtro=data_entrada_min_filtro,
         data_saida_max_filtro=data_saida_max_filtro,
         sort_expiring_filtro=sort_expiring_filtro, 
-        expiring_ids_set=expiring_ids_set,
-        lista_nomes_ajustados=lista_nomes_ajustados
+        expiring_ids_set=expiring_ids_set
     )
 
 
@@ -239,8 +216,7 @@ def editar_parceiro(parceiro_id):
         return redirect(url_for('parceiro.gestao_parceiros'))
 
     # --- [NOVO] VALIDAÇÃO DA EDIÇÃO ---
-    lista_validos = db.get_lista_nomes_ajustados()
-    if data["nome_ajustado"] not in lista_validos:
+    if not db.nome_ajustado_valido(data["nome_ajustado"]):
         flash(f'O Nome Ajustado "{data["nome_ajustado"]}" é inválido. Selecione uma opção exata da lista.', 'danger')
         return redirect(url_for('parceiro.gestao_parceiros'))
 
@@ -293,6 +269,7 @@ def editar_parceiro(parceiro_id):
     # 3. ATUALIZAÇÃO NO SERVIÇO E BANCO
     try:
         api_user_id = parceiro_atual.get('api_user_id')
+        db_common.release_db_connection() # Não segura conexão durante a chamada HTTP
         sucesso_api, erro_api = api_service.atualizar_usuario(api_user_id, data)
 
         if not sucesso_api:
@@ -327,6 +304,7 @@ def deletar_parceiro(parceiro_id):
 
     try:
         # Tenta deletar da API primeiro
+        db_common.release_db_connection() # Não segura conexão durante a chamada HTTP
         sucesso_api, erro_api = api_service.deletar_usuario(email_para_deletar)
         
         if not sucesso_api:
@@ -370,6 +348,7 @@ def definir_senha(parceiro_id):
 
     try:
         # 1. Chama o serviço para definir a senha na API
+        db_common.release_db_connection() # Não segura conexão durante a chamada HTTP
         sucesso_api, erro_api = api_service.definir_senha_usuario(email_do_parceiro, nova_senha)
 
         if not sucesso_api:
@@ -394,6 +373,25 @@ def baixar_contrato(filename):
     folder = current_app.config['UPLOAD_FOLDER']
     return send_from_directory(folder, filename)
 
+# --- ROTA DE AUTOCOMPLETE DO NOME AJUSTADO ---
+@parceiro_bp.route('/nomes_ajustados/sugestoes')
+def sugestoes_nomes_ajustados():
+    termo = request.args.get('q', '')
+    limite = min(request.args.get('limite', 20, type=int) or 20, 100)
+    return jsonify({
+        "sugestoes": db.buscar_nomes_ajustados(termo, limite),
+        # Indica se o termo digitado é exatamente um nome válido (validação no front)
+        "valido": db.nome_ajustado_valido(termo.strip())
+    })
+
+# --- ROTA PARA RECARREGAR A LISTA DE NOMES AJUSTADOS ---
+@parceiro_bp.route('/nomes_ajustados/recarregar', methods=['POST'])
+def recarregar_nomes_ajustados():
+    # Descarta o cache para que a próxima consulta releia as tabelas gold
+    db.invalidar_cache_nomes_ajustados()
+    flash('Lista de Nomes Ajustados recarregada.', 'success')
+    return redirect(url_for('parceiro.gestao_parceiros'))
+
 # --- ROTA PARA ATUALIZAR SILVER PARCEIROS TIPO ---
 @parceiro_bp.route('/executar_procedure_tipo', methods=['POST'])
 def executar_procedure_tipo():
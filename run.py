@@ -2,25 +2,48 @@
 
 import sys
 from waitress import serve
-from app import app  # MODIFICADO: Importa do nosso novo app.py
+from app import app, aplicar_migracoes, iniciar_snapshot_catalogo  # MODIFICADO: Importa do nosso novo app.py
+import database.common_db as database_common
+import database.catalogo_snapshot as catalogo_snapshot
 
-# Verifica se o argumento "--dev" foi passado na linha de comandos
-# Ex: python run.py --dev
-is_dev_mode = "--dev" in sys.argv
+# O upload em lote lê os arquivos num pool de processos; no Windows cada processo
+# importa este arquivo de novo, então nada abaixo pode rodar fora do __main__.
+if __name__ == '__main__':
+    # Ex: python run.py migrate
+    # Apenas aplica as migrações pendentes do banco e sai (útil no deploy)
+    if "migrate" in sys.argv:
+        _, erro = aplicar_migracoes()
+        sys.exit(1 if erro else 0)
 
-if is_dev_mode:
-    print("=" * 40)
-    print(">>> EXECUTANDO EM MODO DE DESENVOLVIMENTO <<<")
-    print(">>> O servidor irá reiniciar a cada alteração <<<")
-    print("=" * 40)
-    # Usa o servidor de desenvolvimento do Flask com debug=True (que ativa o auto-reload)
-    # O host 0.0.0.0 permite aceder a partir de outras máquinas na mesma rede
-    app.run(host='0.0.0.0', port=5000, debug=True)
-else:
-    print("=" * 40)
-    print(">>> EXECUTANDO EM MODO DE PRODUÇÃO (WAITRESS) <<<")
-    print("=" * 40)
-    # Usa o servidor de produção Waitress (estável, sem auto-reload)
+    # Ex: python run.py refresh-catalogo
+    # Recria o snapshot local do catálogo de produtos e sai
+    if "refresh-catalogo" in sys.argv:
+        total, erro = catalogo_snapshot.refresh_snapshot(database_common.engine)
+        print(f"Erro ao atualizar snapshot: {erro}" if erro else f"Snapshot atualizado: {total} GTINs.")
+        sys.exit(1 if erro else 0)
 
-    serve(app, host='0.0.0.0', port=5001)
-    #serve(app, host='192.168.21.251', port=5001)
\ No newline at end of file
+    # Verifica se o argumento "--dev" foi passado na linha de comandos
+    # Ex: python run.py --dev
+    is_dev_mode = "--dev" in sys.argv
+
+    # Aplica o schema uma única vez na inicialização (antes de aceitar requisições)
+    aplicar_migracoes()
+    iniciar_snapshot_catalogo()
+
+    if is_dev_mode:
+        print("=" * 40)
+        print(">>> EXECUTANDO EM MODO DE DESENVOLVIMENTO <<<")
+        print(">>> O servidor irá reiniciar a cada alteração <<<")
+        print("=" * 40)
+        # Usa o servidor de desenvolvimento do Flask com debug=True (que ativa o auto-reload)
+        # O host 0.0.0.0 permite aceder a partir de outras máquinas na mesma rede
+        app.run(host='0.0.0.0', port=5000, debug=True)
+    else:
+        print("=" * 40)
+        print(">>> EXECUTANDO EM MODO DE PRODUÇÃO (WAITRESS) <<<")
+        print("=" * 40)
+        # Usa o servidor de produção Waitress (estável, sem auto-reload)
+
+        # Threads do Waitress vêm do mesmo bloco que dimensiona o pool (SERVER_CONFIG)
+        serve(app, host='0.0.0.0', port=5001, threads=database_common.WAITRESS_THREADS)
+        #serve(app, host='192.168.21.251', port=5001)
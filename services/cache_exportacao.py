@@ -0,0 +1,99 @@
+# services/cache_exportacao.py
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import config
+
+######################################
+#   CACHE DE ARQUIVOS EXPORTADOS
+######################################
+# Um arquivo por (formato, colunas, entidade, versão dos dados). A versão vem
+# do banco (ex.: get_export_version: COUNT + MAX(id) + MAX(data_atualizacao)
+# + hash do conteúdo das linhas) e é barata de calcular; enquanto ela não muda, "Exportar" vira só o envio
+# do arquivo já pronto. O nome do arquivo é a própria ETag da resposta: o
+# navegador revalida com If-None-Match e recebe 304 sem corpo.
+# Acima de max_mb, os arquivos usados há mais tempo são removidos (antes de
+# publicar o novo, que nunca é a vítima); um arquivo maior que max_mb sozinho
+# não entra no cache e é enviado a partir do temporário.
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_cfg = getattr(config, 'EXPORT_CACHE', {})
+ATIVO = _cfg.get('ativo', True)
+CACHE_DIR = _cfg.get('diretorio') or os.path.join(_BASE_DIR, 'instance', 'cache_exportacao')
+MAX_BYTES = _cfg.get('max_mb', 200) * 1024 * 1024
+
+# Arquivos publicados/usados há menos que isso não são removidos: podem estar
+# entre o publicar() de outra requisição e o início do envio
+_EM_USO_S = 60
+
+
+def etag(*partes):
+    """Identificador estável das partes (formato, cabeçalhos, entidade, versão...)."""
+    texto = json.dumps(partes, default=str, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def _caminho(etag_arquivo, formato):
+    return os.path.join(CACHE_DIR, f"{etag_arquivo}.{formato}")
+
+
+def obter(etag_arquivo, formato):
+    """Caminho do arquivo em cache (marcando o uso), ou None."""
+    caminho = _caminho(etag_arquivo, formato)
+    try:
+        os.utime(caminho)  # Ordem da remoção por tamanho
+    except OSError:
+        return None
+    return caminho
+
+
+def novo_temporario(formato):
+    """Arquivo temporário dentro da pasta do cache (para publicar com rename)."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, caminho = tempfile.mkstemp(prefix="export_", suffix=f".{formato}.tmp", dir=CACHE_DIR)
+    os.close(fd)
+    return caminho
+
+
+def publicar(temporario, etag_arquivo, formato):
+    """
+    Move o arquivo gerado para o cache e retorna o caminho final. Retorna None
+    se o arquivo sozinho passa de MAX_BYTES: ele fica no temporário, que o
+    chamador envia e apaga.
+    """
+    tamanho = os.path.getsize(temporario)
+    if tamanho > MAX_BYTES:
+        return None
+    caminho = _caminho(etag_arquivo, formato)
+    _remover_excedente(tamanho, caminho)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def _remover_excedente(reservar, manter):
+    """
+    Remove os arquivos usados há mais tempo até o cache, mais `reservar` bytes
+    do arquivo que vai entrar em `manter`, caber em MAX_BYTES.
+    """
+    arquivos = []
+    limite_uso = time.time() - _EM_USO_S
+    total = reservar
+    for entrada in os.scandir(CACHE_DIR):
+        if entrada.is_file() and not entrada.name.endswith('.tmp') and entrada.path != manter:
+            info = entrada.stat()
+            total += info.st_size
+            if info.st_mtime < limite_uso:
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= MAX_BYTES:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass  # Sendo enviado agora (Windows); sai na próxima vez
@@ -0,0 +1,214 @@
+# services/cache_uploads.py
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import pandas as pd
+import config
+import database.common_db as db_common
+
+######################################
+#   CACHE DE PLANILHAS JÁ LIDAS
+######################################
+# Chave = sha256 dos bytes do arquivo + layout (campanha/tabloide). Quando o
+# mesmo arquivo é enviado de novo (outra campanha, nova tentativa), os lotes já
+# normalizados são lidos do disco em vez de abrir a planilha, e os códigos
+# internos resolvidos na vez anterior são reaproveitados (enquanto não vencem).
+#
+# Cada entrada é uma pasta em UPLOAD_CACHE['diretorio']:
+#   lote-00000.pkl ...   lotes (DataFrames já com as colunas da tabela)
+#   meta.json            formato, linhas, lotes e data de criação
+#   catalogo.json        GTINs resolvidos / não encontrados e quando
+# Só leituras completas viram entrada (gravadas numa pasta .tmp e renomeadas
+# no fim). Acima de max_mb, as entradas menos usadas recentemente são removidas.
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_cfg = getattr(config, 'UPLOAD_CACHE', {})
+ATIVO = _cfg.get('ativo', True)
+CACHE_DIR = _cfg.get('diretorio') or os.path.join(_BASE_DIR, 'instance', 'cache_uploads')
+MAX_BYTES = _cfg.get('max_mb', 500) * 1024 * 1024
+# Resoluções de codigo_interno mais velhas que isso são consultadas de novo
+TTL_CATALOGO_SEGUNDOS = _cfg.get('ttl_catalogo_segundos', 3600)
+
+_BLOCO_HASH = 1024 * 1024
+
+
+def chave_arquivo(file, layout):
+    """sha256 do conteúdo (FileStorage ou caminho) + nome do layout."""
+    sha = hashlib.sha256(layout["nome"].encode('utf-8') + b'\0')
+    if isinstance(file, str):
+        with open(file, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(_BLOCO_HASH), b''):
+                sha.update(bloco)
+    else:
+        for bloco in iter(lambda: file.read(_BLOCO_HASH), b''):
+            sha.update(bloco)
+        file.seek(0)
+    return sha.hexdigest()
+
+
+def _pasta(chave):
+    return os.path.join(CACHE_DIR, chave)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_json(caminho, dados):
+    tmp = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(tmp, caminho)
+
+
+class LeitorCache:
+    """Mesma interface do LeitorPlanilha (colunas_faltando, lotes, close), lendo os lotes do cache."""
+
+    formato = 'cache'
+    colunas_faltando = []
+
+    def __init__(self, chave, meta):
+        self.chave = chave
+        self.meta = meta
+
+    def lotes(self):
+        pasta = _pasta(self.chave)
+        for i in range(self.meta["lotes"]):
+            yield pd.read_pickle(os.path.join(pasta, f"lote-{i:05d}.pkl"))
+
+    def close(self):
+        pass
+
+
+def abrir_leitor(chave):
+    """LeitorCache da entrada, ou None se o arquivo não estiver no cache."""
+    meta_path = os.path.join(_pasta(chave), 'meta.json')
+    meta = _ler_json(meta_path)
+    if meta is None:
+        return None
+    try:
+        os.utime(meta_path)  # Marca o uso (ordem da remoção por tamanho)
+    except OSError:
+        pass
+    return LeitorCache(chave, meta)
+
+
+class LeitorComCache:
+    """
+    Envolve um LeitorPlanilha e grava cada lote no cache enquanto repassa.
+    A entrada só é publicada se a leitura for até o fim.
+    """
+
+    def __init__(self, leitor, chave):
+        self._leitor = leitor
+        self.chave = chave
+        self.formato = leitor.formato
+        self.colunas_faltando = leitor.colunas_faltando
+
+    def lotes(self):
+        tmp = f"{_pasta(self.chave)}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(tmp)
+        except OSError as e:
+            print(f"Cache de uploads indisponível: {e}")
+            yield from self._leitor.lotes()
+            return
+
+        total_lotes = linhas = 0
+        try:
+            for lote in self._leitor.lotes():
+                lote.to_pickle(os.path.join(tmp, f"lote-{total_lotes:05d}.pkl"))
+                total_lotes += 1
+                linhas += len(lote)
+                yield lote
+            _gravar_json(os.path.join(tmp, 'meta.json'), {
+                "formato": self.formato, "linhas": linhas, "lotes": total_lotes, "criado_em": time.time(),
+            })
+            _publicar(tmp, self.chave)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)  # Leitura interrompida ou já publicada
+
+    def close(self):
+        self._leitor.close()
+
+
+def _publicar(tmp, chave):
+    try:
+        os.rename(tmp, _pasta(chave))
+    except OSError:
+        return  # Outro upload do mesmo arquivo publicou antes
+    _remover_excedente()
+
+
+def _remover_excedente():
+    """Remove as entradas usadas há mais tempo até o cache caber em MAX_BYTES."""
+    entradas = []
+    for nome in os.listdir(CACHE_DIR):
+        pasta = os.path.join(CACHE_DIR, nome)
+        meta_path = os.path.join(pasta, 'meta.json')
+        if nome.endswith('.tmp') or not os.path.exists(meta_path):
+            continue
+        tamanho = sum(e.stat().st_size for e in os.scandir(pasta) if e.is_file())
+        entradas.append((os.path.getmtime(meta_path), tamanho, pasta))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, pasta in sorted(entradas):
+        if total <= MAX_BYTES:
+            break
+        shutil.rmtree(pasta, ignore_errors=True)
+        total -= tamanho
+
+
+class ResolvedorCatalogo:
+    """
+    Resolve GTIN -> codigo_interno usando primeiro o catalogo.json da entrada
+    (se ainda não venceu) e consultando no banco só o que faltar.
+    Chamável como db_common.get_codigo_interno_map_from_gtins.
+    """
+
+    def __init__(self, chave):
+        self.chave = chave
+        self._encontrados = {}
+        self._nao_encontrados = set()
+        self._consultou_banco = False
+        self._resolvido_em = None
+        dados = _ler_json(os.path.join(_pasta(chave), 'catalogo.json'))
+        if dados and time.time() - dados.get("resolvido_em", 0) <= TTL_CATALOGO_SEGUNDOS:
+            self._encontrados = dados["encontrados"]
+            self._nao_encontrados = set(dados["nao_encontrados"])
+            self._resolvido_em = dados["resolvido_em"]
+
+    def __call__(self, gtin_list):
+        faltando = [g for g in gtin_list if g not in self._encontrados and g not in self._nao_encontrados]
+        if faltando:
+            ci_map, erro = db_common.get_codigo_interno_map_from_gtins(faltando)
+            if erro:
+                return {}, erro
+            self._consultou_banco = True
+            self._encontrados.update(ci_map)
+            self._nao_encontrados.update(g for g in faltando if g not in ci_map)
+        return {g: self._encontrados[g] for g in gtin_list if g in self._encontrados}, None
+
+    def salvar(self):
+        """Grava as resoluções na entrada (se ela existir e algo foi consultado agora)."""
+        pasta = _pasta(self.chave)
+        if not self._consultou_banco or not os.path.isdir(pasta):
+            return
+        try:
+            _gravar_json(os.path.join(pasta, 'catalogo.json'), {
+                # Mantém a data da resolução mais antiga reaproveitada (o TTL conta dela)
+                "resolvido_em": self._resolvido_em or time.time(),
+                "encontrados": self._encontrados,
+                "nao_encontrados": sorted(self._nao_encontrados),
+            })
+        except OSError as e:
+            print(f"Erro ao gravar resoluções no cache de uploads: {e}")
@@ -0,0 +1,252 @@
+# services/exportacao.py
+
+import csv
+import io
+import os
+import tempfile
+import unicodedata
+from urllib.parse import quote
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from flask import Response, request, send_file
+from werkzeug.http import quote_header_value
+from sqlalchemy.exc import SQLAlchemyError
+import config
+import database.common_db as db_common
+import services.cache_exportacao as cache_exportacao
+
+######################################
+#   EXPORTAÇÃO EM STREAMING
+######################################
+# As linhas vêm de um cursor no servidor (common_db.iter_consulta) direto
+# para um workbook openpyxl em modo write_only, que grava cada linha num
+# arquivo temporário em vez de montar a planilha na memória. O XLSX é um zip
+# que só fica pronto no save, então o arquivo é gerado inteiro em disco e
+# depois enviado em blocos, sendo apagado ao fim do envio (ou se o cliente
+# desistir). Memória constante: nem lista de dicts, nem DataFrame, nem BytesIO.
+#
+# CSV/TSV não precisam de arquivo: a resposta é um gerador que abre a própria
+# conexão (a da requisição já foi devolvida quando o corpo começa a ser
+# enviado), manda o cabeçalho na hora e vai escrevendo os blocos conforme as
+# linhas chegam do cursor.
+#
+# Com uma versão dos dados (exportar(..., chave_cache=...)), o arquivo gerado
+# fica no cache de exportações (services/cache_exportacao.py) e a resposta
+# leva ETag; o CSV é copiado para o cache enquanto é enviado.
+
+_cfg = getattr(config, 'EXPORT_CONFIG', {})
+TAMANHO_BLOCO = _cfg.get('tamanho_bloco_kb', 64) * 1024
+DIRETORIO_TEMP = _cfg.get('diretorio_temp') or None  # None = pasta temporária do sistema
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# formato -> (separador, mimetype)
+FORMATOS_TEXTO = {
+    'csv': (_cfg.get('csv_separador', ','), "text/csv"),
+    'tsv': ('\t', "text/tab-separated-values"),
+}
+# BOM no início do CSV (o Excel só reconhece UTF-8 com ele; sistemas costumam preferir sem)
+CSV_BOM = _cfg.get('csv_bom', False)
+
+
+def remover(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def gerar_xlsx(linhas, cabecalhos, aba, caminho=None):
+    """
+    Grava cabeçalhos + linhas (iterável de tuplas) num XLSX temporário
+    (ou em caminho, se informado). Retorna (caminho, total_de_linhas); quem
+    chama envia (resposta_arquivo) ou apaga (remover) o arquivo.
+    Exceções de leitura/gravação sobem.
+    """
+    if caminho is None:
+        fd, caminho = tempfile.mkstemp(prefix="export_", suffix=".xlsx", dir=DIRETORIO_TEMP)
+        os.close(fd)
+    total = 0
+    try:
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(aba)
+        negrito = Font(bold=True)
+        titulo = []
+        for cabecalho in cabecalhos:
+            celula = WriteOnlyCell(ws, value=cabecalho)
+            celula.font = negrito
+            titulo.append(celula)
+        ws.append(titulo)
+        for linha in linhas:
+            ws.append(linha)
+            total += 1
+        wb.save(caminho)
+    except Exception:
+        remover(caminho)
+        raise
+    finally:
+        fechar = getattr(linhas, 'close', None)
+        if fechar:
+            fechar()  # Libera o cursor do servidor se a leitura parou no meio
+    return caminho, total
+
+
+def _enviar_e_apagar(caminho):
+    try:
+        with open(caminho, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+                yield bloco
+    finally:
+        remover(caminho)
+
+
+def content_disposition(nome_arquivo):
+    """Cabeçalho de anexo aceitando nomes com acento (filename* da RFC 6266)."""
+    simples = unicodedata.normalize('NFKD', nome_arquivo).encode('ascii', 'ignore').decode('ascii')
+    valor = f"attachment; filename={quote_header_value(simples)}"
+    if simples != nome_arquivo:
+        valor += f"; filename*=UTF-8''{quote(nome_arquivo, safe='')}"
+    return valor
+
+
+def resposta_arquivo(caminho, nome_arquivo, mimetype):
+    """Response que envia o arquivo temporário em blocos e o apaga no fim."""
+    resposta = Response(_enviar_e_apagar(caminho), mimetype=mimetype, direct_passthrough=True)
+    resposta.headers['Content-Length'] = str(os.path.getsize(caminho))
+    resposta.headers['Content-Disposition'] = content_disposition(nome_arquivo)
+    return resposta
+
+
+def _blocos_texto(consulta, cabecalhos, separador):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=separador, lineterminator='\r\n')
+    writer.writerow(cabecalhos)
+    yield (('\ufeff' if CSV_BOM else '') + buffer.getvalue()).encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    conn = linhas = None
+    try:
+        conn = db_common.abrir_conexao()  # Passa pelas métricas/timeout do pool (/health/db)
+        linhas = consulta(conn)
+        for linha in linhas:
+            writer.writerow(linha)
+            if buffer.tell() >= TAMANHO_BLOCO:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+    finally:
+        # Cliente desistiu ou terminou: fecha o cursor do servidor antes de devolver a conexão
+        if linhas is not None and hasattr(linhas, 'close'):
+            linhas.close()
+        if conn is not None:
+            conn.close()
+
+
+def _gerar_texto(consulta, cabecalhos, separador, copia=None):
+    """
+    Blocos do CSV/TSV. copia: (temporario, publicar) grava os blocos também
+    no arquivo e chama publicar() só se a exportação chegar ao fim.
+    """
+    arquivo = open(copia[0], 'wb') if copia else None
+    completo = False
+    try:
+        for bloco in _blocos_texto(consulta, cabecalhos, separador):
+            if arquivo:
+                arquivo.write(bloco)
+            yield bloco
+        completo = True
+    except SQLAlchemyError as e:
+        # O status 200 já foi enviado: o arquivo fica truncado e o erro vai para o log
+        print(f"Erro durante a exportação em streaming: {e}")
+    finally:
+        if arquivo:
+            arquivo.close()
+            try:
+                if completo:
+                    copia[1]()
+            except OSError as e:
+                print(f"Erro ao gravar a exportação no cache: {e}")
+            remover(copia[0])  # Após publicar já não existe; senão (erro ou acima de max_mb) sai aqui
+
+
+def resposta_texto(consulta, cabecalhos, nome_base, formato, copia=None):
+    """
+    Response CSV/TSV gerada enquanto é enviada. consulta(conn) deve devolver
+    o iterável de tuplas (ex.: iter_products_for_export com conn=conn), usando
+    a conexão própria aberta aqui. copia: ver _gerar_texto.
+    """
+    separador, mimetype = FORMATOS_TEXTO[formato]
+    resposta = Response(_gerar_texto(consulta, cabecalhos, separador, copia), mimetype=mimetype)
+    resposta.headers['Content-Disposition'] = content_disposition(f"{nome_base}.{formato}")
+    return resposta
+
+
+def _mimetype(formato):
+    return FORMATOS_TEXTO[formato][1] if formato in FORMATOS_TEXTO else XLSX_MIMETYPE
+
+
+def _resposta_cache(caminho, nome_arquivo, formato, etag):
+    # no-cache: o navegador guarda, mas revalida (If-None-Match) a cada exportação
+    resposta = send_file(
+        caminho, mimetype=_mimetype(formato), as_attachment=True, download_name=nome_arquivo,
+        etag=etag, conditional=True, max_age=0
+    )
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+
+def etag_exportacao(formato, cabecalhos, chave_cache):
+    """ETag (e nome no cache) da exportação; None sem chave_cache ou com o cache desligado."""
+    if chave_cache is None or not cache_exportacao.ATIVO:
+        return None
+    return cache_exportacao.etag(formato, cabecalhos, CSV_BOM, FORMATOS_TEXTO.get(formato), *chave_cache)
+
+
+def exportar(formato, consulta, cabecalhos, nome_base, aba, chave_cache=None):
+    """
+    Resposta da exportação em xlsx, csv ou tsv.
+    consulta(conn) -> iterável de tuplas; com conn=None o XLSX usa a conexão
+    da requisição (o CSV/TSV sempre abre uma própria).
+    chave_cache: partes que identificam os dados (ex.: tipo, id e versão do
+    get_export_version); com ela o arquivo fica no cache de exportações e a
+    resposta leva ETag (304 se o cliente já tem essa versão).
+    Erros ao gerar o XLSX sobem; no CSV/TSV o envio já começou (ver _gerar_texto).
+    """
+    nome_arquivo = f"{nome_base}.{formato}"
+    etag = etag_exportacao(formato, cabecalhos, chave_cache)
+    if etag:
+        if request.if_none_match.contains(etag):
+            resposta = Response(status=304)
+            resposta.set_etag(etag)
+            return resposta
+        caminho = cache_exportacao.obter(etag, formato)
+        if caminho:
+            return _resposta_cache(caminho, nome_arquivo, formato, etag)
+
+    if formato in FORMATOS_TEXTO:
+        copia = None
+        if etag:
+            try:
+                temporario = cache_exportacao.novo_temporario(formato)
+                copia = (temporario, lambda: cache_exportacao.publicar(temporario, etag, formato))
+            except OSError as e:
+                print(f"Cache de exportações indisponível: {e}")
+        resposta = resposta_texto(consulta, cabecalhos, nome_base, formato, copia)
+        if etag:
+            resposta.set_etag(etag)
+            resposta.headers['Cache-Control'] = 'no-cache'
+        return resposta
+
+    if not etag:
+        caminho, _ = gerar_xlsx(consulta(None), cabecalhos, aba)
+        return resposta_arquivo(caminho, nome_arquivo, XLSX_MIMETYPE)
+    temporario = cache_exportacao.novo_temporario(formato)
+    gerar_xlsx(consulta(None), cabecalhos, aba, temporario)
+    caminho = cache_exportacao.publicar(temporario, etag, formato)
+    if caminho is None:
+        # Maior que o cache inteiro: vai do temporário, sem ETag
+        return resposta_arquivo(temporario, nome_arquivo, XLSX_MIMETYPE)
+    return _resposta_cache(caminho, nome_arquivo, formato, etag)
@@ -0,0 +1,227 @@
+# services/exportacao_jobs.py
+
+import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import config
+import services.cache_exportacao as cache_exportacao
+import services.exportacao as exportacao
+
+######################################
+#   EXPORTAÇÃO EM LOTE (ZIP)
+######################################
+# Várias campanhas/tabloides num arquivo só. O job gera uma planilha por
+# entidade num pool de threads (cada planilha com a sua conexão do pool do
+# SQLAlchemy e cursor no servidor, como a exportação individual) e grava no
+# ZIP em disco cada planilha que fica pronta. A página acompanha pelo
+# GET /exportacao/jobs/<id> e baixa o ZIP quando o job termina.
+# Planilhas cuja versão dos dados já está no cache de exportações
+# (services/cache_exportacao.py) não são geradas de novo, e as geradas aqui
+# entram no cache (o "Exportar" de cada página passa a sair pronto).
+# O registro é em memória, como o dos uploads (services/upload_jobs.py): o ZIP
+# fica disponível por EXPORT_CONFIG['lote_retencao_segundos'] e some num restart.
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_cfg = getattr(config, 'EXPORT_CONFIG', {})
+LOTE_WORKERS = _cfg.get('lote_workers', 2)          # Planilhas geradas ao mesmo tempo (uma conexão cada)
+LOTE_MAX_FILA = _cfg.get('lote_max_fila', 5)        # Exportações pendentes aceitas antes de recusar
+LOTE_RETENCAO_SEGUNDOS = _cfg.get('lote_retencao_segundos', 3600)
+LOTE_DIR = _cfg.get('lote_diretorio') or os.path.join(_BASE_DIR, 'instance', 'exportacoes')
+
+FASES = {
+    'na_fila': 'Aguardando na fila',
+    'gerando': 'Gerando as planilhas',
+    'concluido': 'Concluído',
+    'erro': 'Erro',
+}
+
+# Um job por vez; o paralelismo fica nas planilhas de cada job
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exportacao-job")
+_planilhas = ThreadPoolExecutor(max_workers=LOTE_WORKERS, thread_name_prefix="exportacao-planilha")
+_jobs = {}
+_lock = threading.Lock()
+
+_CARACTERES_INVALIDOS = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+def _novo_job(tarefas):
+    agora = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "fase": 'na_fila',
+        "fase_descricao": FASES['na_fila'],
+        "total": len(tarefas),
+        "concluidos": 0,
+        "linhas": 0,
+        "itens": [],
+        "erro": None,
+        "arquivo_pronto": False,
+        "concluido": False,
+        "criado_em": agora,
+        "atualizado_em": agora,
+    }
+
+
+def _atualizar(job_id, fase=None, **campos):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        if fase is not None:
+            job["fase"] = fase
+            job["fase_descricao"] = FASES[fase]
+        job.update(campos)
+        job["atualizado_em"] = time.time()
+
+
+def _caminho_zip(job_id):
+    return os.path.join(LOTE_DIR, f"{job_id}.zip")
+
+
+def _limpar_antigos():
+    """Descarta os jobs (e os ZIPs) concluídos há mais de LOTE_RETENCAO_SEGUNDOS (chamar com _lock)."""
+    limite = time.time() - LOTE_RETENCAO_SEGUNDOS
+    for job_id in [j["id"] for j in _jobs.values() if j["concluido"] and j["atualizado_em"] < limite]:
+        del _jobs[job_id]
+        exportacao.remover(_caminho_zip(job_id))
+
+
+def _pendentes():
+    return sum(1 for j in _jobs.values() if not j["concluido"])
+
+
+def enviar_exportacao(app, tarefas):
+    """
+    Enfileira a exportação em lote. tarefas: uma por entidade, dicts com
+    tipo ('campanha'/'tabloide'), id, nome, aba, cabecalhos,
+    consulta(conn) -> tuplas (como em exportacao.exportar) e
+    versao() -> (get_export_version, erro).
+    Retorna (job_id, erro).
+    """
+    if not tarefas:
+        return None, "Nenhuma campanha ou tabloide selecionado."
+    with _lock:
+        _limpar_antigos()
+        if _pendentes() >= LOTE_MAX_FILA:
+            return None, "Muitas exportações em andamento. Tente novamente em alguns minutos."
+        job = _novo_job(tarefas)
+        _jobs[job["id"]] = job
+    _executor.submit(_executar, app, job["id"], tarefas)
+    return job["id"], None
+
+
+def _nome_no_zip(tarefa):
+    nome = _CARACTERES_INVALIDOS.sub('_', str(tarefa["nome"])).strip(' .') or tarefa["tipo"]
+    return f"{tarefa['tipo']}s/{nome} ({tarefa['id']}).xlsx"
+
+
+def _gerar_planilha(app, tarefa):
+    """
+    Planilha de uma entidade (roda no pool _planilhas).
+    Retorna (caminho, linhas, do_cache, apagar); caminho None = sem produtos.
+    apagar: o arquivo é temporário e sai do disco depois de entrar no ZIP.
+    """
+    # Contexto próprio: get_db_connection pega uma conexão só para esta planilha
+    with app.app_context():
+        versao, _ = tarefa["versao"]()
+        if versao is not None and versao["total"] == 0:
+            return None, 0, False, False
+
+        chave = (tarefa["tipo"], tarefa["id"], versao) if versao is not None else None
+        etag = exportacao.etag_exportacao('xlsx', tarefa["cabecalhos"], chave)
+        if not etag:
+            caminho, total = exportacao.gerar_xlsx(tarefa["consulta"](None), tarefa["cabecalhos"], tarefa["aba"])
+            return caminho, total, False, True
+
+        caminho = cache_exportacao.obter(etag, 'xlsx')
+        if caminho:
+            return caminho, versao["total"], True, False
+        temporario = cache_exportacao.novo_temporario('xlsx')
+        _, total = exportacao.gerar_xlsx(tarefa["consulta"](None), tarefa["cabecalhos"], tarefa["aba"], temporario)
+        try:
+            caminho = cache_exportacao.publicar(temporario, etag, 'xlsx')
+        except OSError as e:
+            print(f"Erro ao gravar a exportação no cache: {e}")
+            caminho = None
+        if caminho is None:
+            return temporario, total, False, True  # Fora do cache (erro ou acima de max_mb)
+        return caminho, total, False, False
+
+
+def _executar(app, job_id, tarefas):
+    _atualizar(job_id, 'gerando')
+    caminho_zip = _caminho_zip(job_id)
+    temporario = f"{caminho_zip}.tmp"
+    futuros = {}
+    itens = []
+    linhas = 0
+    try:
+        os.makedirs(LOTE_DIR, exist_ok=True)
+        futuros = {_planilhas.submit(_gerar_planilha, app, tarefa): tarefa for tarefa in tarefas}
+        # XLSX já é compactado: ZIP_STORED só junta os arquivos, sem gastar CPU
+        with zipfile.ZipFile(temporario, 'w', zipfile.ZIP_STORED) as zf:
+            for futuro in as_completed(futuros):
+                tarefa = futuros[futuro]
+                item = {"tipo": tarefa["tipo"], "id": tarefa["id"], "nome": tarefa["nome"],
+                        "linhas": 0, "do_cache": False, "erro": None}
+                try:
+                    caminho, total, do_cache, apagar = futuro.result()
+                    if caminho is None:
+                        item["erro"] = "Nenhum produto para exportar."
+                    else:
+                        try:
+                            zf.write(caminho, _nome_no_zip(tarefa))
+                        finally:
+                            if apagar:
+                                exportacao.remover(caminho)
+                        item.update(linhas=total, do_cache=do_cache)
+                        linhas += total
+                except Exception as e:
+                    print(f"Erro ao exportar {tarefa['tipo']} {tarefa['id']} no job {job_id}: {e}")
+                    item["erro"] = f"Erro ao gerar a planilha: {e}"
+                itens.append(item)
+                _atualizar(job_id, concluidos=len(itens), linhas=linhas, itens=list(itens))
+
+        if not any(item["linhas"] for item in itens):
+            _atualizar(job_id, 'erro', erro="Nenhuma planilha foi gerada.", concluido=True)
+            return
+        os.replace(temporario, caminho_zip)
+        _atualizar(job_id, 'concluido', arquivo_pronto=True, concluido=True)
+    except Exception as e:
+        print(f"Erro inesperado no job de exportação {job_id}: {e}")
+        for futuro in futuros:
+            futuro.cancel()
+        _atualizar(job_id, 'erro', erro=f"Erro inesperado ao gerar o ZIP: {e}", concluido=True)
+    finally:
+        exportacao.remover(temporario)
+
+
+def get_job(job_id):
+    """Cópia do estado do job (ou None se não existir / já expirou)."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job, itens=list(job["itens"])) if job else None
+
+
+def caminho_arquivo(job_id):
+    """Caminho do ZIP do job, se já estiver pronto."""
+    job = get_job(job_id)
+    if job is None or not job["arquivo_pronto"]:
+        return None
+    return _caminho_zip(job_id)
+
+
+def get_jobs_status():
+    """Resumo das exportações em lote (para o /health)."""
+    with _lock:
+        return {
+            "workers": LOTE_WORKERS,
+            "pendentes": _pendentes(),
+            "max_fila": LOTE_MAX_FILA,
+            "registrados": len(_jobs),
+        }
@@ -0,0 +1,238 @@
+# services/ingestao_lote.py
+
+import os
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import openpyxl
+import pandas as pd
+import config
+import database.common_db as db_common
+import services.ingestao_produtos as ingestao
+
+######################################
+#   UPLOAD EM LOTE (VÁRIOS TABLOIDES)
+######################################
+# Vários arquivos e/ou um arquivo com uma aba por tabloide num único envio.
+# Cada par (arquivo, aba) vira uma "unidade", ligada a um tabloide pelo nome
+# (ou id) da aba; se nenhuma aba do arquivo tiver nome de tabloide, vale o
+# nome do arquivo (lendo a aba padrão do layout, "Todos").
+#
+# 1. As unidades são lidas em paralelo num pool de PROCESSOS (a leitura do
+#    openpyxl é Python puro e não escala com threads por causa do GIL).
+#    Cada processo devolve os lotes já normalizados (DataFrames).
+# 2. Os códigos internos são buscados UMA vez, para a união dos GTINs de
+#    todas as unidades.
+# 3. Cada unidade é carregada na staging e troca os produtos do seu tabloide
+#    (ingestao.carregar_leitor), uma de cada vez: a falha de uma não desfaz
+#    as outras.
+# Os lotes de todas as unidades ficam em memória entre os passos 1 e 3.
+
+_cfg = getattr(config, 'UPLOAD_CONFIG', {})
+LOTE_PROCESSOS = _cfg.get('lote_processos') or min(4, os.cpu_count() or 1)
+LOTE_MAX_ARQUIVOS = _cfg.get('lote_max_arquivos', 30)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Pool criado no primeiro upload em lote (não sobe processos à toa na inicialização)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=LOTE_PROCESSOS)
+        return _pool
+
+
+def _descartar_pool():
+    """Um processo do pool morreu: o pool fica inutilizável e é recriado no próximo lote."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def normalizar_nome(nome):
+    """Nome para comparação: sem acentos, sem espaços repetidos, minúsculo."""
+    sem_acento = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sem_acento.split()).casefold()
+
+
+def _abas(caminho, formato):
+    if formato == 'xlsx':
+        wb = openpyxl.load_workbook(caminho, read_only=True)
+        try:
+            return list(wb.sheetnames)
+        finally:
+            wb.close()
+    if formato == 'xls':
+        with pd.ExcelFile(caminho) as arquivo:
+            return list(arquivo.sheet_names)
+    return []  # csv/parquet: uma tabela só
+
+
+def montar_unidades(arquivos, entidades):
+    """
+    arquivos: [(caminho, nome_original)]; entidades: {id: nome}.
+    Retorna (unidades, avisos); cada unidade é
+    {"caminho", "arquivo", "aba", "entidade_id", "entidade_nome"}.
+    """
+    por_nome = {}
+    for entidade_id, nome in entidades.items():
+        por_nome[normalizar_nome(nome)] = entidade_id
+        por_nome[str(entidade_id)] = entidade_id
+
+    unidades, avisos, usados = [], [], {}
+
+    def adicionar(caminho, arquivo, aba, entidade_id):
+        origem = f'{arquivo} (aba "{aba}")' if aba else arquivo
+        if entidade_id in usados:
+            avisos.append(f'{origem}: "{entidades[entidade_id]}" já veio de {usados[entidade_id]}; ignorado.')
+            return
+        usados[entidade_id] = origem
+        unidades.append({
+            "caminho": caminho, "arquivo": arquivo, "aba": aba,
+            "entidade_id": entidade_id, "entidade_nome": entidades[entidade_id],
+        })
+
+    for caminho, arquivo in arquivos:
+        try:
+            abas = _abas(caminho, ingestao.detectar_formato(caminho))
+        except Exception as e:
+            avisos.append(f'{arquivo}: não foi possível abrir o arquivo ({e}).')
+            continue
+
+        com_entidade = [a for a in abas if normalizar_nome(a) in por_nome]
+        if com_entidade:
+            for aba in com_entidade:
+                adicionar(caminho, arquivo, aba, por_nome[normalizar_nome(aba)])
+            ignoradas = [a for a in abas if a not in com_entidade]
+            if ignoradas:
+                avisos.append(f'{arquivo}: abas sem tabloide com o mesmo nome ignoradas: {", ".join(ignoradas)}.')
+            continue
+
+        nome_base = normalizar_nome(os.path.splitext(arquivo)[0])
+        if nome_base in por_nome:
+            adicionar(caminho, arquivo, None, por_nome[nome_base])
+        else:
+            avisos.append(f'{arquivo}: nenhum tabloide ativo com o nome do arquivo ou de uma das abas; ignorado.')
+    return unidades, avisos
+
+
+def _ler_unidade(caminho, nome_layout, aba):
+    """
+    Roda no processo do pool: lê a unidade inteira e devolve (lotes, erro).
+    Recebe só tipos simples (o layout vai pelo nome).
+    """
+    layout = ingestao.LAYOUTS[nome_layout]
+    try:
+        leitor = ingestao.LeitorPlanilha(caminho, layout, aba=aba)
+    except Exception as e:
+        return None, f'Erro ao abrir o arquivo: {e}'
+    try:
+        if leitor.colunas_faltando:
+            return None, ingestao.mensagem_colunas_faltando(leitor.colunas_faltando)
+        return list(leitor.lotes()), None
+    except Exception as e:
+        return None, f'Erro ao ler o arquivo: {e}'
+    finally:
+        leitor.close()
+
+
+class LeitorMemoria:
+    """Mesma interface do LeitorPlanilha, sobre lotes já lidos."""
+
+    formato = 'lote'
+    colunas_faltando = []
+
+    def __init__(self, lotes):
+        self._lotes = lotes
+
+    def lotes(self):
+        yield from self._lotes
+
+    def close(self):
+        self._lotes = []
+
+
+def _novo_item(unidade):
+    item = ingestao.novo_relatorio()
+    item.update({campo: unidade[campo] for campo in ("arquivo", "aba", "entidade_id", "entidade_nome")})
+    return item
+
+
+def substituir_produtos_em_lote(arquivos, entidades, layout, progresso=None, modo=ingestao.MODO_SUBSTITUIR):
+    """
+    Upload em lote (ver o topo do módulo). Retorna o relatório geral
+    (somas de linhas/inseridos/...) com "itens": um relatório por unidade
+    (arquivo, aba, entidade_id, entidade_nome + campos do substituir_produtos).
+    "erro" geral só quando nenhuma unidade pôde ser processada.
+    """
+    relatorio = ingestao.novo_relatorio()
+    relatorio["itens"] = []
+    avisar = progresso or (lambda fase, rel: None)
+
+    unidades, avisos = montar_unidades(arquivos, entidades)
+    relatorio["avisos"].extend(avisos)
+    if not unidades:
+        relatorio["erro"] = 'Nenhum arquivo ou aba corresponde a um tabloide ativo.'
+        return relatorio
+
+    # 1. Leitura em paralelo
+    avisar('lendo', relatorio)
+    itens = [_novo_item(u) for u in unidades]
+    lotes_por_item = {}
+    try:
+        pool = _get_pool()
+        futuros = {
+            pool.submit(_ler_unidade, u["caminho"], layout["nome"], u["aba"]): i
+            for i, u in enumerate(unidades)
+        }
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            try:
+                lotes, erro = futuro.result()
+            except BrokenProcessPool as e:  # Processo do pool morreu (memória, etc.)
+                lotes, erro = None, f'Erro ao ler o arquivo: {e}'
+                _descartar_pool()
+            if erro:
+                itens[i]["erro"] = erro
+            else:
+                lotes_por_item[i] = lotes
+                relatorio["linhas"] += sum(len(lote) for lote in lotes)
+            avisar('lendo', relatorio)
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            _descartar_pool()
+        relatorio["erro"] = f'Erro na leitura em paralelo: {e}'
+        return relatorio
+
+    # 2. Uma busca de códigos internos para todos os GTINs
+    avisar('buscando_codigos', relatorio)
+    gtins = sorted({g for lotes in lotes_por_item.values() for lote in lotes for g in ingestao.gtins_para_busca(lote)})
+    ci_map, erro = db_common.get_codigo_interno_map_from_gtins(gtins) if gtins else ({}, None)
+    if erro:
+        relatorio["avisos"].append(f'Erro ao buscar códigos internos: {erro}')
+        ci_map = {}
+
+    def resolver(lista):
+        return {g: ci_map[g] for g in lista if g in ci_map}, None
+
+    # 3. Carga e troca, tabloide a tabloide
+    for i, item in enumerate(itens):
+        if i in lotes_por_item:
+            ingestao.carregar_leitor(
+                LeitorMemoria(lotes_por_item.pop(i)), item["entidade_id"], layout,
+                modo=modo, resolver=resolver, relatorio=item
+            )
+        relatorio["itens"].append(item)
+        for campo in ("inseridos", "atualizados", "removidos", "inalterados"):
+            relatorio[campo] += item[campo]
+        avisar('substituindo', relatorio)
+
+    if all(item["erro"] for item in itens):
+        relatorio["erro"] = 'Nenhum tabloide foi atualizado.'
+    return relatorio
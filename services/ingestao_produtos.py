@@ -0,0 +1,640 @@
+# services/ingestao_produtos.py
+
+import hashlib
+import os
+import uuid
+from decimal import Decimal, InvalidOperation
+import openpyxl
+import pandas as pd
+import config
+import database.common_db as db_common
+import database.campanha_produtos_db as db_campanha_produtos
+import database.tabloide_produtos_db as db_tabloide_produtos
+import services.cache_uploads as cache_uploads
+
+try:
+    import pyarrow.parquet as pq  # Opcional: só é necessário para upload em Parquet
+except ImportError:
+    pq = None
+
+_upload_cfg = getattr(config, 'UPLOAD_CONFIG', {})
+
+# Modos do upload: troca a lista inteira ou aplica só as diferenças
+MODO_SUBSTITUIR = 'substituir'
+MODO_DIFERENCAS = 'diferencas'
+# Linhas lidas, resolvidas e inseridas por vez (memória fica constante)
+TAMANHO_LOTE = _upload_cfg.get('tamanho_lote', 5000)
+
+# --- LAYOUTS DAS PLANILHAS ---
+# column_map: cabeçalho da planilha -> coluna da tabela
+# colunas_numericas: convertidas com pd.to_numeric (valor inválido vira NULL)
+# parametros: coluna da tabela -> nome do parâmetro no INSERT do módulo de banco
+# colunas_preco: conferidas na pré-visualização (não numérico, <= 0, desconto > normal)
+# colunas_numericas_banco: numéricas na tabela; no upload por diferença são
+#   comparadas como número (1.5 == 1.50), as demais como texto
+# db: módulo de banco dos produtos (add_products_bulk e funções de staging)
+
+CAMPANHA = {
+    "nome": "campanha",
+    "aba": None,  # Primeira aba
+    "column_map": {
+        'CÓDIGO DE BARRAS': 'codigo_barras', 'DESCRIÇÃO': 'descricao', 'PONTUAÇÃO': 'pontuacao',
+        'PREÇO NORMAL': 'preco_normal', 'PREÇO COM DESCONTO': 'preco_desconto',
+        'REBAIXE': 'rebaixe', 'QTD LIMITE': 'qtd_limite'
+    },
+    "colunas_numericas": [],
+    "colunas_preco": ['preco_normal', 'preco_desconto', 'rebaixe'],
+    "colunas_numericas_banco": ['pontuacao', 'preco_normal', 'preco_desconto', 'rebaixe', 'qtd_limite'],
+    "parametros": db_campanha_produtos.PRODUTO_PARAMS,
+    "db": db_campanha_produtos,
+}
+
+TABLOIDE = {
+    "nome": "tabloide",
+    "aba": 'Todos',
+    "column_map": {
+        'GTIN': 'codigo_barras', 'DESCRIÇÃO': 'descricao', 'LABORATÓRIO': 'laboratorio',
+        'TIPO DE PREÇO': 'tipo_preco', 'PREÇO NORMAL': 'preco_normal',
+        'PREÇO DESCONTO GERAL': 'preco_desconto', 'PREÇO DESCONTO CLIENTE+': 'preco_desconto_cliente',
+        'PREÇO APP': 'preco_app', 'TIPO DE REGRA': 'tipo_regra'
+    },
+    "colunas_numericas": ['preco_normal', 'preco_desconto', 'preco_desconto_cliente', 'preco_app'],
+    "colunas_preco": ['preco_normal', 'preco_desconto', 'preco_desconto_cliente', 'preco_app'],
+    "colunas_numericas_banco": ['preco_normal', 'preco_desconto', 'preco_desconto_cliente', 'preco_app'],
+    "parametros": db_tabloide_produtos.PRODUTO_PARAMS,
+    "db": db_tabloide_produtos,
+}
+
+# Layouts pelo nome (processos do upload em lote recebem só o nome: o módulo db não é serializável)
+LAYOUTS = {layout["nome"]: layout for layout in (CAMPANHA, TABLOIDE)}
+
+
+def coluna_gtin(layout):
+    """Cabeçalho da planilha que contém o código de barras ('GTIN', 'CÓDIGO DE BARRAS')."""
+    return next(orig for orig, dest in layout["column_map"].items() if dest == 'codigo_barras')
+
+
+def normalizar_cabecalhos(colunas):
+    """Padroniza cabeçalhos: espaços repetidos, ' +' -> '+', trim e maiúsculas."""
+    return (
+        pd.Index(colunas).astype(str)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.replace(r'\s\+', '+', regex=True)
+        .str.strip()
+        .str.upper()
+    )
+
+
+def colunas_faltando(df, layout):
+    """Cabeçalhos esperados pelo layout que não estão na planilha."""
+    return [col for col in layout["column_map"] if col not in df.columns]
+
+
+def gtins_para_busca(df):
+    """GTINs limpos (sem espaços, sem padding) e únicos da coluna codigo_barras."""
+    limpos = df['codigo_barras'].astype('string').str.strip()
+    return limpos[limpos.notna() & (limpos != '')].unique().tolist()
+
+
+def preparar_registros(df, entidade_id, layout, ci_map):
+    """
+    Transforma a planilha (já com as colunas renomeadas pelo column_map) nos
+    registros prontos para o add_products_bulk, em operações por coluna:
+    limpeza e padding do GTIN, codigo_interno via Series.map, conversão
+    numérica e NaN -> None.
+    Retorna uma lista de dicts com os nomes de parâmetro do INSERT.
+    """
+    cb_raw = df['codigo_barras'].astype('string')
+    cb_limpo = cb_raw.str.strip()
+    cb_limpo = cb_limpo.mask(cb_limpo == '')
+
+    colunas = {
+        'codigo_barras': cb_raw,
+        'codigo_barras_normalizado': cb_limpo.str.zfill(14),  # <-- mesmo que pad_barcode
+        'codigo_interno': cb_limpo.map(ci_map),              # <-- GTIN LIMPO como chave (clean_barcode)
+    }
+    for col in layout["column_map"].values():
+        if col == 'codigo_barras':
+            continue
+        serie = df[col]
+        if col in layout["colunas_numericas"]:
+            serie = pd.to_numeric(serie, errors='coerce')
+        colunas[col] = serie
+
+    out = pd.DataFrame(colunas, index=df.index)
+    out = out.astype(object).where(out.notna(), None)
+    out.insert(0, '_entidade_id', entidade_id)
+
+    parametros = layout["parametros"]
+    out.columns = [parametros['entidade_id'] if c == '_entidade_id' else parametros[c] for c in out.columns]
+    # to_dict converte os escalares numpy para tipos nativos do Python (aceitos pelo PyMySQL)
+    return out.to_dict('records')
+
+
+def _gtin_para_texto(valor):
+    """Célula numérica de GTIN -> texto, como o read_excel(dtype=str) fazia (7.89e12 -> '789...')."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return valor if isinstance(valor, str) else str(valor)
+
+
+# --- DETECÇÃO DO FORMATO ---
+# Assinaturas (magic bytes) dos formatos binários aceitos
+_ASSINATURAS = [
+    (b'PK\x03\x04', 'xlsx'),                         # ZIP (Office Open XML)
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'xls'),       # OLE2 (Excel 97-2003)
+    (b'PAR1', 'parquet'),
+]
+_FORMATOS_POR_EXTENSAO = {'.xlsx': 'xlsx', '.xls': 'xls', '.csv': 'csv', '.parquet': 'parquet'}
+
+
+def _ler_inicio(file, tamanho):
+    """Primeiros bytes do arquivo (FileStorage ou caminho), voltando o stream ao início."""
+    if isinstance(file, str):
+        with open(file, 'rb') as arquivo:
+            return arquivo.read(tamanho)
+    inicio = file.read(tamanho)
+    file.seek(0)
+    return inicio
+
+
+def _fonte(file):
+    """Caminho ou stream binário do arquivo (o pandas não reconhece o FileStorage como binário)."""
+    return file if isinstance(file, str) else getattr(file, 'stream', file)
+
+
+def detectar_formato(file):
+    """
+    'xlsx', 'xls', 'parquet' ou 'csv'. Os magic bytes têm prioridade sobre a
+    extensão (ex.: um .xlsx que na verdade é CSV exportado com o nome errado).
+    """
+    inicio = _ler_inicio(file, 8)
+    for assinatura, formato in _ASSINATURAS:
+        if inicio.startswith(assinatura):
+            return formato
+    nome = file if isinstance(file, str) else (getattr(file, 'filename', '') or '')
+    formato = _FORMATOS_POR_EXTENSAO.get(os.path.splitext(nome)[1].lower())
+    # Arquivo de texto sem assinatura binária: só pode ser CSV
+    return 'csv' if formato in (None, 'csv', 'xlsx', 'xls') else formato
+
+
+def _encoding_csv(amostra):
+    """UTF-8 (com ou sem BOM) se a amostra decodificar; senão o padrão do Excel no Windows."""
+    try:
+        # Ignora até 3 bytes finais: a amostra pode cortar um caractere multibyte
+        amostra[:-3 if len(amostra) > 3 else None].decode('utf-8')
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+
+class LeitorPlanilha:
+    """
+    Lê SÓ a aba e as colunas do layout, em lotes de DataFrame de até
+    tamanho_lote linhas; o pico de memória depende do tamanho do lote, não do
+    arquivo. O formato é detectado pelos magic bytes/extensão:
+    - xlsx: openpyxl em modo read_only (linhas lidas do XML sob demanda; outras
+      abas nem são carregadas);
+    - csv: pd.read_csv (engine C) em chunks, com separador (; , ou tab),
+      encoding e decimal (vírgula quando o separador é ;) detectados;
+    - parquet: pyarrow, em record batches só com as colunas do layout
+      (pacote opcional; sem ele o upload falha com mensagem clara);
+    - xls (formato antigo): pd.read_excel completo.
+    """
+
+    def __init__(self, file, layout, tamanho_lote=None, aba=None):
+        # file: FileStorage do Flask ou caminho do arquivo em disco (jobs)
+        # aba: lê outra aba no lugar da do layout (upload em lote, uma aba por tabloide)
+        self.layout = layout
+        self.aba = aba if aba is not None else layout["aba"]
+        self.tamanho_lote = tamanho_lote or TAMANHO_LOTE
+        self._wb = None
+        self._parquet = None
+        self._csv = None
+        self.colunas_faltando = []
+        self.formato = detectar_formato(file)
+
+        abrir = {
+            'xlsx': self._abrir_xlsx, 'xls': self._abrir_xls,
+            'csv': self._abrir_csv, 'parquet': self._abrir_parquet,
+        }[self.formato]
+        abrir(file)
+
+    def _mapear_cabecalhos(self, cabecalhos):
+        """
+        Normaliza os cabeçalhos do arquivo e guarda {cabeçalho original: coluna
+        da tabela} para as colunas do layout; preenche colunas_faltando.
+        """
+        normalizados = list(normalizar_cabecalhos(cabecalhos))
+        column_map = self.layout["column_map"]
+        self.colunas_faltando = [col for col in column_map if col not in normalizados]
+        self._renomear = {
+            original: column_map[norm]
+            for original, norm in zip(cabecalhos, normalizados) if norm in column_map
+        }
+
+    def _finalizar_lote(self, df):
+        """Renomeia para as colunas da tabela, descarta linhas vazias e põe o GTIN como texto."""
+        df = df.rename(columns=self._renomear).dropna(how='all')
+        df['codigo_barras'] = df['codigo_barras'].map(_gtin_para_texto).astype(object)
+        return df.reset_index(drop=True)
+
+    # --- xlsx ---
+    def _abrir_xlsx(self, file):
+        self._wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        aba = self.aba
+        if aba is not None and aba not in self._wb.sheetnames:
+            self.close()
+            raise ValueError(f'Aba "{aba}" não encontrada na planilha.')
+        self._ws = self._wb[aba] if aba is not None else self._wb.worksheets[0]
+        self._ws.reset_dimensions()  # Não confia na dimensão gravada pelo Excel
+        self._linhas = self._ws.iter_rows(values_only=True)
+
+        cabecalho = next(self._linhas, None) or ()
+        cabecalhos = list(normalizar_cabecalhos([c if c is not None else '' for c in cabecalho]))
+        self.colunas_faltando = [col for col in self.layout["column_map"] if col not in cabecalhos]
+        # Índice de cada coluna do layout na linha da planilha
+        self._indices = {
+            destino: cabecalhos.index(origem)
+            for origem, destino in self.layout["column_map"].items() if origem in cabecalhos
+        }
+        self._gerar = self._lotes_xlsx
+
+    def _lotes_xlsx(self):
+        colunas = list(self._indices.keys())
+        indices = list(self._indices.values())
+        i_gtin = colunas.index('codigo_barras')
+        lote = []
+        for linha in self._linhas:
+            valores = [linha[i] if i < len(linha) else None for i in indices]
+            if all(v is None for v in valores):
+                continue  # Linha vazia (formatação sem dados)
+            valores[i_gtin] = _gtin_para_texto(valores[i_gtin])
+            lote.append(valores)
+            if len(lote) >= self.tamanho_lote:
+                yield pd.DataFrame(lote, columns=colunas)
+                lote = []
+        if lote:
+            yield pd.DataFrame(lote, columns=colunas)
+
+    # --- xls ---
+    def _abrir_xls(self, file):
+        self._df_xls = ler_planilha(file, self.layout, self.aba)
+        self.colunas_faltando = colunas_faltando(self._df_xls, self.layout)
+        self._gerar = self._lotes_xls
+
+    def _lotes_xls(self):
+        df = self._df_xls.rename(columns=self.layout["column_map"])
+        for inicio in range(0, len(df), self.tamanho_lote):
+            yield df.iloc[inicio:inicio + self.tamanho_lote]
+
+    # --- csv ---
+    def _abrir_csv(self, file):
+        amostra = _ler_inicio(file, 64 * 1024)
+        encoding = _encoding_csv(amostra)
+        primeira_linha = amostra.decode(encoding, errors='replace').lstrip('\ufeff').split('\n', 1)[0]
+        sep = max([';', ',', '\t'], key=primeira_linha.count)
+
+        opcoes = {
+            "sep": sep,
+            "decimal": ',' if sep == ';' else '.',
+            "encoding": encoding,
+            "encoding_errors": 'replace',
+        }
+        fonte = _fonte(file)
+        cabecalhos = list(pd.read_csv(fonte, nrows=0, **opcoes).columns)
+        if not isinstance(fonte, str):
+            fonte.seek(0)
+        self._mapear_cabecalhos(cabecalhos)
+
+        gtin_original = next((o for o, d in self._renomear.items() if d == 'codigo_barras'), None)
+        self._csv = pd.read_csv(
+            fonte, usecols=list(self._renomear), chunksize=self.tamanho_lote,
+            dtype={gtin_original: str} if gtin_original else None, **opcoes
+        )
+        self._gerar = self._lotes_csv
+
+    def _lotes_csv(self):
+        for chunk in self._csv:
+            df = self._finalizar_lote(chunk)
+            if len(df):
+                yield df
+
+    # --- parquet ---
+    def _abrir_parquet(self, file):
+        if pq is None:
+            raise ValueError('Leitura de Parquet requer o pacote pyarrow (pip install pyarrow).')
+        self._parquet = pq.ParquetFile(_fonte(file))
+        self._mapear_cabecalhos(self._parquet.schema_arrow.names)
+        self._gerar = self._lotes_parquet
+
+    def _lotes_parquet(self):
+        for batch in self._parquet.iter_batches(batch_size=self.tamanho_lote, columns=list(self._renomear)):
+            df = self._finalizar_lote(batch.to_pandas())
+            if len(df):
+                yield df
+
+    def lotes(self):
+        """Gera DataFrames (colunas já renomeadas para as da tabela) de até tamanho_lote linhas."""
+        yield from self._gerar()
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.close()
+            self._wb = None
+        if self._csv is not None:
+            self._csv.close()
+            self._csv = None
+        if self._parquet is not None:
+            if hasattr(self._parquet, 'close'):
+                self._parquet.close()
+            self._parquet = None
+
+
+def novo_relatorio():
+    return {
+        "linhas": 0, "inseridos": 0, "atualizados": 0, "removidos": 0, "inalterados": 0,
+        "avisos": [], "erro": None, "do_cache": False
+    }
+
+
+def importar_produtos(leitor, entidade_id, layout, progresso=None, relatorio=None, inserir=None, resolver=None):
+    """
+    Para cada lote da planilha: busca os códigos internos, prepara os
+    registros e insere. Retorna o relatório
+    {"linhas", "inseridos", "atualizados", "removidos", "inalterados", "avisos": [...], "erro"}.
+    progresso(fase, relatorio), se informado, é chamado após cada lote.
+    inserir(registros) -> (rowcount, erro) troca o destino dos lotes
+    (padrão: add_products_bulk direto na tabela real).
+    resolver(gtins) -> (ci_map, erro) troca a busca dos códigos internos
+    (padrão: db_common.get_codigo_interno_map_from_gtins).
+    """
+    relatorio = relatorio if relatorio is not None else novo_relatorio()
+    inserir = inserir or layout["db"].add_products_bulk
+    resolver = resolver or db_common.get_codigo_interno_map_from_gtins
+    try:
+        for lote in leitor.lotes():
+            relatorio["linhas"] += len(lote)
+
+            ci_map = {}
+            gtins = gtins_para_busca(lote)
+            if gtins:
+                ci_map, err = resolver(gtins)
+                if err:
+                    aviso = f'Erro ao buscar códigos internos: {err}'
+                    if aviso not in relatorio["avisos"]:
+                        relatorio["avisos"].append(aviso)
+                    ci_map = {}
+
+            registros = preparar_registros(lote, entidade_id, layout, ci_map)
+            rowcount, error = inserir(registros)
+            if error:
+                relatorio["erro"] = error
+                break
+            relatorio["inseridos"] += rowcount
+            if progresso:
+                progresso('inserindo', relatorio)
+    finally:
+        leitor.close()
+    return relatorio
+
+
+def _valor_para_hash(valor, numerico):
+    """
+    Representação estável de um valor para o hash da linha: nas colunas
+    numéricas, números (e textos numéricos) com 2 casas, para que 1.5 da
+    planilha e Decimal('1.50') do banco sejam iguais; nas demais, o texto
+    como está ("0789" != "789"). None vira vazio.
+    """
+    if valor is None:
+        return ''
+    if numerico and isinstance(valor, (int, float, Decimal, str)) and not isinstance(valor, bool):
+        try:
+            numero = Decimal(str(valor).strip())
+            if numero.is_finite():
+                return format(numero.quantize(Decimal('0.01')), 'f')
+        except (InvalidOperation, ValueError):
+            pass
+    return str(valor)
+
+
+def hash_linha(valores, numericas):
+    """
+    Hash das colunas de uma linha de produto (exceto a chave), para o upload
+    por diferença. numericas: para cada valor, se a coluna é numérica.
+    """
+    texto = "\x1f".join(_valor_para_hash(v, n) for v, n in zip(valores, numericas))
+    return hashlib.md5(texto.encode('utf-8')).hexdigest()
+
+
+def _colunas_hash(layout):
+    return [c for c in layout["db"].PRODUTO_COLUNAS if c != 'codigo_barras_normalizado']
+
+
+def _numericas_hash(layout):
+    """Para cada coluna de _colunas_hash, se é comparada como número."""
+    numericas = set(layout["colunas_numericas_banco"])
+    return [c in numericas for c in _colunas_hash(layout)]
+
+
+# Resultado de _aplicar_diferencas
+_DIFF_APLICADO = 'aplicado'
+_DIFF_ERRO = 'erro'                      # Detalhe em relatorio["erro"]
+_DIFF_CHAVES_REPETIDAS = 'chaves_repetidas'
+
+
+class _HashesCarga:
+    """Acumula, lote a lote, o hash de cada codigo_barras_normalizado da planilha."""
+
+    def __init__(self, layout):
+        parametros = layout["parametros"]
+        self._params = [parametros[c] for c in _colunas_hash(layout)]
+        self._numericas = _numericas_hash(layout)
+        self._cbn = parametros['codigo_barras_normalizado']
+        self.hashes = {}
+        self.chaves_invalidas = 0  # GTIN vazio ou repetido na planilha
+
+    def adicionar(self, registros):
+        for registro in registros:
+            cbn = registro[self._cbn]
+            if cbn is None or cbn in self.hashes:
+                self.chaves_invalidas += 1
+                continue
+            self.hashes[cbn] = hash_linha((registro[p] for p in self._params), self._numericas)
+
+
+def _aplicar_diferencas(db, carga_id, entidade_id, layout, hashes, relatorio):
+    """
+    Compara a carga com os produtos atuais (pelo codigo_barras_normalizado e
+    hash das demais colunas) e aplica só INSERT/UPDATE/DELETE necessários.
+    Retorna _DIFF_APLICADO; _DIFF_ERRO (ao ler ou gravar; detalhe em
+    relatorio["erro"]); ou _DIFF_CHAVES_REPETIDAS, sem alterar nada, se não
+    for possível comparar (codigo_barras_normalizado repetido no banco).
+    """
+    atuais, erro = db.get_products_for_diff(entidade_id)
+    if erro:
+        relatorio["erro"] = f'Erro ao ler os produtos atuais: {erro}'
+        return _DIFF_ERRO
+
+    colunas = _colunas_hash(layout)
+    numericas = _numericas_hash(layout)
+    atuais_por_cbn = {}
+    remover_ids = []
+    for linha in atuais:
+        cbn = linha['codigo_barras_normalizado']
+        if cbn is None:
+            remover_ids.append(linha['id'])
+        elif cbn in atuais_por_cbn:
+            return _DIFF_CHAVES_REPETIDAS
+        else:
+            atuais_por_cbn[cbn] = linha
+
+    atualizar_ids = []
+    inalterados = 0
+    for cbn, linha in atuais_por_cbn.items():
+        novo_hash = hashes.get(cbn)
+        if novo_hash is None:
+            remover_ids.append(linha['id'])
+        elif novo_hash == hash_linha((linha[c] for c in colunas), numericas):
+            inalterados += 1
+        else:
+            atualizar_ids.append(linha['id'])
+    inserir_cbn = [cbn for cbn in hashes if cbn not in atuais_por_cbn]
+
+    (inseridos, atualizados, removidos), erro = db.apply_staging_diff(
+        carga_id, entidade_id, inserir_cbn, atualizar_ids, remover_ids
+    )
+    if erro:
+        relatorio["erro"] = f'Erro ao aplicar as diferenças: {erro}'
+        return _DIFF_ERRO
+    relatorio.update(inseridos=inseridos, atualizados=atualizados, removidos=removidos, inalterados=inalterados)
+    return _DIFF_APLICADO
+
+
+def abrir_leitor(file, layout, chave=None):
+    """
+    Leitor dos lotes do arquivo: do cache de uploads se o mesmo conteúdo já
+    foi lido antes; senão o LeitorPlanilha (gravando no cache durante a leitura).
+    chave: chave do cache já conhecida (token da pré-visualização); com ela
+    o file pode ser None.
+    Retorna (leitor, resolver_de_codigos_internos ou None, erro). Se faltarem
+    colunas, o leitor volta já fechado com leitor.colunas_faltando preenchido.
+    """
+    if chave is None and cache_uploads.ATIVO and file is not None:
+        chave = cache_uploads.chave_arquivo(file, layout)
+    leitor = cache_uploads.abrir_leitor(chave) if chave else None
+    if leitor is None:
+        if file is None:
+            return None, None, 'A pré-visualização expirou. Envie o arquivo novamente.'
+        try:
+            leitor = LeitorPlanilha(file, layout)
+        except Exception as e:
+            return None, None, f'Erro ao ler a planilha: {e}'
+
+        if leitor.colunas_faltando:
+            leitor.close()
+            return leitor, None, None
+        if chave:
+            leitor = cache_uploads.LeitorComCache(leitor, chave)
+
+    return leitor, (cache_uploads.ResolvedorCatalogo(chave) if chave else None), None
+
+
+def mensagem_colunas_faltando(colunas):
+    return f'A planilha não contém todas as colunas esperadas. Faltando: {", ".join(colunas)}'
+
+
+def substituir_produtos(file, entidade_id, layout, progresso=None, modo=MODO_SUBSTITUIR, chave=None):
+    """
+    Fluxo completo do upload: abre a planilha e valida as colunas, carrega
+    os lotes na staging e só então altera os produtos da campanha/tabloide
+    numa única transação. Durante a leitura a tabela real continua intacta;
+    se algo falhar, nada é alterado.
+    modo=MODO_SUBSTITUIR troca a lista inteira (replace_products_from_staging);
+    modo=MODO_DIFERENCAS aplica só as linhas novas, alteradas e removidas,
+    comparando pelo codigo_barras_normalizado (volta a substituir tudo se a
+    planilha tiver GTIN vazio ou repetido).
+    chave: token da pré-visualização (ver abrir_leitor), no lugar do file.
+    Retorna o relatório de importar_produtos ("inseridos"/"atualizados"/
+    "removidos" = efeito na tabela real); "erro" vem preenchido se algum passo falhar.
+    """
+    relatorio = novo_relatorio()
+    avisar = progresso or (lambda fase, rel: None)
+
+    avisar('lendo', relatorio)
+    leitor, resolver, erro = abrir_leitor(file, layout, chave)
+    if erro:
+        relatorio["erro"] = erro
+        return relatorio
+    if leitor.colunas_faltando:
+        relatorio["erro"] = mensagem_colunas_faltando(leitor.colunas_faltando)
+        return relatorio
+    relatorio["do_cache"] = leitor.formato == 'cache'
+    return carregar_leitor(leitor, entidade_id, layout, progresso, modo, resolver, relatorio)
+
+
+def carregar_leitor(leitor, entidade_id, layout, progresso=None, modo=MODO_SUBSTITUIR, resolver=None, relatorio=None):
+    """
+    Segunda metade do substituir_produtos, para um leitor já aberto e com as
+    colunas validadas: carrega os lotes na staging e troca/atualiza os
+    produtos da entidade. Retorna o relatório (ver substituir_produtos).
+    """
+    relatorio = relatorio if relatorio is not None else novo_relatorio()
+    avisar = progresso or (lambda fase, rel: None)
+    db = layout["db"]
+    carga_id = uuid.uuid4().hex
+    hashes = _HashesCarga(layout) if modo == MODO_DIFERENCAS else None
+
+    def inserir(registros):
+        if hashes is not None:
+            hashes.adicionar(registros)
+        return db.add_products_staging(carga_id, registros)
+
+    try:
+        avisar('inserindo', relatorio)
+        importar_produtos(leitor, entidade_id, layout, progresso, relatorio, inserir=inserir, resolver=resolver)
+        if hasattr(resolver, 'salvar'):
+            resolver.salvar()
+        if relatorio["erro"]:
+            relatorio["erro"] = f'Erro ao salvar novos produtos: {relatorio["erro"]}'
+            relatorio["inseridos"] = 0
+            return relatorio
+
+        avisar('substituindo', relatorio)
+        relatorio["inseridos"] = 0
+        if hashes is not None:
+            if hashes.chaves_invalidas:
+                relatorio["avisos"].append(
+                    f'{hashes.chaves_invalidas} linha(s) com GTIN vazio ou repetido: '
+                    'a lista foi substituída por inteiro em vez de atualizar só as diferenças.'
+                )
+            elif _aplicar_diferencas(db, carga_id, entidade_id, layout, hashes.hashes, relatorio) != _DIFF_CHAVES_REPETIDAS:
+                # Aplicado, ou falhou (com relatorio["erro"]): em nenhum caso substitui a lista
+                return relatorio
+            else:
+                relatorio["avisos"].append(
+                    'Há GTINs repetidos nos produtos atuais: a lista foi substituída por inteiro.'
+                )
+
+        (removidos, inseridos), erro = db.replace_products_from_staging(carga_id, entidade_id)
+        if erro:
+            relatorio["erro"] = f'Erro ao substituir os produtos: {erro}'
+            return relatorio
+        relatorio["removidos"] = removidos
+        relatorio["inseridos"] = inseridos
+        return relatorio
+    finally:
+        # Após a troca a carga já saiu da staging; aqui limpa falhas e sobras antigas
+        db.discard_staging(carga_id)
+
+
+def ler_planilha(file, layout, aba=None):
+    """Lê a planilha inteira num DataFrame com cabeçalhos normalizados (GTIN como texto)."""
+    aba = aba if aba is not None else layout["aba"]
+    aba = aba if aba is not None else 0
+    df = pd.read_excel(file, sheet_name=aba, dtype={coluna_gtin(layout): str})
+    df.columns = normalizar_cabecalhos(df.columns)
+    return df
+
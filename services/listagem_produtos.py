@@ -0,0 +1,175 @@
+# services/listagem_produtos.py
+
+import base64
+import hashlib
+import json
+from decimal import Decimal
+from urllib.parse import parse_qsl
+import config
+
+######################################
+#   LISTAGEM PAGINADA DE PRODUTOS
+######################################
+# As páginas de produtos de campanha/tabloide mostram uma página por vez, com
+# filtros e ordenação feitos no banco e paginação por chave (keyset, ver
+# common_db.consultar_pagina): "Próximos" leva o cursor da última linha
+# (?apos=), "Anteriores" o da primeira (?antes=). Sem OFFSET, qualquer página
+# custa o mesmo que a primeira e nada é pulado quando produtos são removidos.
+# Os formulários da página mandam a query string atual no campo oculto
+# "retorno": as ações (salvar, deletar, adicionar) voltam para a mesma página,
+# e "deletar todos do filtro" usa os mesmos filtros.
+# No modo "tabela completa" (?modo=virtual) a página vem sem linhas: o
+# navegador busca a lista inteira (mesmos filtros/ordem) em JSON colunar
+# (ver colunar) e desenha só as linhas visíveis (productTableUtils.js).
+
+_cfg = getattr(config, 'LISTAGEM_CONFIG', {})
+POR_PAGINA = _cfg.get('por_pagina', 100)
+OPCOES_POR_PAGINA = sorted(set(_cfg.get('opcoes_por_pagina', [50, 100, 200, 500])) | {POR_PAGINA})
+
+FILTROS_TEXTO = ('gtin', 'descricao', 'laboratorio')
+
+# Ordenação (chave de ORDENACOES nos módulos do banco) -> rótulo na página
+ROTULOS_ORDEM = {
+    "id": "Ordem de cadastro",
+    "gtin": "Cód. Barras",
+    "descricao": "Descrição",
+    "laboratorio": "Laboratório",
+    "preco_normal": "Preço Normal",
+}
+
+
+def codificar_cursor(valor, id_produto):
+    """Cursor opaco para a URL com (valor da ordenação, id) de uma linha."""
+    if isinstance(valor, Decimal):
+        valor = float(valor)
+    elif valor is not None and not isinstance(valor, (int, float, str)):
+        valor = str(valor)
+    texto = json.dumps([valor, id_produto], separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(texto):
+    """(valor, id) do cursor, ou None se ausente ou inválido."""
+    if not texto:
+        return None
+    try:
+        valor, id_produto = json.loads(base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4)))
+        return valor, int(id_produto)
+    except (ValueError, TypeError):
+        return None
+
+
+def ler_parametros(args, ordenacoes):
+    """
+    Filtros, ordenação, cursor e tamanho da página a partir da query string
+    (args: request.args ou dict). Valores desconhecidos viram o padrão.
+    """
+    filtros = {campo: (args.get(campo) or '').strip() for campo in FILTROS_TEXTO}
+    filtros = {campo: valor for campo, valor in filtros.items() if valor}
+    if args.get('sem_ci') == '1':
+        filtros['sem_ci'] = True
+
+    try:
+        por_pagina = int(args.get('por_pagina') or POR_PAGINA)
+    except ValueError:
+        por_pagina = POR_PAGINA
+    if por_pagina not in OPCOES_POR_PAGINA:
+        por_pagina = POR_PAGINA
+
+    antes = decodificar_cursor(args.get('antes'))
+    return {
+        "filtros": filtros,
+        "ordem": args.get('ordem') if args.get('ordem') in ordenacoes else 'id',
+        "decrescente": args.get('direcao') == 'desc',
+        "por_pagina": por_pagina,
+        "cursor": antes or decodificar_cursor(args.get('apos')),
+        "anterior": antes is not None,
+        "virtual": args.get('modo') == 'virtual',
+    }
+
+
+def args_listagem(parametros):
+    """Args de URL (sem o cursor) que reproduzem filtros, ordem e tamanho da página."""
+    args = {campo: valor for campo, valor in parametros["filtros"].items() if campo != 'sem_ci'}
+    if parametros["filtros"].get('sem_ci'):
+        args['sem_ci'] = '1'
+    if parametros["ordem"] != 'id':
+        args['ordem'] = parametros["ordem"]
+    if parametros["decrescente"]:
+        args['direcao'] = 'desc'
+    if parametros["por_pagina"] != POR_PAGINA:
+        args['por_pagina'] = parametros["por_pagina"]
+    if parametros["virtual"]:
+        args['modo'] = 'virtual'
+    return args
+
+
+def args_retorno(retorno, ordenacoes):
+    """Args da página de onde veio uma ação (campo oculto retorno), incluindo o cursor."""
+    args = dict(parse_qsl(retorno or ''))
+    resultado = args_listagem(ler_parametros(args, ordenacoes))
+    for chave in ('apos', 'antes'):
+        if decodificar_cursor(args.get(chave)):
+            resultado[chave] = args[chave]
+    return resultado
+
+
+def filtros_retorno(retorno, ordenacoes):
+    """Filtros da página de onde veio uma ação (para 'todos do filtro')."""
+    return ler_parametros(dict(parse_qsl(retorno or '')), ordenacoes)["filtros"]
+
+
+def montar_pagina(linhas, tem_mais, parametros, total, url, ordenacoes, url_dados=None):
+    """
+    Dados da paginação para o template. url(**args) monta o link da listagem
+    (ex.: url_for da rota com o id da entidade); url_dados(**args), o do JSON
+    da tabela completa.
+    """
+    args = args_listagem(parametros)
+    args_modo = {chave: valor for chave, valor in args.items() if chave != 'modo'}
+    if not parametros["virtual"]:
+        args_modo['modo'] = 'virtual'
+    tem_anterior, tem_proxima = (tem_mais, True) if parametros["anterior"] else (parametros["cursor"] is not None, tem_mais)
+    url_anterior = url_proxima = None
+    if linhas and tem_anterior:
+        url_anterior = url(antes=codificar_cursor(linhas[0]["_ordem"], linhas[0]["id"]), **args)
+    if linhas and tem_proxima:
+        url_proxima = url(apos=codificar_cursor(linhas[-1]["_ordem"], linhas[-1]["id"]), **args)
+    return {
+        "filtros": parametros["filtros"],
+        "ordem": parametros["ordem"],
+        "decrescente": parametros["decrescente"],
+        "por_pagina": parametros["por_pagina"],
+        "opcoes_por_pagina": OPCOES_POR_PAGINA,
+        "ordenacoes": [(chave, ROTULOS_ORDEM.get(chave, chave)) for chave in ordenacoes],
+        "total": total,
+        "url_primeira": url(**args) if tem_anterior else None,
+        "url_anterior": url_anterior,
+        "url_proxima": url_proxima,
+        "url_limpar": url(modo='virtual') if parametros["virtual"] else url(),
+        "virtual": parametros["virtual"],
+        "url_modo": url(**args_modo),
+        "url_dados": url_dados(**args) if parametros["virtual"] and url_dados else None,
+    }
+
+
+def colunar(linhas, colunas):
+    """
+    Linhas (tuplas na ordem de colunas) no formato da tabela completa:
+    {"colunas": [...], "total": n, "valores": [[coluna 1], [coluna 2], ...]}.
+    Uma lista por coluna deixa o JSON bem menor que uma lista de objetos
+    (os nomes não se repetem a cada linha).
+    """
+    valores = [[] for _ in colunas]
+    total = 0
+    for linha in linhas:
+        for lista, valor in zip(valores, linha):
+            lista.append(float(valor) if isinstance(valor, Decimal) else valor)
+        total += 1
+    return {"colunas": list(colunas), "total": total, "valores": valores}
+
+
+def etag_dados(*partes):
+    """ETag do JSON da tabela completa (entidade, versão dos produtos, filtros, ordem...)."""
+    texto = json.dumps(partes, default=str, sort_keys=True)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
@@ -0,0 +1,144 @@
+# services/preview_uploads.py
+
+import re
+from collections import Counter
+import pandas as pd
+import services.ingestao_produtos as ingestao
+
+######################################
+#   PRÉ-VISUALIZAÇÃO DO UPLOAD (DRY-RUN)
+######################################
+# Roda leitura -> normalização -> resolução no catálogo, lote a lote e por
+# coluna, sem gravar nada no banco. A leitura fica no cache de uploads
+# (services/cache_uploads.py): o token devolvido é a chave desse cache, e o
+# upload confirmado com o token reaproveita os lotes e os códigos internos
+# já resolvidos em vez de ler a planilha de novo.
+
+MAX_EXEMPLOS = 20
+# GTIN-8, UPC-A (12), EAN-13 e GTIN-14
+_PADRAO_GTIN = r'\d{8}|\d{12,14}'
+_PADRAO_TOKEN = re.compile(r'[0-9a-f]{64}')
+# Marcadores usados na planilha para "sem preço"
+_SEM_PRECO = {'', '-'}
+
+
+def token_valido(token):
+    """O token é a chave sha256 do cache; qualquer outra coisa é recusada (vira caminho de pasta)."""
+    return bool(token) and bool(_PADRAO_TOKEN.fullmatch(token))
+
+
+def _exemplos(lista, novos):
+    faltam = MAX_EXEMPLOS - len(lista)
+    if faltam > 0:
+        lista.extend(novos[:faltam])
+
+
+def _para_numero(bruto):
+    """Preço como número; textos no formato brasileiro ("R$ 1.234,56") também são aceitos."""
+    texto = bruto.astype('string').str.replace(r'[R$\s]', '', regex=True)
+    decimal_virgula = texto.str.contains(',', regex=False).fillna(False)
+    texto = texto.where(~decimal_virgula, texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def _analisar_precos(lote, layout, anomalias):
+    colunas = [c for c in layout["colunas_preco"] if c in lote.columns]
+    numericos = {}
+    for col in colunas:
+        bruto = lote[col]
+        texto = bruto.astype('string').str.strip()
+        preenchido = bruto.notna() & ~texto.isin(_SEM_PRECO)
+        valor = _para_numero(bruto)
+        numericos[col] = valor
+
+        for tipo, mascara in (
+            ("nao_numerico", preenchido & valor.isna()),
+            ("zero_ou_negativo", valor <= 0),
+        ):
+            if mascara.any():
+                item = anomalias.setdefault(f"{col}:{tipo}", {"coluna": col, "tipo": tipo, "linhas": 0, "exemplos": []})
+                item["linhas"] += int(mascara.sum())
+                _exemplos(item["exemplos"], lote.loc[mascara, 'codigo_barras'].fillna('').tolist())
+
+    normal = numericos.get('preco_normal')
+    if normal is None:
+        return
+    for col in ('preco_desconto', 'preco_desconto_cliente', 'preco_app'):
+        if col not in numericos:
+            continue
+        mascara = numericos[col] > normal
+        if mascara.any():
+            item = anomalias.setdefault(f"{col}:maior_que_normal", {
+                "coluna": col, "tipo": "maior_que_preco_normal", "linhas": 0, "exemplos": []
+            })
+            item["linhas"] += int(mascara.sum())
+            _exemplos(item["exemplos"], lote.loc[mascara, 'codigo_barras'].fillna('').tolist())
+
+
+def analisar_planilha(file, layout):
+    """
+    Pré-visualização do upload. Retorna (resumo, erro); o resumo traz:
+    token, linhas, colunas_faltando, gtins_vazios, gtins_invalidos,
+    gtins_duplicados, sem_codigo_interno e anomalias_preco (contagens e
+    até MAX_EXEMPLOS GTINs de exemplo em cada).
+    """
+    leitor, resolver, erro = ingestao.abrir_leitor(file, layout)
+    if erro:
+        return None, erro
+
+    resumo = {
+        "token": getattr(leitor, 'chave', None),
+        "formato": leitor.formato,
+        "linhas": 0,
+        "colunas_faltando": leitor.colunas_faltando,
+        "gtins_vazios": 0,
+        "gtins_invalidos": {"linhas": 0, "exemplos": []},
+        "gtins_duplicados": {"gtins": 0, "linhas_extras": 0, "exemplos": []},
+        "sem_codigo_interno": {"gtins": 0, "exemplos": []},
+        "anomalias_preco": [],
+        "avisos": [],
+    }
+    if leitor.colunas_faltando:
+        resumo["token"] = None
+        return resumo, None
+
+    resolver = resolver or ingestao.db_common.get_codigo_interno_map_from_gtins
+    contagem_cbn = Counter()
+    anomalias = {}
+    try:
+        for lote in leitor.lotes():
+            resumo["linhas"] += len(lote)
+            limpo = lote['codigo_barras'].astype('string').str.strip()
+            vazio = limpo.isna() | (limpo == '')
+            resumo["gtins_vazios"] += int(vazio.sum())
+
+            invalido = ~vazio & ~limpo.fillna('').str.fullmatch(_PADRAO_GTIN)
+            resumo["gtins_invalidos"]["linhas"] += int(invalido.sum())
+            _exemplos(resumo["gtins_invalidos"]["exemplos"], limpo[invalido].tolist())
+
+            contagem_cbn.update(limpo[~vazio].str.zfill(14).tolist())
+
+            gtins = ingestao.gtins_para_busca(lote)
+            if gtins:
+                ci_map, err = resolver(gtins)
+                if err:
+                    aviso = f'Erro ao buscar códigos internos: {err}'
+                    if aviso not in resumo["avisos"]:
+                        resumo["avisos"].append(aviso)
+                else:
+                    sem_ci = [g for g in gtins if g not in ci_map]
+                    resumo["sem_codigo_interno"]["gtins"] += len(sem_ci)
+                    _exemplos(resumo["sem_codigo_interno"]["exemplos"], sem_ci)
+
+            _analisar_precos(lote, layout, anomalias)
+    finally:
+        leitor.close()
+    if hasattr(resolver, 'salvar'):
+        resolver.salvar()
+
+    duplicados = {cbn: n for cbn, n in contagem_cbn.items() if n > 1}
+    resumo["gtins_duplicados"]["gtins"] = len(duplicados)
+    resumo["gtins_duplicados"]["linhas_extras"] = sum(n - 1 for n in duplicados.values())
+    resumo["gtins_duplicados"]["exemplos"] = sorted(duplicados)[:MAX_EXEMPLOS]
+    resumo["anomalias_preco"] = list(anomalias.values())
+    return resumo, None
@@ -0,0 +1,243 @@
+# services/upload_jobs.py
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import config
+import services.ingestao_lote as ingestao_lote
+import services.ingestao_produtos as ingestao
+
+######################################
+#   JOBS DE UPLOAD EM SEGUNDO PLANO
+######################################
+# O upload (ler, buscar códigos internos, carregar e trocar os produtos) roda num
+# pool pequeno de threads próprio, fora das threads do Waitress. A requisição
+# só grava o arquivo em disco, enfileira o job e redireciona; a página acompanha
+# o progresso pelo GET /jobs/<id>.
+# O registro é em memória (um processo Waitress): jobs concluídos ficam
+# disponíveis por UPLOAD_CONFIG['jobs_retencao_segundos'] e somem num restart.
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_cfg = getattr(config, 'UPLOAD_CONFIG', {})
+JOBS_WORKERS = _cfg.get('jobs_workers', 2)          # Uploads processados ao mesmo tempo
+JOBS_MAX_FILA = _cfg.get('jobs_max_fila', 20)       # Jobs pendentes aceitos antes de recusar
+JOBS_RETENCAO_SEGUNDOS = _cfg.get('jobs_retencao_segundos', 3600)
+JOBS_DIR = _cfg.get('diretorio_temp') or os.path.join(_BASE_DIR, 'instance', 'uploads')
+
+# Fases, na ordem em que acontecem
+FASES = {
+    'na_fila': 'Aguardando na fila',
+    'lendo': 'Lendo a planilha',
+    'buscando_codigos': 'Buscando códigos internos',
+    'inserindo': 'Carregando produtos',
+    'substituindo': 'Substituindo a lista de produtos',
+    'concluido': 'Concluído',
+    'erro': 'Erro',
+}
+
+_executor = ThreadPoolExecutor(max_workers=JOBS_WORKERS, thread_name_prefix="upload-job")
+_jobs = {}
+_lock = threading.Lock()
+
+
+def _novo_job(layout, entidade_id, nome_arquivo, modo):
+    agora = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "tipo": layout["nome"],
+        "entidade_id": entidade_id,
+        "arquivo": nome_arquivo,
+        "modo": modo,
+        "fase": 'na_fila',
+        "fase_descricao": FASES['na_fila'],
+        "linhas": 0,
+        "inseridos": 0,
+        "atualizados": 0,
+        "removidos": 0,
+        "inalterados": 0,
+        "do_cache": False,
+        "itens": [],
+        "avisos": [],
+        "erro": None,
+        "concluido": False,
+        "criado_em": agora,
+        "atualizado_em": agora,
+    }
+
+
+def _atualizar(job_id, fase=None, **campos):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        if fase is not None:
+            job["fase"] = fase
+            job["fase_descricao"] = FASES[fase]
+        job.update(campos)
+        job["atualizado_em"] = time.time()
+
+
+def _limpar_antigos():
+    """Descarta do registro os jobs concluídos há mais de JOBS_RETENCAO_SEGUNDOS (chamar com _lock)."""
+    limite = time.time() - JOBS_RETENCAO_SEGUNDOS
+    for job_id in [j["id"] for j in _jobs.values() if j["concluido"] and j["atualizado_em"] < limite]:
+        del _jobs[job_id]
+
+
+def _pendentes():
+    return sum(1 for j in _jobs.values() if not j["concluido"])
+
+
+def _reservar(job):
+    """
+    Confere o limite da fila e registra o job sob o mesmo _lock (posts
+    simultâneos não passam de JOBS_MAX_FILA). Retorna o erro, ou None.
+    """
+    with _lock:
+        _limpar_antigos()
+        if _pendentes() >= JOBS_MAX_FILA:
+            return "Muitos uploads em processamento. Tente novamente em alguns minutos."
+        _jobs[job["id"]] = job
+    return None
+
+
+def _cancelar_reserva(job_id):
+    """Tira do registro o job que não chegou a ser enfileirado (ex.: erro ao gravar o arquivo)."""
+    with _lock:
+        _jobs.pop(job_id, None)
+
+
+def enviar_upload(app, layout, entidade_id, file, modo=ingestao.MODO_SUBSTITUIR, token=None):
+    """
+    Grava o arquivo enviado em disco e enfileira o processamento
+    (modo: ver ingestao.substituir_produtos).
+    token: chave da pré-visualização; com ela o file é None e o job lê os
+    lotes já processados do cache de uploads.
+    Retorna (job_id, erro).
+    """
+    job = _novo_job(layout, entidade_id, 'planilha pré-visualizada' if token else file.filename, modo)
+    erro = _reservar(job)
+    if erro:
+        return None, erro
+
+    if token:
+        _executor.submit(_executar, app, job["id"], None, layout, entidade_id, modo, token)
+        return job["id"], None
+
+    # O FileStorage é fechado no fim da requisição: o job lê do arquivo em disco
+    _, extensao = os.path.splitext(file.filename)
+    caminho = os.path.join(JOBS_DIR, f"{job['id']}{extensao.lower()}")
+    try:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        file.save(caminho)
+    except OSError as e:
+        _cancelar_reserva(job["id"])
+        return None, f"Erro ao gravar o arquivo para processamento: {e}"
+
+    _executor.submit(_executar, app, job["id"], caminho, layout, entidade_id, modo)
+    return job["id"], None
+
+
+def enviar_lote(app, layout, entidades, files, modo=ingestao.MODO_SUBSTITUIR):
+    """
+    Upload em lote (ver services/ingestao_lote.py): grava os arquivos em disco
+    e enfileira um job só para todos. entidades: {id: nome} das entidades que
+    podem receber produtos. Retorna (job_id, erro).
+    """
+    job = _novo_job(layout, None, ", ".join(f.filename for f in files), modo)
+    erro = _reservar(job)
+    if erro:
+        return None, erro
+
+    arquivos = []
+    try:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        for i, file in enumerate(files):
+            _, extensao = os.path.splitext(file.filename)
+            caminho = os.path.join(JOBS_DIR, f"{job['id']}-{i}{extensao.lower()}")
+            file.save(caminho)
+            arquivos.append((caminho, file.filename))
+    except OSError as e:
+        _remover_arquivos(arquivos)
+        _cancelar_reserva(job["id"])
+        return None, f"Erro ao gravar os arquivos para processamento: {e}"
+
+    _executor.submit(_executar_lote, app, job["id"], arquivos, layout, entidades, modo)
+    return job["id"], None
+
+
+def _remover_arquivos(arquivos):
+    for caminho, _ in arquivos:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+_CAMPOS_RELATORIO = ("linhas", "inseridos", "atualizados", "removidos", "inalterados", "do_cache")
+
+
+def _executar(app, job_id, caminho, layout, entidade_id, modo, token=None):
+    def progresso(fase, relatorio):
+        _atualizar(job_id, fase, avisos=list(relatorio["avisos"]),
+                   **{campo: relatorio[campo] for campo in _CAMPOS_RELATORIO})
+
+    # Contexto da aplicação: get_db_connection usa o g, e o teardown devolve a conexão ao pool
+    try:
+        with app.app_context():
+            relatorio = ingestao.substituir_produtos(caminho, entidade_id, layout, progresso, modo, token)
+        _atualizar(
+            job_id, 'erro' if relatorio["erro"] else 'concluido',
+            avisos=list(relatorio["avisos"]), erro=relatorio["erro"], concluido=True,
+            **{campo: relatorio[campo] for campo in _CAMPOS_RELATORIO}
+        )
+    except Exception as e:
+        print(f"Erro inesperado no job de upload {job_id}: {e}")
+        _atualizar(job_id, 'erro', erro=f"Erro inesperado ao processar o arquivo: {e}", concluido=True)
+    finally:
+        if caminho:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+
+def _executar_lote(app, job_id, arquivos, layout, entidades, modo):
+    def progresso(fase, relatorio):
+        _atualizar(job_id, fase, avisos=list(relatorio["avisos"]), itens=list(relatorio["itens"]),
+                   **{campo: relatorio[campo] for campo in _CAMPOS_RELATORIO})
+
+    try:
+        with app.app_context():
+            relatorio = ingestao_lote.substituir_produtos_em_lote(arquivos, entidades, layout, progresso, modo)
+        _atualizar(
+            job_id, 'erro' if relatorio["erro"] else 'concluido',
+            avisos=list(relatorio["avisos"]), itens=list(relatorio["itens"]), erro=relatorio["erro"],
+            concluido=True, **{campo: relatorio[campo] for campo in _CAMPOS_RELATORIO}
+        )
+    except Exception as e:
+        print(f"Erro inesperado no job de upload em lote {job_id}: {e}")
+        _atualizar(job_id, 'erro', erro=f"Erro inesperado ao processar os arquivos: {e}", concluido=True)
+    finally:
+        _remover_arquivos(arquivos)
+
+
+def get_job(job_id):
+    """Cópia do estado do job (ou None se não existir / já expirou)."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job, avisos=list(job["avisos"]), itens=list(job["itens"])) if job else None
+
+
+def get_jobs_status():
+    """Resumo do pool de jobs (para o /health)."""
+    with _lock:
+        return {
+            "workers": JOBS_WORKERS,
+            "pendentes": _pendentes(),
+            "max_fila": JOBS_MAX_FILA,
+            "registrados": len(_jobs),
+        }
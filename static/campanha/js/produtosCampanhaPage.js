@@ -10,7 +10,23 @@ document.addEventListener('DOMContentLoaded', function() {
             precoNormalSelector: 'input[name*="preco_normal_"]',
             precoDesconto1Selector: 'input[name*="preco_desconto_"]',
             precoDesconto2Selector: null, // Campanha não tem segundo preço de desconto relevante para validação direta
-            validateGtinUrl: '/campanha/{id}/produtos/validar_gtins' // URL da API (com placeholder)
+            validateGtinUrl: '/campanha/{id}/produtos/validar_gtins', // URL da API (com placeholder)
+            // Tabela completa (?modo=virtual): colunas do JSON na ordem da tabela
+            virtual: {
+                campos: [
+                    { coluna: 'codigo_barras', tipo: 'text', classe: 'barcode-input' },
+                    { coluna: 'descricao', tipo: 'text', descricao: true },
+                    { coluna: 'pontuacao', tipo: 'number', step: '1' },
+                    { coluna: 'preco_normal', tipo: 'number', step: '0.01' },
+                    { coluna: 'preco_desconto', tipo: 'number', step: '0.01' },
+                    { coluna: 'rebaixe', tipo: 'number', step: '0.01' },
+                    { coluna: 'qtd_limite', tipo: 'number', step: '1' }
+                ],
+                codigo: 'codigo_barras',
+                precoNormal: 'preco_normal',
+                precoDesconto1: 'preco_desconto',
+                precoDesconto2: null
+            }
         };
 
         // Inicializa as funcionalidades da tabela IMEDIATAMENTE
@@ -35,10 +51,27 @@ document.addEventListener('DOMContentLoaded', function() {
         // *** CORREÇÃO: Senha 'REQUIRED_PASSWORD' removida daqui ***
         
         const mainForm = document.getElementById('form-edit-delete');
+        const todosFiltradosCheckbox = document.getElementById('delete-bulk-modal-todos');
+
+        // Tabela completa: a seleção fica nos arrays do ProductTableUtils
+        const modoVirtual = !!(window.ProductTableUtils && ProductTableUtils.virtualAtivo && ProductTableUtils.virtualAtivo());
+
+        // Selecionados em todas as páginas (ver selecaoPaginas.js)
+        const contarSelecionados = () => {
+            if (modoVirtual) return ProductTableUtils.totalSelecionados();
+            return (window.App && App.selecaoPaginas && App.selecaoPaginas.form)
+                ? App.selecaoPaginas.total()
+                : document.querySelectorAll('.edit-checkbox:checked').length;
+        };
+
+        const atualizarContagem = () => {
+            bulkDeleteCountSpan.textContent = todosFiltradosCheckbox && todosFiltradosCheckbox.checked
+                ? todosFiltradosCheckbox.dataset.total
+                : contarSelecionados();
+        };
 
         const showModal = () => {
-            const selectedCheckboxes = document.querySelectorAll('.edit-checkbox:checked');
-            const selectedCount = selectedCheckboxes.length;
+            const selectedCount = contarSelecionados();
 
             if (selectedCount === 0) {
                 alert('Selecione pelo menos um produto para deletar.');
@@ -48,8 +81,9 @@ document.addEventListener('DOMContentLoaded', function() {
             // Limpa o estado anterior
             passwordInput.value = '';
             confirmBulkDeleteBtn.disabled = true; // Começa desabilitado
+            if (todosFiltradosCheckbox) todosFiltradosCheckbox.checked = false;
 
-            bulkDeleteCountSpan.textContent = selectedCount;
+            atualizarContagem();
 
             deleteBulkModal.classList.add('show-modal');
         };
@@ -89,14 +123,30 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             passwordHiddenInput.value = passwordInput.value;
 
-            // 3. Submete o formulário principal (que contém os checkboxes selecionados)
+            // 3. Todos os produtos do filtro, ou os selecionados também nas outras páginas
+            const adicionarOculto = (nome, valor) => {
+                const input = document.createElement('input');
+                input.type = 'hidden';
+                input.name = nome;
+                input.value = valor;
+                mainForm.appendChild(input);
+            };
+            if (todosFiltradosCheckbox && todosFiltradosCheckbox.checked) {
+                adicionarOculto('todos_filtrados', '1');
+            } else if (modoVirtual) {
+                ProductTableUtils.adicionarSelecionados(mainForm, false);
+            } else if (window.App && App.selecaoPaginas && App.selecaoPaginas.form) {
+                App.selecaoPaginas.idsForaDaPagina().forEach(id => adicionarOculto('selecionado', id));
+            }
+            if (window.App && App.selecaoPaginas && App.selecaoPaginas.form) App.selecaoPaginas.limpar();
+
+            // 4. Submete o formulário principal (que contém os checkboxes selecionados)
             mainForm.submit();
         };
 
         // Função para controlar o estado do botão "Deletar Selecionados"
         const checkDeleteButtonState = () => {
-             const selectedCheckboxes = document.querySelectorAll('.edit-checkbox:checked');
-             showDeleteBulkModalBtn.disabled = selectedCheckboxes.length === 0;
+             showDeleteBulkModalBtn.disabled = contarSelecionados() === 0;
         };
         
         // --- Listeners ---
@@ -114,6 +164,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // O listener 'checkPassword' agora apenas verifica se o campo está preenchido
         passwordInput.addEventListener('input', checkPassword);
         confirmBulkDeleteBtn.addEventListener('click', handleConfirmDeletion);
+        if (todosFiltradosCheckbox) todosFiltradosCheckbox.addEventListener('change', atualizarContagem);
         
         // Listeners para os checkboxes para controlar o botão do modal
         document.querySelectorAll('.edit-checkbox').forEach(checkbox => {
@@ -125,6 +176,13 @@ document.addEventListener('DOMContentLoaded', function() {
              selectAllCheckbox.addEventListener('change', checkDeleteButtonState);
         }
         
+        mainForm.addEventListener('selecao-alterada', checkDeleteButtonState);
+
+        // Seleção mantida entre as páginas da listagem
+        if (window.App && App.selecaoPaginas && !modoVirtual) {
+            App.selecaoPaginas.init(mainForm, checkDeleteButtonState);
+        }
+
         // Verifica o estado inicial
         checkDeleteButtonState();
     }
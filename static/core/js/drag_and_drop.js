@@ -39,14 +39,15 @@ document.addEventListener("DOMContentLoaded", () => {
                     alert("Por favor, envie apenas um arquivo por vez. Apenas o primeiro será considerado.");
                 }
                 const droppedFile = e.dataTransfer.files[0];
-                const allowedExtensions = ['xlsx', 'xls'];
+                const allowedExtensions = ['xlsx', 'xls', 'csv', 'parquet'];
                 if (allowedExtensions.includes(droppedFile.name.split('.').pop().toLowerCase())) {
                     const dataTransfer = new DataTransfer();
                     dataTransfer.items.add(droppedFile);
                     inputElement.files = dataTransfer.files;
-                    updateThumbnail(dropZoneElement, droppedFile);
+                    // Dispara o change (miniatura e quem mais acompanha o input, ex.: pré-visualização)
+                    inputElement.dispatchEvent(new Event("change"));
                 } else {
-                    alert("Por favor, envie apenas arquivos Excel (.xlsx, .xls).");
+                    alert("Por favor, envie apenas arquivos Excel (.xlsx, .xls), CSV ou Parquet.");
                 }
             }
             dropZoneElement.classList.remove("drop-zone--over");
@@ -73,6 +74,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 e.stopPropagation(); // Impede que o evento de clique se propague para a drop-zone
                 
                 inputElement.value = ""; // Limpa o arquivo do input
+                inputElement.dispatchEvent(new Event("change"));
                 thumbnailElement.remove(); // Remove a miniatura da tela
                 if (promptElement) promptElement.style.display = 'block'; // Mostra o texto original novamente
             });
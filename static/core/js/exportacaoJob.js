@@ -0,0 +1,69 @@
+// static/core/js/exportacaoJob.js
+// Acompanha uma exportação em lote (GET /exportacao/jobs/<id>) e mostra o link do ZIP.
+
+window.App = window.App || {};
+
+App.exportacaoJob = {
+    intervaloMs: 2000,
+
+    init: function() {
+        const painel = document.getElementById('exportacao-job');
+        if (!painel) return;
+        this.painel = painel;
+        this.url = painel.dataset.url;
+        this.consultar();
+    },
+
+    consultar: function() {
+        fetch(this.url, { headers: { 'Accept': 'application/json' } })
+            .then(resp => resp.json().then(dados => ({ ok: resp.ok, dados })))
+            .then(({ ok, dados }) => {
+                if (!ok) {
+                    this.finalizar([['warning', dados.erro || 'Não foi possível consultar a exportação.']], null);
+                    return;
+                }
+                if (dados.concluido) {
+                    this.finalizar(this.mensagensFinais(dados), dados.url_arquivo);
+                } else {
+                    this.painel.textContent = `${dados.fase_descricao}... ${dados.concluidos} de ${dados.total} planilha(s), ${dados.linhas} produto(s).`;
+                    setTimeout(() => this.consultar(), this.intervaloMs);
+                }
+            })
+            .catch(() => setTimeout(() => this.consultar(), this.intervaloMs * 2));
+    },
+
+    mensagensFinais: function(job) {
+        const mensagens = [];
+        job.itens.forEach(item => {
+            if (item.erro) mensagens.push(['warning', `${item.nome} (${item.tipo}): ${item.erro}`]);
+        });
+        if (job.erro) {
+            mensagens.push(['danger', job.erro]);
+        } else {
+            const geradas = job.itens.filter(item => item.linhas).length;
+            mensagens.push(['success', `${geradas} planilha(s) com ${job.linhas} produto(s) no ZIP.`]);
+        }
+        return mensagens;
+    },
+
+    finalizar: function(mensagens, urlArquivo) {
+        const fragmento = document.createDocumentFragment();
+        mensagens.forEach(([categoria, texto]) => {
+            const div = document.createElement('div');
+            div.className = `alert alert-${categoria}`;
+            div.textContent = texto;
+            fragmento.appendChild(div);
+        });
+        if (urlArquivo) {
+            const link = document.createElement('a');
+            link.href = urlArquivo;
+            link.className = 'button-filter';
+            link.style.cssText = 'max-width: 250px; text-decoration: none;';
+            link.textContent = 'Baixar ZIP';
+            fragmento.appendChild(link);
+        }
+        this.painel.replaceWith(fragmento);
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => App.exportacaoJob.init());
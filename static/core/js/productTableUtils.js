@@ -2,27 +2,59 @@
 
 window.ProductTableUtils = (function() {
 
+    // --- REGRAS DE VALIDAÇÃO (sobre valores: usadas pela tabela normal e pela virtual) ---
+
+    /**
+     * true se o código de barras tem comprimento inválido (vazio não é erro de formato).
+     */
+    function codigoComFormatoInvalido(valor) {
+        const texto = (valor === null || valor === undefined) ? "" : String(valor).trim();
+        if (texto === "") return false;
+        const len = texto.length;
+        return !((len === 7) || (len === 8) || (len === 12) || (len === 13));
+    }
+
+    /**
+     * Compara os preços de uma linha: null se o preço normal não é um número
+     * (não dá para comparar), true se algum desconto passa do preço normal,
+     * false se está tudo certo. desconto2 undefined = coluna inexistente.
+     */
+    function precosComErro(normal, desconto1, desconto2) {
+        const getPrice = (val) => {
+            if (val === undefined) return NaN; // Coluna inexistente
+            const texto = (val === null) ? "" : String(val).replace(',', '.').trim();
+            if (texto === "") return 0; // "null" (string vazia) conta como 0
+            return parseFloat(texto); // Retorna o número ou NaN se for "abc"
+        };
+
+        const precoNormal = getPrice(normal);
+        const precoDesconto1 = getPrice(desconto1);
+        const precoDesconto2 = getPrice(desconto2);
+
+        // Se Preco Normal for "abc" (NaN), não podemos comparar.
+        // (Nota: 0 não é NaN, então campos vazios (agora 0) serão validados)
+        if (isNaN(precoNormal)) return null;
+
+        // Valida PrecoNormal vs PrecoDesconto1 (se PrecoDesconto1 for um número válido)
+        if (!isNaN(precoDesconto1) && precoDesconto1 > precoNormal) return true;
+
+        // Valida PrecoNormal vs PrecoDesconto2 (se PrecoDesconto2 for um número válido)
+        return !isNaN(precoDesconto2) && precoDesconto2 > precoNormal;
+    }
+
     // --- FUNÇÕES DE VALIDAÇÃO ---
 
     /**
      * Valida o formato (comprimento) do código de barras em uma linha.
      */
     function validarLinhaFormatoCodigo(input) {
-        const valor = input.value.trim();
         const row = input.closest('tr');
         if (!row) return;
 
         // Limpa erro anterior de formato
         row.classList.remove('row-error-length');
 
-        if (valor === "") {
-            return; // Vazio não é erro de formato
-        }
-
-        const len = valor.length;
-        const eValido = (len === 7) || (len === 8) || (len === 12) || (len === 13);
-
-        if (!eValido) {
+        if (codigoComFormatoInvalido(input.value)) {
             row.classList.add('row-error-length');
         }
     }
@@ -40,43 +72,21 @@ window.ProductTableUtils = (function() {
 
         if (!normalInput || !desconto1Input) return; // Precisa pelo menos do normal e do primeiro desconto
 
-        const getPrice = (el) => {
-            if (!el) return NaN; // Se o elemento não existir
-            const val = el.value.replace(',', '.').trim();
-            if (val === "") return 0; // "null" (string vazia) conta como 0
-            return parseFloat(val); // Retorna o número ou NaN se for "abc"
-        };
-
-        const precoNormal = getPrice(normalInput);
-        const precoDesconto1 = getPrice(desconto1Input);
-        const precoDesconto2 = getPrice(desconto2Input); // getPrice(null) retorna NaN, o que é ok
+        const isError = precosComErro(
+            normalInput.value, desconto1Input.value, desconto2Input ? desconto2Input.value : undefined
+        );
 
         // 2. Limpa classes de validação de preço anteriores (vermelho E verde)
         // Isso previne que a linha fique verde (do GTIN) e vermelha (do Preço) ao mesmo tempo.
         // As validações de GTIN (`row-invalid`) serão tratadas pelo botão "Validar GTINs".
         row.classList.remove('row-error-price', 'row-valid');
 
-        // 3. Se Preco Normal for "abc" (NaN), não podemos comparar.
-        // (Nota: 0 não é NaN, então campos vazios (agora 0) serão validados)
-        if (isNaN(precoNormal)) {
-             return; // Deixa neutro, pois não é um número válido para comparar
-        }
-
-        // 4. Se chegamos aqui, Preco Normal é um número (incluindo 0).
-        let isError = false;
-
-        // Valida PrecoNormal vs PrecoDesconto1 (se PrecoDesconto1 for um número válido)
-        if (!isNaN(precoDesconto1) && precoDesconto1 > precoNormal) {
-            isError = true;
-        }
-
-        // Valida PrecoNormal vs PrecoDesconto2 (se PrecoDesconto2 for um número válido)
-        // Só executa se não houver erro no Desconto1
-        if (!isError && desconto2Input && !isNaN(precoDesconto2) && precoDesconto2 > precoNormal) {
-             isError = true;
+        // 3. Se Preco Normal não é um número, deixa neutro
+        if (isError === null) {
+             return;
         }
 
-        // 5. Aplica a classe de erro (vermelho) ou de sucesso (verde)
+        // 4. Aplica a classe de erro (vermelho) ou de sucesso (verde)
         if (isError) {
             row.classList.add('row-error-price');
         } else {
@@ -90,6 +100,10 @@ window.ProductTableUtils = (function() {
     // --- FUNÇÕES DE VALIDAÇÃO GERAL ---
 
     function validarTodosCodigos(tableBody) {
+        if (virtual) {
+            validarTodosCodigosVirtual();
+            return;
+        }
         const todosBarcodes = tableBody.querySelectorAll('.barcode-input');
         todosBarcodes.forEach(input => {
             validarLinhaFormatoCodigo(input);
@@ -97,6 +111,10 @@ window.ProductTableUtils = (function() {
     }
 
     function validarTodosPrecos(tableBody, config) {
+        if (virtual) {
+            validarTodosPrecosVirtual();
+            return;
+        }
         // Pega um dos inputs de preço de cada linha para iniciar a validação da linha
         const inputsParaValidar = tableBody.querySelectorAll(config.precoNormalSelector);
         inputsParaValidar.forEach(input => {
@@ -150,13 +168,19 @@ window.ProductTableUtils = (function() {
         }
 
         // 1. Modal de Descrição (assunto-modal)
-        initDescriptionModal();
+        initDescriptionModal(tableBody);
 
-        // 2. Checkboxes de Edição
-        initEditCheckboxes(tableBody);
+        const containerVirtual = document.getElementById('tabela-virtual');
+        if (containerVirtual && config.virtual) {
+            // 2/3. Tabela completa: linhas, seleção e validação ao vivo ficam no modo virtual
+            initVirtualTable(containerVirtual, tableBody, config);
+        } else {
+            // 2. Checkboxes de Edição
+            initEditCheckboxes(tableBody);
 
-        // 3. Validação ao vivo (Input Listener)
-        initInputValidation(tableBody, config);
+            // 3. Validação ao vivo (Input Listener)
+            initInputValidation(tableBody, config);
+        }
 
         // 4. Botão Validar Formato
         initValidatePrecoButton(tableBody, config);
@@ -178,17 +202,19 @@ window.ProductTableUtils = (function() {
 
     // --- Funções Auxiliares de Inicialização ---
 
-    function initDescriptionModal() {
+    function initDescriptionModal(tableBody) {
         const assuntoModal = document.getElementById('assunto-modal');
         if (assuntoModal) {
-            const assuntoCells = document.querySelectorAll('.assunto-cell'); // Assume que a classe é a mesma
             const assuntoModalContent = document.getElementById('assunto-modal-content');
             const assuntoModalBtnClose = document.getElementById('assunto-modal-btn-close');
 
-            if (!assuntoCells.length || !assuntoModalContent || !assuntoModalBtnClose) return;
+            if (!assuntoModalContent || !assuntoModalBtnClose) return;
 
+            // Delegado no tbody: vale também para as linhas que a tabela virtual desenha depois
             const showDescriptionModal = (e) => {
-                const input = e.currentTarget.querySelector('input'); // Pega o input dentro da célula
+                const cell = e.target.closest('.assunto-cell'); // Assume que a classe é a mesma
+                if (!cell) return;
+                const input = cell.querySelector('input'); // Pega o input dentro da célula
                 const fullText = input ? input.value : null;
                 if (fullText) {
                     assuntoModalContent.textContent = fullText;
@@ -199,7 +225,7 @@ window.ProductTableUtils = (function() {
                 assuntoModal.classList.remove('show-modal');
                 assuntoModalContent.textContent = '';
             };
-            assuntoCells.forEach(cell => cell.addEventListener('click', showDescriptionModal));
+            tableBody.addEventListener('click', showDescriptionModal);
             assuntoModalBtnClose.addEventListener('click', closeDescriptionModal);
             assuntoModal.addEventListener('click', (event) => {
                 if (event.target === assuntoModal) closeDescriptionModal();
@@ -268,6 +294,10 @@ window.ProductTableUtils = (function() {
         const clearValidationBtn = document.getElementById('btn-limpar-validacoes'); // Assume ID padrão
         if (clearValidationBtn) {
             clearValidationBtn.addEventListener('click', () => {
+                if (virtual) {
+                    limparValidacoesVirtual();
+                    return;
+                }
                 const allRows = tableBody.querySelectorAll('tr');
                 allRows.forEach(row => {
                     row.classList.remove(
@@ -377,8 +407,8 @@ window.ProductTableUtils = (function() {
             const allBarcodeInputs = tableBody.querySelectorAll('.barcode-input'); // Assume classe padrão
             
             // --- CORREÇÃO ESTÁ AQUI ---
-            // 1. Mapeia GTINs e IDs dos produtos
-            const productsData = Array.from(allBarcodeInputs).map(input => {
+            // 1. Mapeia GTINs e IDs dos produtos (na tabela completa, de todos os produtos, pelos arrays)
+            const productsData = virtual ? gtinsVirtual() : Array.from(allBarcodeInputs).map(input => {
                 const row = input.closest('tr');
                 const checkbox = row.querySelector('.edit-checkbox');
                 const productId = checkbox ? checkbox.value : null;
@@ -420,21 +450,25 @@ window.ProductTableUtils = (function() {
                 const validGtinSet = new Set(result.valid_gtins || []); // Garante que seja um array
 
                 // 3. A lógica de colorir a linha permanece a mesma
-                allBarcodeInputs.forEach(input => {
-                    const gtin = input.value.trim();
-                    const row = input.closest('tr');
-                    if (!row) return;
+                if (virtual) {
+                    aplicarGtinsVirtual(validGtinSet);
+                } else {
+                    allBarcodeInputs.forEach(input => {
+                        const gtin = input.value.trim();
+                        const row = input.closest('tr');
+                        if (!row) return;
 
-                    row.classList.remove('row-valid', 'row-invalid'); // Limpa status anterior
+                        row.classList.remove('row-valid', 'row-invalid'); // Limpa status anterior
 
-                    if (gtin === "") return; // Ignora vazios
+                        if (gtin === "") return; // Ignora vazios
 
-                    if (validGtinSet.has(gtin)) {
-                        row.classList.add('row-valid');
-                    } else {
-                        row.classList.add('row-invalid');
-                    }
-                });
+                        if (validGtinSet.has(gtin)) {
+                            row.classList.add('row-valid');
+                        } else {
+                            row.classList.add('row-invalid');
+                        }
+                    });
+                }
 
                 // 4. Alerta o usuário sobre a atualização do CI no banco
                 if (result.updated_count > 0) {
@@ -453,9 +487,341 @@ window.ProductTableUtils = (function() {
     }
 
 
-    // Expõe a função de inicialização
+    // --- TABELA COMPLETA (MODO VIRTUAL) ---
+    // Com ?modo=virtual a página vem sem linhas: os produtos chegam do JSON
+    // colunar da rota .../produtos/dados ({colunas, total, valores}) e só as
+    // linhas visíveis (mais uma margem) viram DOM, com espaçadores no lugar
+    // das outras. Valores editados, seleção e resultado das validações ficam
+    // em arrays (um item por produto); as linhas desenhadas só refletem esse
+    // estado. Ao salvar/deletar, os selecionados entram no formulário como
+    // campos ocultos com os nomes da tabela normal (selecionado, <coluna>_<id>),
+    // então as rotas são as mesmas.
+    //
+    // config.virtual: {
+    //     campos: [{ coluna, tipo: 'text'|'number', step, classe, descricao }],
+    //     codigo: coluna do código de barras,
+    //     precoNormal, precoDesconto1, precoDesconto2 (colunas; null se não houver)
+    // }
+
+    const MARGEM_LINHAS = 10;        // Bloco de linhas desenhadas além da área visível
+    const ALTURA_LINHA_PADRAO = 45;  // Até medir a primeira linha desenhada
+
+    // Status por produto nos arrays de validação (0 = sem validação)
+    const PRECO_ERRO = 1, PRECO_OK = 2;
+    const GTIN_VALIDO = 1, GTIN_INVALIDO = 2;
+
+    // Estado da tabela virtual (null = página com a tabela normal)
+    let virtual = null;
+
+    function escaparHtml(valor) {
+        return textoVirtual(valor)
+            .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+    }
+
+    function textoVirtual(valor) {
+        return (valor === null || valor === undefined) ? '' : String(valor);
+    }
+
+    function initVirtualTable(container, tableBody, config) {
+        virtual = {
+            container: container,
+            tableBody: tableBody,
+            form: container.closest('form'),
+            campos: config.virtual.campos,
+            colunaCodigo: config.virtual.codigo || 'codigo_barras',
+            precos: config.virtual,
+            valores: {},               // coluna -> array de valores (um por produto)
+            ids: [],                   // ids como string (valor dos checkboxes)
+            total: 0,
+            selecionados: new Set(),
+            formato: new Int8Array(0), // 1 = código com comprimento inválido
+            preco: new Int8Array(0),   // PRECO_ERRO / PRECO_OK
+            gtin: new Int8Array(0),    // GTIN_VALIDO / GTIN_INVALIDO
+            alturaLinha: 0,
+            faixa: null,               // [início, fim) das linhas desenhadas
+            agendado: false
+        };
+        const colspan = virtual.campos.length + 1;
+        tableBody.innerHTML = `<tr><td colspan="${colspan}">Carregando produtos...</td></tr>`;
+
+        fetch(container.dataset.url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json().then(dados => {
+                if (!response.ok || dados.erro) {
+                    throw new Error(dados.erro || `Erro do servidor (${response.status})`);
+                }
+                carregarDadosVirtual(dados);
+                renderizarVirtual(true);
+            }))
+            .catch(error => {
+                console.error("Falha ao carregar os produtos:", error);
+                tableBody.innerHTML = `<tr><td colspan="${colspan}">${escaparHtml('Erro ao carregar os produtos: ' + error.message)}</td></tr>`;
+            });
+
+        container.addEventListener('scroll', agendarRenderVirtual);
+        window.addEventListener('resize', agendarRenderVirtual);
+        tableBody.addEventListener('change', onChangeVirtual);
+        tableBody.addEventListener('input', onInputVirtual);
+
+        // Selecionar todos = todos os produtos da lista, não só as linhas desenhadas
+        const selectAllCheckbox = document.getElementById('select-all-checkbox');
+        if (selectAllCheckbox) {
+            selectAllCheckbox.addEventListener('change', () => {
+                virtual.selecionados = selectAllCheckbox.checked ? new Set(virtual.ids) : new Set();
+                renderizarVirtual(true);
+                avisarSelecaoVirtual();
+            });
+        }
+
+        // Salvar Alterações: envia os selecionados com os valores dos arrays
+        if (virtual.form) {
+            virtual.form.addEventListener('submit', () => adicionarSelecionados(virtual.form, true));
+        }
+    }
+
+    function carregarDadosVirtual(dados) {
+        dados.colunas.forEach((coluna, j) => {
+            virtual.valores[coluna] = dados.valores[j];
+        });
+        virtual.ids = (virtual.valores.id || []).map(String);
+        virtual.total = dados.total;
+        virtual.formato = new Int8Array(dados.total);
+        virtual.preco = new Int8Array(dados.total);
+        virtual.gtin = new Int8Array(dados.total);
+    }
+
+    function agendarRenderVirtual() {
+        if (!virtual || virtual.agendado) return;
+        virtual.agendado = true;
+        window.requestAnimationFrame(() => {
+            virtual.agendado = false;
+            renderizarVirtual(false);
+        });
+    }
+
+    /**
+     * Desenha as linhas visíveis. A faixa anda em blocos de MARGEM_LINHAS:
+     * rolar dentro do mesmo bloco não recria as linhas. forcar redesenha
+     * mesmo sem mudar a faixa (ex.: depois de validar ou selecionar todos).
+     */
+    function renderizarVirtual(forcar) {
+        const { container, tableBody, total } = virtual;
+        if (total === 0) {
+            tableBody.innerHTML = `<tr><td colspan="${virtual.campos.length + 1}">Nenhum produto.</td></tr>`;
+            return;
+        }
+
+        const altura = virtual.alturaLinha || ALTURA_LINHA_PADRAO;
+        const topo = Math.max(0, container.scrollTop - tableBody.offsetTop); // Desconta o cabeçalho
+        const primeiraVisivel = Math.floor(topo / altura);
+        const ultimaVisivel = Math.ceil((topo + container.clientHeight) / altura);
+        const inicio = Math.max(0, (Math.floor(primeiraVisivel / MARGEM_LINHAS) - 1) * MARGEM_LINHAS);
+        const fim = Math.min(total, (Math.ceil(ultimaVisivel / MARGEM_LINHAS) + 1) * MARGEM_LINHAS);
+        if (!forcar && virtual.faixa && virtual.faixa[0] === inicio && virtual.faixa[1] === fim) return;
+        virtual.faixa = [inicio, fim];
+
+        // Guarda o campo em edição para devolver o foco depois de recriar as linhas
+        const ativo = document.activeElement;
+        const foco = (ativo && tableBody.contains(ativo) && ativo.dataset.coluna)
+            ? { i: ativo.closest('tr').dataset.i, coluna: ativo.dataset.coluna }
+            : null;
+
+        const partes = [espacadorVirtual(inicio * altura)];
+        for (let i = inicio; i < fim; i++) {
+            partes.push(linhaVirtualHtml(i));
+        }
+        partes.push(espacadorVirtual((total - fim) * altura));
+        tableBody.innerHTML = partes.join('');
+
+        if (foco) {
+            const input = tableBody.querySelector(`tr[data-i="${foco.i}"] input[data-coluna="${foco.coluna}"]`);
+            if (input) input.focus();
+        }
+
+        // Mede a altura real das linhas na primeira vez e redesenha com ela
+        if (!virtual.alturaLinha) {
+            const linha = tableBody.querySelector('tr[data-i]');
+            if (linha && linha.offsetHeight) {
+                virtual.alturaLinha = linha.offsetHeight;
+                renderizarVirtual(true);
+            }
+        }
+    }
+
+    function espacadorVirtual(altura) {
+        if (altura <= 0) return '';
+        return `<tr style="height: ${altura}px;"><td colspan="${virtual.campos.length + 1}" style="padding: 0; border: 0;"></td></tr>`;
+    }
+
+    function linhaVirtualHtml(i) {
+        const id = virtual.ids[i];
+        const selecionado = virtual.selecionados.has(id);
+        const celulas = virtual.campos.map(campo => {
+            const valores = virtual.valores[campo.coluna] || [];
+            const atributos = [
+                `type="${campo.tipo || 'text'}"`,
+                campo.step ? `step="${campo.step}"` : '',
+                campo.classe ? `class="${campo.classe}"` : '',
+                `data-coluna="${campo.coluna}"`,
+                `value="${escaparHtml(valores[i])}"`,
+                selecionado ? '' : 'disabled'
+            ].filter(Boolean).join(' ');
+            return `<td${campo.descricao ? ' class="assunto-cell"' : ''}><input ${atributos}></td>`;
+        });
+        return `<tr data-i="${i}" class="${classesLinhaVirtual(i)}">`
+            + `<td style="text-align: center;"><input type="checkbox" class="edit-checkbox" value="${escaparHtml(id)}"${selecionado ? ' checked' : ''}></td>`
+            + celulas.join('')
+            + '</tr>';
+    }
+
+    // Mesmas classes que a tabela normal aplica nas linhas
+    function classesLinhaVirtual(i) {
+        const classes = [];
+        if (virtual.formato[i]) classes.push('row-error-length');
+        if (virtual.preco[i] === PRECO_ERRO) classes.push('row-error-price');
+        if (virtual.preco[i] === PRECO_OK || virtual.gtin[i] === GTIN_VALIDO) classes.push('row-valid');
+        if (virtual.gtin[i] === GTIN_INVALIDO) classes.push('row-invalid');
+        return classes.join(' ');
+    }
+
+    function onChangeVirtual(event) {
+        const checkbox = event.target;
+        if (!checkbox.classList.contains('edit-checkbox')) return;
+
+        if (checkbox.checked) {
+            virtual.selecionados.add(checkbox.value);
+        } else {
+            virtual.selecionados.delete(checkbox.value);
+        }
+        checkbox.closest('tr').querySelectorAll('input[data-coluna]').forEach(input => {
+            input.disabled = !checkbox.checked;
+        });
+        avisarSelecaoVirtual();
+    }
+
+    function onInputVirtual(event) {
+        const input = event.target;
+        const coluna = input.dataset.coluna;
+        if (!coluna) return;
+
+        const row = input.closest('tr');
+        const i = Number(row.dataset.i);
+        virtual.valores[coluna][i] = input.value;
+
+        if (coluna === virtual.colunaCodigo) {
+            virtual.formato[i] = codigoComFormatoInvalido(input.value) ? 1 : 0;
+            // Limpa validação de GTIN (do DB) ao digitar
+            virtual.gtin[i] = 0;
+            if (virtual.preco[i] === PRECO_OK) virtual.preco[i] = 0;
+        }
+
+        const p = virtual.precos;
+        if (coluna === p.precoNormal || coluna === p.precoDesconto1 || (p.precoDesconto2 && coluna === p.precoDesconto2)) {
+            validarPrecoVirtual(i);
+        }
+        row.className = classesLinhaVirtual(i);
+    }
+
+    function validarPrecoVirtual(i) {
+        const p = virtual.precos;
+        const v = virtual.valores;
+        const isError = precosComErro(
+            v[p.precoNormal][i], v[p.precoDesconto1][i], p.precoDesconto2 ? v[p.precoDesconto2][i] : undefined
+        );
+        // Como na tabela normal: o verde do GTIN dá lugar ao resultado do preço
+        if (virtual.gtin[i] === GTIN_VALIDO) virtual.gtin[i] = 0;
+        virtual.preco[i] = isError === null ? 0 : (isError ? PRECO_ERRO : PRECO_OK);
+    }
+
+    function validarTodosCodigosVirtual() {
+        const codigos = virtual.valores[virtual.colunaCodigo] || [];
+        for (let i = 0; i < virtual.total; i++) {
+            virtual.formato[i] = codigoComFormatoInvalido(codigos[i]) ? 1 : 0;
+        }
+        renderizarVirtual(true);
+    }
+
+    function validarTodosPrecosVirtual() {
+        for (let i = 0; i < virtual.total; i++) {
+            validarPrecoVirtual(i);
+        }
+        renderizarVirtual(true);
+    }
+
+    function limparValidacoesVirtual() {
+        virtual.formato.fill(0);
+        virtual.preco.fill(0);
+        virtual.gtin.fill(0);
+        renderizarVirtual(true);
+    }
+
+    function gtinsVirtual() {
+        const codigos = virtual.valores[virtual.colunaCodigo] || [];
+        return virtual.ids.map((id, i) => ({ id: id, gtin: textoVirtual(codigos[i]).trim() }));
+    }
+
+    function aplicarGtinsVirtual(validGtinSet) {
+        const codigos = virtual.valores[virtual.colunaCodigo] || [];
+        for (let i = 0; i < virtual.total; i++) {
+            const gtin = textoVirtual(codigos[i]).trim();
+            if (gtin === "") {
+                virtual.gtin[i] = 0; // Ignora vazios
+            } else {
+                virtual.gtin[i] = validGtinSet.has(gtin) ? GTIN_VALIDO : GTIN_INVALIDO;
+            }
+        }
+        renderizarVirtual(true);
+    }
+
+    // A página (botão Deletar) acompanha a seleção por este evento no formulário
+    function avisarSelecaoVirtual() {
+        if (virtual.form) virtual.form.dispatchEvent(new Event('selecao-alterada'));
+    }
+
+    function virtualAtivo() {
+        return virtual !== null;
+    }
+
+    function totalSelecionados() {
+        return virtual ? virtual.selecionados.size : 0;
+    }
+
+    /**
+     * Coloca no formulário os selecionados da tabela virtual como campos
+     * ocultos: "selecionado" e, com comCampos, os valores editáveis
+     * (<coluna>_<id>), no formato dos inputs da tabela normal.
+     */
+    function adicionarSelecionados(form, comCampos) {
+        if (!virtual) return;
+        form.querySelectorAll('input[data-oculto-virtual]').forEach(input => input.remove());
+
+        const posicoes = comCampos ? new Map(virtual.ids.map((id, i) => [id, i])) : null;
+        const fragmento = document.createDocumentFragment();
+        const adicionarOculto = (nome, valor) => {
+            const input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = nome;
+            input.value = valor;
+            input.dataset.ocultoVirtual = '1';
+            fragmento.appendChild(input);
+        };
+        virtual.selecionados.forEach(id => {
+            adicionarOculto('selecionado', id);
+            if (!comCampos) return;
+            const i = posicoes.get(id);
+            virtual.campos.forEach(campo => {
+                adicionarOculto(`${campo.coluna}_${id}`, textoVirtual(virtual.valores[campo.coluna][i]));
+            });
+        });
+        form.appendChild(fragmento);
+    }
+
+    // Expõe a inicialização e, para a página, a seleção da tabela virtual
     return {
-        init: initProductTable
+        init: initProductTable,
+        virtualAtivo: virtualAtivo,
+        totalSelecionados: totalSelecionados,
+        adicionarSelecionados: adicionarSelecionados
     };
 
 })(); // Fim do Módulo ProductTableUtils
\ No newline at end of file
@@ -0,0 +1,69 @@
+// static/core/js/selecaoPaginas.js
+// Mantém os produtos selecionados ao trocar de página na listagem paginada
+// (sessionStorage, uma seleção por lista). Deletar envia também os ids das outras páginas;
+// Salvar Alterações só tem os campos da página atual: os das outras páginas vão só como
+// id (o servidor avisa quantos ficaram sem atualizar) e continuam marcados para depois.
+
+window.App = window.App || {};
+
+App.selecaoPaginas = {
+    init: function(form, aoMudar) {
+        this.form = form;
+        this.chave = `selecao:${window.location.pathname}`;
+        this.ids = new Set(JSON.parse(sessionStorage.getItem(this.chave) || '[]'));
+
+        form.querySelectorAll('.edit-checkbox').forEach(checkbox => {
+            checkbox.addEventListener('change', () => {
+                if (checkbox.checked) {
+                    this.ids.add(checkbox.value);
+                } else {
+                    this.ids.delete(checkbox.value);
+                }
+                this.salvar();
+                if (aoMudar) aoMudar();
+            });
+            // Restaura a marcação (o change também habilita os campos da linha)
+            if (this.ids.has(checkbox.value) && !checkbox.checked) {
+                checkbox.checked = true;
+                checkbox.dispatchEvent(new Event('change'));
+            }
+        });
+
+        // Salvar Alterações consome só a seleção desta página
+        form.addEventListener('submit', () => this.enviarForaDaPagina());
+    },
+
+    enviarForaDaPagina: function() {
+        this.form.querySelectorAll('input[data-oculto-selecao]').forEach(input => input.remove());
+        const fora = this.idsForaDaPagina();
+        fora.forEach(id => {
+            const input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = 'selecionado';
+            input.value = id;
+            input.dataset.ocultoSelecao = '1';
+            this.form.appendChild(input);
+        });
+        this.ids = new Set(fora);
+        this.salvar();
+    },
+
+    salvar: function() {
+        sessionStorage.setItem(this.chave, JSON.stringify([...this.ids]));
+    },
+
+    limpar: function() {
+        this.ids.clear();
+        sessionStorage.removeItem(this.chave);
+    },
+
+    total: function() {
+        return this.ids.size;
+    },
+
+    // Ids selecionados em outras páginas (não estão no formulário atual)
+    idsForaDaPagina: function() {
+        const visiveis = new Set(Array.from(this.form.querySelectorAll('.edit-checkbox'), checkbox => checkbox.value));
+        return [...this.ids].filter(id => !visiveis.has(id));
+    }
+};
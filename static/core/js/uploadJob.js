@@ -0,0 +1,95 @@
+// static/core/js/uploadJob.js
+// Acompanha um job de upload em segundo plano (GET /jobs/<id>) e mostra o resultado.
+
+window.App = window.App || {};
+
+App.uploadJob = {
+    intervaloMs: 1500,
+
+    init: function() {
+        const painel = document.getElementById('upload-job');
+        if (!painel) return;
+        this.painel = painel;
+        this.url = painel.dataset.url;
+        this.consultar();
+    },
+
+    consultar: function() {
+        fetch(this.url, { headers: { 'Accept': 'application/json' } })
+            .then(resp => resp.json().then(dados => ({ ok: resp.ok, dados })))
+            .then(({ ok, dados }) => {
+                if (!ok) {
+                    this.finalizar([['warning', dados.erro || 'Não foi possível consultar o processamento.']]);
+                    return;
+                }
+                if (dados.concluido) {
+                    this.finalizar(this.mensagensFinais(dados));
+                } else {
+                    this.painel.textContent = `${dados.fase_descricao}... ${dados.linhas} linha(s) lida(s), ${dados.inseridos} carregada(s).`;
+                    setTimeout(() => this.consultar(), this.intervaloMs);
+                }
+            })
+            .catch(() => setTimeout(() => this.consultar(), this.intervaloMs * 2));
+    },
+
+    // Mesmas mensagens que o upload síncrono mostrava via flash
+    mensagensFinais: function(job) {
+        if (job.itens.length) return this.mensagensLote(job);
+        const mensagens = [];
+        job.avisos.forEach(aviso => mensagens.push(['warning', aviso]));
+        if (job.do_cache) {
+            mensagens.push(['info', 'Este arquivo já tinha sido lido antes: a leitura foi reaproveitada.']);
+        }
+        if (job.erro) {
+            mensagens.push(['danger', `${job.erro} A lista de produtos não foi alterada.`]);
+        } else if (job.modo === 'diferencas' && (job.atualizados || job.removidos || job.inalterados)) {
+            mensagens.push(['success',
+                `Diferenças aplicadas: ${job.inseridos} inserido(s), ${job.atualizados} atualizado(s), ` +
+                `${job.removidos} removido(s) e ${job.inalterados} sem alteração.`]);
+        } else if (job.inseridos) {
+            if (job.removidos > 0) {
+                mensagens.push(['info', `${job.removidos} produto(s) antigo(s) removido(s).`]);
+            }
+            mensagens.push(['success', `${job.inseridos} novo(s) produto(s) processado(s) e salvo(s) com sucesso!`]);
+        } else {
+            mensagens.push(['warning', 'Nenhum produto encontrado na nova planilha para inserir.']);
+        }
+        return mensagens;
+    },
+
+    // Upload em lote: uma mensagem por tabloide
+    mensagensLote: function(job) {
+        const mensagens = [];
+        job.avisos.forEach(aviso => mensagens.push(['warning', aviso]));
+        job.itens.forEach(item => {
+            const origem = item.aba ? `${item.arquivo}, aba "${item.aba}"` : item.arquivo;
+            const titulo = `${item.entidade_nome} (${origem}): `;
+            item.avisos.forEach(aviso => mensagens.push(['warning', titulo + aviso]));
+            if (item.erro) {
+                mensagens.push(['danger', `${titulo}${item.erro} A lista de produtos não foi alterada.`]);
+            } else if (job.modo === 'diferencas' && (item.atualizados || item.removidos || item.inalterados)) {
+                mensagens.push(['success',
+                    `${titulo}${item.inseridos} inserido(s), ${item.atualizados} atualizado(s), ` +
+                    `${item.removidos} removido(s) e ${item.inalterados} sem alteração.`]);
+            } else {
+                mensagens.push([item.inseridos ? 'success' : 'warning',
+                    `${titulo}${item.inseridos} produto(s) salvo(s), ${item.removidos} antigo(s) removido(s).`]);
+            }
+        });
+        if (job.erro) mensagens.push(['danger', job.erro]);
+        return mensagens;
+    },
+
+    finalizar: function(mensagens) {
+        const fragmento = document.createDocumentFragment();
+        mensagens.forEach(([categoria, texto]) => {
+            const div = document.createElement('div');
+            div.className = `alert alert-${categoria}`;
+            div.textContent = texto;
+            fragmento.appendChild(div);
+        });
+        this.painel.replaceWith(fragmento);
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => App.uploadJob.init());
@@ -0,0 +1,103 @@
+// static/core/js/uploadPreview.js
+// Pré-visualização do upload (POST .../upload/preview): mostra o que a planilha
+// vai gerar antes de processar e guarda o token, para o envio não reenviar o arquivo.
+
+window.App = window.App || {};
+
+App.uploadPreview = {
+    init: function() {
+        const botao = document.getElementById('btn-preview');
+        if (!botao) return;
+        this.botao = botao;
+        this.form = botao.closest('form');
+        this.input = this.form.querySelector('input[type="file"]');
+        this.token = this.form.querySelector('input[name="preview_token"]');
+        this.painel = document.getElementById('upload-preview');
+
+        botao.addEventListener('click', () => this.analisar());
+        // Outro arquivo escolhido: a pré-visualização anterior não vale mais
+        this.input.addEventListener('change', () => this.limpar());
+        // Com token, o arquivo não precisa subir de novo
+        this.form.addEventListener('submit', () => {
+            if (this.token.value) this.input.disabled = true;
+        });
+    },
+
+    limpar: function() {
+        this.token.value = '';
+        this.input.disabled = false;
+        this.painel.innerHTML = '';
+    },
+
+    analisar: function() {
+        if (!this.input.files.length) {
+            this.mostrar([['warning', 'Selecione um arquivo para pré-visualizar.']]);
+            return;
+        }
+        const dados = new FormData();
+        dados.append('file', this.input.files[0]);
+
+        this.botao.disabled = true;
+        this.mostrar([['info', 'Analisando a planilha...']]);
+        fetch(this.botao.dataset.url, { method: 'POST', body: dados, headers: { 'Accept': 'application/json' } })
+            .then(resp => resp.json().then(resumo => ({ ok: resp.ok, resumo })))
+            .then(({ ok, resumo }) => {
+                if (!ok) {
+                    this.mostrar([['danger', resumo.erro || 'Não foi possível pré-visualizar a planilha.']]);
+                    return;
+                }
+                this.token.value = resumo.token || '';
+                this.mostrar(this.mensagens(resumo));
+            })
+            .catch(() => this.mostrar([['danger', 'Não foi possível pré-visualizar a planilha.']]))
+            .finally(() => { this.botao.disabled = false; });
+    },
+
+    exemplos: function(lista) {
+        return lista.length ? ` Ex.: ${lista.slice(0, 5).join(', ')}` : '';
+    },
+
+    mensagens: function(r) {
+        const mensagens = [];
+        if (r.colunas_faltando.length) {
+            mensagens.push(['danger', `A planilha não contém todas as colunas esperadas. Faltando: ${r.colunas_faltando.join(', ')}`]);
+            return mensagens;
+        }
+        r.avisos.forEach(aviso => mensagens.push(['warning', aviso]));
+        if (r.gtins_vazios) {
+            mensagens.push(['warning', `${r.gtins_vazios} linha(s) sem GTIN.`]);
+        }
+        if (r.gtins_invalidos.linhas) {
+            mensagens.push(['warning', `${r.gtins_invalidos.linhas} GTIN(s) fora do formato (8, 12, 13 ou 14 dígitos).` + this.exemplos(r.gtins_invalidos.exemplos)]);
+        }
+        if (r.gtins_duplicados.gtins) {
+            mensagens.push(['warning', `${r.gtins_duplicados.gtins} GTIN(s) repetido(s), com ${r.gtins_duplicados.linhas_extras} linha(s) a mais.` + this.exemplos(r.gtins_duplicados.exemplos)]);
+        }
+        if (r.sem_codigo_interno.gtins) {
+            mensagens.push(['warning', `${r.sem_codigo_interno.gtins} GTIN(s) sem código interno no catálogo.` + this.exemplos(r.sem_codigo_interno.exemplos)]);
+        }
+        const descricoes = {
+            nao_numerico: 'com valor não numérico',
+            zero_ou_negativo: 'com valor zero ou negativo',
+            maior_que_preco_normal: 'maior que o preço normal'
+        };
+        r.anomalias_preco.forEach(a => {
+            mensagens.push(['warning', `${a.linhas} linha(s) com ${a.coluna} ${descricoes[a.tipo]}.` + this.exemplos(a.exemplos)]);
+        });
+        mensagens.unshift([mensagens.length ? 'info' : 'success',
+            `${r.linhas} linha(s) lida(s)` + (mensagens.length ? '. Confira os pontos abaixo antes de processar.' : ', nenhum problema encontrado.')]);
+        return mensagens;
+    },
+
+    mostrar: function(mensagens) {
+        this.painel.innerHTML = '';
+        mensagens.forEach(([categoria, texto]) => {
+            const div = document.createElement('div');
+            div.className = `alert alert-${categoria}`;
+            div.textContent = texto;
+            this.painel.appendChild(div);
+        });
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => App.uploadPreview.init());
@@ -1,13 +1,53 @@
 document.addEventListener('DOMContentLoaded', () => {
 
+    // --- AUTOCOMPLETE DO NOME AJUSTADO ---
+    // O datalist começa vazio; as sugestões vêm do servidor conforme o usuário digita.
+    const datalistNomes = document.getElementById('datalist_nomes');
+    const urlSugestoes = datalistNomes ? datalistNomes.dataset.url : null;
+
+    const buscarSugestoes = async (termo) => {
+        const response = await fetch(`${urlSugestoes}?q=${encodeURIComponent(termo)}`);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json(); // { sugestoes: [...], valido: bool }
+    };
+
+    const ligarAutocomplete = (input) => {
+        if (!input || !urlSugestoes) return;
+        let timer = null;
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            const termo = input.value.trim();
+            if (!termo) return;
+            // Debounce: só consulta quando o usuário para de digitar
+            timer = setTimeout(async () => {
+                try {
+                    const data = await buscarSugestoes(termo);
+                    datalistNomes.replaceChildren(...data.sugestoes.map(nome => {
+                        const opt = document.createElement('option');
+                        opt.value = nome;
+                        return opt;
+                    }));
+                } catch (err) {
+                    console.error('Erro ao buscar sugestões de Nome Ajustado:', err);
+                }
+            }, 200);
+        });
+    };
+
+    ligarAutocomplete(document.getElementById('nome_ajustado'));
+    ligarAutocomplete(document.getElementById('nome_ajustado_edit'));
+
     // --- FUNÇÃO AUXILIAR DE VALIDAÇÃO ---
-    // Verifica se o valor do input existe dentro das opções do datalist
-    const isValueInDatalist = (inputValue, datalistId) => {
-        const datalist = document.getElementById(datalistId);
-        if (!datalist) return true; // Se não achar lista (fallback), deixa passar
-        
-        const options = Array.from(datalist.options).map(opt => opt.value);
-        return options.includes(inputValue);
+    // Pergunta ao servidor se o valor é exatamente um Nome Ajustado válido
+    const isNomeAjustadoValido = async (inputValue) => {
+        if (!urlSugestoes) return true; // Sem endpoint (fallback), deixa passar; o servidor valida
+        try {
+            const data = await buscarSugestoes(inputValue);
+            return data.valido;
+        } catch (err) {
+            console.error('Erro ao validar Nome Ajustado:', err);
+            return true; // Em caso de falha de rede, o servidor ainda valida no POST
+        }
     };
 
     // --- LÓGICA MODAL DE CRIAÇÃO ---
@@ -24,7 +64,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const nomeAjustadoInput = document.getElementById('nome_ajustado'); // Input do nome ajustado
 
         // Função para mostrar o modal
-        const showCreateModal = (e) => {
+        const showCreateModal = async (e) => {
             e.preventDefault();
             
             const email = emailGestorInput.value.trim();
@@ -37,9 +77,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 return;
             }
 
-            // 2. Validação do Datalist (Nome Ajustado)
-            // Certifique-se de que o ID do datalist no HTML é 'datalist_nomes'
-            if (!isValueInDatalist(nomeAjustado, 'datalist_nomes')) { 
+            // 2. Validação do Nome Ajustado (consulta o servidor)
+            if (!(await isNomeAjustadoValido(nomeAjustado))) { 
                 alert('O "Nome Ajustado" digitado não é válido. Selecione uma opção exata da lista.');
                 return; // Impede a abertura do modal
             }
@@ -85,15 +124,17 @@ document.addEventListener('DOMContentLoaded', () => {
         
         // 1. Validação no envio do formulário de edição
         if (editForm) {
-            editForm.addEventListener('submit', (e) => {
+            editForm.addEventListener('submit', async (e) => {
                 const nomeAjustadoEditInput = document.getElementById('nome_ajustado_edit');
                 if (nomeAjustadoEditInput) {
+                    e.preventDefault(); // Segura o envio até a validação no servidor responder
                     const nomeAjustadoEdit = nomeAjustadoEditInput.value.trim();
                     
-                    if (!isValueInDatalist(nomeAjustadoEdit, 'datalist_nomes')) {
-                        e.preventDefault(); // Cancela o envio
+                    if (!(await isNomeAjustadoValido(nomeAjustadoEdit))) {
                         alert('O "Nome Ajustado" digitado na edição não é válido. Selecione uma opção exata da lista.');
+                        return;
                     }
+                    editForm.submit(); // submit() não dispara este listener de novo
                 }
             });
         }
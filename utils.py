@@ -1,6 +1,6 @@
 # /utils.py
 
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv', 'parquet'}
 
 #Coloquei na utils pois não é uma senha que viole a segurança do nosso banco de dados
 DELETE_PASSWORD = "com123"